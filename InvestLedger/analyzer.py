@@ -5,77 +5,223 @@ import datetime
 import calendar
 from collections import defaultdict
 
+# 图表每个像素列对应的数据点数，超过后再增加点数已无法在屏幕上分辨
+POINTS_PER_PIXEL = 1
+# 降采样后的最少点数，避免窄图表把曲线压得过于粗糙
+MIN_CHART_POINTS = 50
+
+
+def period_label(period, key):
+    """根据周期键生成显示标签"""
+    if period == "week":
+        # 解析出年份和周数
+        year_str, week_str = key.split('-W')
+        week = int(week_str)
+        # 使用周数表示
+        return f"第{week}周"
+    elif period == "month":
+        # 解析出年份和月份
+        year_str, month_str = key.split('-')
+        month = int(month_str)
+        # 使用月份名称
+        return f"{calendar.month_name[month]}"
+    return key
+
+
+def downsample_lttb(points, threshold):
+    """
+    使用Largest-Triangle-Three-Buckets算法对序列降采样
+    points: 按x升序排列的[(x, y), ...]，x为数值
+    threshold: 目标点数，不小于3时才降采样
+    保留首尾点，每个桶选取与前一选中点和下一桶均值构成三角形面积最大的点
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    selected = 0
+    
+    for i in range(threshold - 2):
+        # 下一个桶的平均点
+        avg_start = int((i + 1) * bucket_size) + 1
+        avg_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_count = avg_end - avg_start
+        avg_x = sum(points[j][0] for j in range(avg_start, avg_end)) / avg_count
+        avg_y = sum(points[j][1] for j in range(avg_start, avg_end)) / avg_count
+        
+        # 当前桶中选取三角形面积最大的点
+        range_start = int(i * bucket_size) + 1
+        range_end = int((i + 1) * bucket_size) + 1
+        point_x, point_y = points[selected]
+        max_area = -1
+        next_selected = range_start
+        for j in range(range_start, range_end):
+            area = abs((point_x - avg_x) * (points[j][1] - point_y)
+                       - (point_x - points[j][0]) * (avg_y - point_y))
+            if area > max_area:
+                max_area = area
+                next_selected = j
+        
+        sampled.append(points[next_selected])
+        selected = next_selected
+    
+    sampled.append(points[-1])
+    return sampled
+
+
+def downsample_min_max(points, threshold):
+    """
+    保留极值的降采样：每个桶保留最小值和最大值两个点
+    points: 按x升序排列的[(x, y), ...]
+    threshold: 目标点数，不小于4时才降采样
+    适合需要保证峰值和谷值不丢失的盈亏曲线
+    """
+    n = len(points)
+    if threshold >= n or threshold < 4:
+        return list(points)
+    
+    bucket_count = (threshold - 2) // 2
+    bucket_size = (n - 2) / bucket_count
+    sampled = [points[0]]
+    
+    for i in range(bucket_count):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        if start >= end:
+            continue
+        low = min(range(start, end), key=lambda j: points[j][1])
+        high = max(range(start, end), key=lambda j: points[j][1])
+        for j in sorted({low, high}):
+            sampled.append(points[j])
+    
+    sampled.append(points[-1])
+    return sampled
+
+
+def chart_points_for_width(pixel_width):
+    """根据图表像素宽度计算降采样目标点数"""
+    return max(MIN_CHART_POINTS, int(pixel_width * POINTS_PER_PIXEL))
+
+
 class DataAnalyzer:
     """数据分析器，负责对交易数据进行统计和分析"""
     
-    def __init__(self, db_manager):
-        """初始化数据分析器"""
+    def __init__(self, db_manager, currency_manager=None):
+        """初始化数据分析器
+
+        Args:
+            db_manager: 数据库管理器
+            currency_manager: 货币管理器，用于将各币种盈亏换算为基准货币；为None时直接累加原值
+        """
         self.db_manager = db_manager
+        self.currency_manager = currency_manager
         # 预算告警阈值（默认为80%，即达到预算目标的80%时触发告警）
         self.budget_alert_threshold = 0.8
+        
+        # 当月/当年预算的内存状态，随交易写入按差量更新，避免每次变更都重新扫描
+        self._budget_state = None
+        # 已经处于告警状态的预算，只有新越过阈值时才再次提醒
+        self._active_budget_alerts = set()
+        if hasattr(db_manager, 'add_change_listener'):
+            db_manager.add_change_listener(self._on_transaction_changed)
+        # 后台刷新到新汇率后，按旧汇率累计的预算状态需要重新加载
+        if currency_manager and hasattr(currency_manager, 'add_rates_listener'):
+            currency_manager.add_rates_listener(self.invalidate_budget_state)
+    
+    def _get_rate_table(self, currencies):
+        """获取各币种到基准货币的换算系数"""
+        if not self.currency_manager:
+            return {currency: 1.0 for currency in currencies}
+        return self.currency_manager.get_rate_table(currencies)
+    
+    def _aggregate_in_base_currency(self, group_expr=None, start_date=None, end_date=None, asset_type=None):
+        """
+        按分组汇总基准货币盈亏
+        数据库按(分组, 币种)返回小计，每个币种只换算一次
+        返回: {分组键: {'profit_loss': float, 'transaction_count': int}}
+        """
+        rows = self.db_manager.get_profit_loss_subtotals(group_expr, start_date, end_date, asset_type)
+        rates = self._get_rate_table({row['currency'] for row in rows})
+        
+        groups = defaultdict(lambda: {'profit_loss': 0, 'transaction_count': 0})
+        for row in rows:
+            group = groups[row['group_key']]
+            group['profit_loss'] += row['total'] * rates.get(row['currency'], 1.0)
+            group['transaction_count'] += row['count']
+        return groups
+    
+    def _base_amount_sql(self):
+        """
+        生成把profit_loss换算为基准货币的SQL表达式
+        每个币种的系数只取一次，以CASE表达式交给数据库逐行计算
+        返回: (SQL表达式, 参数列表)
+        """
+        rates = self._get_rate_table(self.db_manager.get_currencies())
+        factors = [(currency, rate) for currency, rate in rates.items() if rate != 1.0]
+        if not factors:
+            return "profit_loss", []
+        
+        expr = "profit_loss * CASE currency " + " ".join("WHEN ? THEN ?" for _ in factors) + " ELSE 1.0 END"
+        parameters = [value for factor in factors for value in factor]
+        return expr, parameters
+    
+    def _get_total_in_base_currency(self, start_date=None, end_date=None, asset_type=None):
+        """获取指定范围内的基准货币盈亏总额"""
+        groups = self._aggregate_in_base_currency(None, start_date, end_date, asset_type)
+        return sum(group['profit_loss'] for group in groups.values())
+    
+    def _get_daily_totals(self, start_date=None, end_date=None):
+        """获取每日基准货币盈亏，返回按日期升序的[(日期字符串, 盈亏), ...]"""
+        groups = self._aggregate_in_base_currency(
+            "date",
+            start_date or "1970-01-01",
+            end_date or datetime.date.today().isoformat()
+        )
+        return sorted((date, group['profit_loss']) for date, group in groups.items())
     
     def get_profit_loss_summary(self, period="month", start_date=None, end_date=None):
         """
         获取指定时间段内的盈亏汇总
         period: 汇总周期，可以是"day", "week", "month", "year"
         """
-        # 获取指定时间段内的所有交易
+        # 确定统计时间范围
         if not start_date:
             # 默认为过去6个月
-            end_date = datetime.date.today()
-            start_date = (end_date - datetime.timedelta(days=180)).isoformat()
+            end_date = datetime.date.today().isoformat()
+            start_date = (datetime.date.today() - datetime.timedelta(days=180)).isoformat()
         
         if not end_date:
             end_date = datetime.date.today().isoformat()
         
-        transactions = self.db_manager.get_transactions_by_date_range(start_date, end_date)
+        # 按日/月/年在数据库中分组汇总，周数据由日小计合并得到
+        if period == "month":
+            group_expr = "substr(date, 1, 7)"
+        elif period == "year":
+            group_expr = "substr(date, 1, 4)"
+        else:
+            group_expr = "date"
+        subtotals = self._aggregate_in_base_currency(group_expr, start_date, end_date)
         
         # 按周期分组
-        groups = defaultdict(list)
-        for trans in transactions:
-            date_obj = datetime.date.fromisoformat(trans.date)
-            
-            if period == "day":
-                key = trans.date
-            elif period == "week":
+        groups = defaultdict(lambda: {'profit_loss': 0, 'transaction_count': 0})
+        for key, subtotal in subtotals.items():
+            if period == "week":
                 # 使用年份和周数作为键
-                year, week, _ = date_obj.isocalendar()
+                year, week, _ = datetime.date.fromisoformat(key).isocalendar()
                 key = f"{year}-W{week:02d}"
-            elif period == "month":
-                key = f"{date_obj.year}-{date_obj.month:02d}"
-            elif period == "year":
-                key = str(date_obj.year)
-            else:
-                key = trans.date
             
-            groups[key].append(trans)
+            groups[key]['profit_loss'] += subtotal['profit_loss']
+            groups[key]['transaction_count'] += subtotal['transaction_count']
         
         # 计算每个分组的盈亏总额
         summary = []
-        for key, group_transactions in sorted(groups.items()):
-            total_profit_loss = sum(t.profit_loss for t in group_transactions)
-            count = len(group_transactions)
+        for key, group in sorted(groups.items()):
+            total_profit_loss = group['profit_loss']
+            count = group['transaction_count']
             
-            # 生成标签
-            if period == "day":
-                label = key
-            elif period == "week":
-                # 解析出年份和周数
-                year_str, week_str = key.split('-W')
-                year = int(year_str)
-                week = int(week_str)
-                # 使用周数表示
-                label = f"第{week}周"
-            elif period == "month":
-                # 解析出年份和月份
-                year_str, month_str = key.split('-')
-                year = int(year_str)
-                month = int(month_str)
-                # 使用月份名称
-                month_name = calendar.month_name[month]
-                label = f"{month_name}"
-            elif period == "year":
-                label = key
+            label = period_label(period, key)
             
             summary.append({
                 'key': key,
@@ -89,29 +235,77 @@ class DataAnalyzer:
     def get_asset_type_distribution(self, start_date=None, end_date=None):
         """获取资产类别分布"""
         # 如果未指定日期范围，则使用全部数据
-        transactions = self.db_manager.get_transactions_by_date_range(
+        groups = self._aggregate_in_base_currency(
+            "asset_type",
             start_date or "1970-01-01",
             end_date or datetime.date.today().isoformat()
         )
         
-        # 按资产类别分组
-        groups = defaultdict(list)
-        for trans in transactions:
-            groups[trans.asset_type].append(trans)
-        
         # 计算每种资产类别的盈亏总额
+        distribution = [
+            {
+                'asset_type': asset_type,
+                'profit_loss': group['profit_loss'],
+                'transaction_count': group['transaction_count']
+            }
+            for asset_type, group in groups.items()
+        ]
+        
+        # 按盈亏金额排序
+        distribution.sort(key=lambda x: abs(x['profit_loss']), reverse=True)
+        
+        return distribution
+    
+    def get_profit_loss_distribution(self, group_by="asset_type", bins=10, start_date=None, end_date=None):
+        """
+        获取盈亏分布：直方图、分位数、均值和标准差
+        group_by: 分组方式，"asset_type"、"project" 或 "tag"
+        bins: 直方图分箱数
+        统计全部在数据库中按集合计算，Python只做分位数插值和分箱边界
+        """
+        bins = max(1, int(bins))
+        quantile_names = [('p5', 0.05), ('p25', 0.25), ('median', 0.5), ('p75', 0.75), ('p95', 0.95)]
+        amount_expr, amount_params = self._base_amount_sql()
+        
+        groups = self.db_manager.get_profit_loss_distribution(
+            group_by=group_by,
+            amount_expr=amount_expr,
+            amount_params=amount_params,
+            quantiles=[q for _, q in quantile_names],
+            bins=bins,
+            start_date=start_date,
+            end_date=end_date
+        )
+        
         distribution = []
-        for asset_type, group_transactions in groups.items():
-            total_profit_loss = sum(t.profit_loss for t in group_transactions)
-            count = len(group_transactions)
+        for group in groups:
+            count = group['count']
+            
+            # 相邻次序统计量之间线性插值
+            percentiles = {}
+            for (name, q), (low, high) in zip(quantile_names, group['quantiles']):
+                position = (count - 1) * q
+                fraction = position - int(position)
+                percentiles[name] = low + (high - low) * fraction
+            
+            # 等宽分箱边界
+            width = (group['max'] - group['min']) / bins
+            edges = [group['min'] + width * i for i in range(bins)] + [group['max']]
+            counts = [group['bin_counts'].get(i, 0) for i in range(bins)]
             
             distribution.append({
-                'asset_type': asset_type,
-                'profit_loss': total_profit_loss,
-                'transaction_count': count
+                'group': group['group'],
+                'transaction_count': count,
+                'profit_loss': group['total'],
+                'mean': group['mean'],
+                'stdev': group['stdev'],
+                'min': group['min'],
+                'max': group['max'],
+                'percentiles': percentiles,
+                'histogram': {'edges': edges, 'counts': counts}
             })
         
-        # 按盈亏金额排序
+        # 与资产类别分布一致，按盈亏金额排序
         distribution.sort(key=lambda x: abs(x['profit_loss']), reverse=True)
         
         return distribution
@@ -130,8 +324,8 @@ class DataAnalyzer:
         first_day = datetime.date(year, month, 1).isoformat()
         last_day = datetime.date(year, month, calendar.monthrange(year, month)[1]).isoformat()
         
-        # 获取本月实际盈亏
-        actual_profit_loss = self.db_manager.get_total_profit_loss(first_day, last_day)
+        # 获取本月实际盈亏（基准货币）
+        actual_profit_loss = self._get_total_in_base_currency(first_day, last_day)
         
         # 获取本月目标
         goal_amount = self.db_manager.get_budget_goal(year, month)
@@ -159,14 +353,11 @@ class DataAnalyzer:
         first_day = datetime.date(year, 1, 1).isoformat()
         last_day = datetime.date(year, 12, 31).isoformat()
         
-        # 获取本年实际盈亏
-        actual_profit_loss = self.db_manager.get_total_profit_loss(first_day, last_day)
+        # 获取本年实际盈亏（基准货币）
+        actual_profit_loss = self._get_total_in_base_currency(first_day, last_day)
         
         # 计算年度目标（所有月度目标之和）
-        yearly_goal = 0
-        for month in range(1, 13):
-            monthly_goal = self.db_manager.get_budget_goal(year, month)
-            yearly_goal += monthly_goal
+        yearly_goal = self.db_manager.get_yearly_budget_goal(year)
         
         # 计算完成百分比
         completion_percentage = (actual_profit_loss / yearly_goal * 100) if yearly_goal != 0 else 0
@@ -178,21 +369,82 @@ class DataAnalyzer:
             'completion_percentage': completion_percentage
         }
     
+    def _load_budget_state(self):
+        """从数据库加载当月/当年的实际盈亏与预算目标"""
+        today = datetime.date.today()
+        year = today.year
+        month = today.month
+        
+        # 一次按月分组的查询同时得到当月和当年的实际盈亏
+        monthly_totals = self._aggregate_in_base_currency(
+            "substr(date, 1, 7)",
+            datetime.date(year, 1, 1).isoformat(),
+            datetime.date(year, 12, 31).isoformat()
+        )
+        month_key = f"{year}-{month:02d}"
+        
+        self._budget_state = {
+            'year': year,
+            'month': month,
+            'monthly_actual': monthly_totals[month_key]['profit_loss'] if month_key in monthly_totals else 0,
+            'yearly_actual': sum(group['profit_loss'] for group in monthly_totals.values()),
+            'monthly_goal': self.db_manager.get_budget_goal(year, month),
+            'yearly_goal': self.db_manager.get_yearly_budget_goal(year)
+        }
+        return self._budget_state
+    
+    def _get_budget_state(self):
+        """获取预算内存状态，首次使用或跨月后重新加载"""
+        state = self._budget_state
+        today = datetime.date.today()
+        if not state or state['year'] != today.year or state['month'] != today.month:
+            state = self._load_budget_state()
+        return state
+    
+    def invalidate_budget_state(self):
+        """使预算内存状态失效（预算目标修改或批量导入后调用）"""
+        self._budget_state = None
+    
+    def _on_transaction_changed(self, old_transaction, new_transaction):
+        """交易变更回调，按变更记录的差量更新当月/当年实际盈亏"""
+        if old_transaction is None and new_transaction is None:
+            # 批量变更无法逐条计算差量，下次使用时重新加载
+            self.invalidate_budget_state()
+            return
+        
+        state = self._budget_state
+        if not state:
+            return
+        
+        year_prefix = f"{state['year']}-"
+        month_prefix = f"{state['year']}-{state['month']:02d}-"
+        changes = [(t, sign) for t, sign in ((old_transaction, -1), (new_transaction, 1)) if t is not None]
+        rates = self._get_rate_table({t.currency for t, _ in changes})
+        
+        for transaction, sign in changes:
+            date_str = str(transaction.date)
+            if not date_str.startswith(year_prefix):
+                continue
+            delta = sign * (transaction.profit_loss or 0) * rates.get(transaction.currency, 1.0)
+            state['yearly_actual'] += delta
+            if date_str.startswith(month_prefix):
+                state['monthly_actual'] += delta
+    
     def check_budget_alerts(self):
         """
         检查预算告警情况
         返回需要显示告警的预算目标列表
+        实际盈亏与目标取自内存状态，不再每次扫描交易表
         """
         alerts = []
-        today = datetime.date.today()
-        current_year = today.year
-        current_month = today.month
+        state = self._get_budget_state()
+        current_year = state['year']
+        current_month = state['month']
         
         # 检查当月预算
-        monthly_comparison = self.get_monthly_goal_comparison(current_year, current_month)
-        if monthly_comparison['goal_amount'] > 0:
+        if state['monthly_goal'] > 0:
             # 计算实际盈亏与目标的比率
-            ratio = abs(monthly_comparison['actual_amount']) / monthly_comparison['goal_amount']
+            ratio = abs(state['monthly_actual']) / state['monthly_goal']
             
             # 如果实际盈亏接近或超过目标，添加到告警列表
             if ratio >= self.budget_alert_threshold:
@@ -200,31 +452,44 @@ class DataAnalyzer:
                     'type': 'monthly',
                     'year': current_year,
                     'month': current_month,
-                    'goal_amount': monthly_comparison['goal_amount'],
-                    'actual_amount': monthly_comparison['actual_amount'],
+                    'goal_amount': state['monthly_goal'],
+                    'actual_amount': state['monthly_actual'],
                     'ratio': ratio,
                     'message': f"当月盈亏已达到目标的{ratio*100:.1f}%"
                 })
         
         # 检查年度预算
-        yearly_comparison = self.get_yearly_goal_comparison(current_year)
-        if yearly_comparison['goal_amount'] > 0:
+        if state['yearly_goal'] > 0:
             # 计算实际盈亏与目标的比率
-            ratio = abs(yearly_comparison['actual_amount']) / yearly_comparison['goal_amount']
+            ratio = abs(state['yearly_actual']) / state['yearly_goal']
             
             # 如果实际盈亏接近或超过目标，添加到告警列表
             if ratio >= self.budget_alert_threshold:
                 alerts.append({
                     'type': 'yearly',
                     'year': current_year,
-                    'goal_amount': yearly_comparison['goal_amount'],
-                    'actual_amount': yearly_comparison['actual_amount'],
+                    'goal_amount': state['yearly_goal'],
+                    'actual_amount': state['yearly_actual'],
                     'ratio': ratio,
                     'message': f"{current_year}年度盈亏已达到目标的{ratio*100:.1f}%"
                 })
         
         return alerts
     
+    def get_new_budget_alerts(self):
+        """
+        获取本次新越过阈值的预算告警
+        已处于告警状态的预算不会重复返回；回落到阈值以下后再次越过时会重新返回
+        """
+        alerts = self.check_budget_alerts()
+        active = {(alert['type'], alert['year'], alert.get('month')) for alert in alerts}
+        new_alerts = [
+            alert for alert in alerts
+            if (alert['type'], alert['year'], alert.get('month')) not in self._active_budget_alerts
+        ]
+        self._active_budget_alerts = active
+        return new_alerts
+    
     def set_budget_alert_threshold(self, threshold):
         """
         设置预算告警阈值
@@ -241,23 +506,19 @@ class DataAnalyzer:
         limit: 返回数量
         is_profit: True获取盈利最多的项目，False获取亏损最多的项目
         """
-        transactions = self.db_manager.get_transactions_by_date_range(
+        # 按项目名称分组
+        projects = self._aggregate_in_base_currency(
+            "project_name",
             start_date or "1970-01-01",
             end_date or datetime.date.today().isoformat()
         )
         
-        # 按项目名称分组
-        projects = defaultdict(lambda: {'total_profit_loss': 0, 'transactions': []})
-        for trans in transactions:
-            projects[trans.project_name]['total_profit_loss'] += trans.profit_loss
-            projects[trans.project_name]['transactions'].append(trans)
-        
         # 转换为列表并排序
         project_list = [
             {
                 'project_name': name,
-                'total_profit_loss': data['total_profit_loss'],
-                'transaction_count': len(data['transactions'])
+                'total_profit_loss': data['profit_loss'],
+                'transaction_count': data['transaction_count']
             }
             for name, data in projects.items()
         ]
@@ -275,89 +536,144 @@ class DataAnalyzer:
         # 返回前N个项目
         return project_list[:limit]
     
-    def get_profit_loss_trend(self, period="month", count=6):
+    def get_profit_loss_series(self, period="month", count=6, end_date=None):
         """
-        获取盈亏趋势数据，用于生成趋势图
+        获取补全空档的盈亏序列，恰好返回count个连续周期
         period: "day", "week", "month", "year"
-        count: 返回的数据点数量
+        end_date: 最后一个周期包含的日期，默认为今天
+        没有交易的周期盈亏为0，由数据库一次查询生成；count不大于0时返回空列表
         """
-        today = datetime.date.today()
+        if count <= 0:
+            return []
+        if period not in ("day", "week", "month", "year"):
+            period = "day"
         
-        # 计算开始日期
-        if period == "day":
-            start_date = (today - datetime.timedelta(days=count-1)).isoformat()
-        elif period == "week":
-            start_date = (today - datetime.timedelta(weeks=count-1)).isoformat()
-        elif period == "month":
-            # 减去count-1个月
-            month = today.month - (count - 1)
-            year = today.year
-            while month <= 0:
-                month += 12
-                year -= 1
-            start_date = datetime.date(year, month, 1).isoformat()
-        elif period == "year":
-            start_date = datetime.date(today.year - (count - 1), 1, 1).isoformat()
-        else:
-            start_date = (today - datetime.timedelta(days=30*count)).isoformat()
-        
-        # 获取趋势数据
-        trend_data = self.get_profit_loss_summary(period, start_date, today.isoformat())
+        amount_expr, amount_params = self._base_amount_sql()
+        rows = self.db_manager.get_profit_loss_series(period, count, end_date, amount_expr, amount_params)
         
-        # 确保返回的数据点数量正确
-        if len(trend_data) > count:
-            trend_data = trend_data[-count:]
+        series = []
+        for row in rows:
+            start = datetime.date.fromisoformat(row['start_date'])
+            if period == "day":
+                key = row['start_date']
+            elif period == "week":
+                year, week, _ = start.isocalendar()
+                key = f"{year}-W{week:02d}"
+            elif period == "month":
+                key = f"{start.year}-{start.month:02d}"
+            else:
+                key = str(start.year)
+            
+            series.append({
+                'key': key,
+                'label': period_label(period, key),
+                'start_date': row['start_date'],
+                'end_date': row['end_date'],
+                'profit_loss': row['total'],
+                'transaction_count': row['count']
+            })
         
-        return trend_data
+        return series
+    
+    def get_profit_loss_trend(self, period="month", count=6):
+        """
+        获取盈亏趋势数据，用于生成趋势图
+        period: "day", "week", "month", "year"
+        count: 返回的数据点数量，没有交易的周期补0
+        """
+        return self.get_profit_loss_series(period, count)
 
     def get_monthly_profit_loss_last_year(self):
         """
         获取过去12个月每个月的盈亏数据。
         返回格式: [{'month': 'YYYY-MM', 'profitLoss': float}, ...]
         """
-        today = datetime.date.today()
-        results = []
-
-        for i in range(12):
-            # 计算每个月的时间范围
-            target_month_date = today - datetime.timedelta(days=i * 30) # 近似计算月份，然后精确
-            year = target_month_date.year
-            month = target_month_date.month
-            
-            # 确保我们总是从当前月份或更早的月份开始，倒序排列12个月
-            # 更精确的计算方式是逐月递减
-            current_target_date = datetime.date(today.year, today.month, 1)
-            if i > 0:
-                # 逐月递减
-                # (current_month - 1 - i) < 0 时，年份需要调整
-                month_offset = today.month - 1 - i # 0-indexed month
-                year_offset = 0
-                while month_offset < 0:
-                    month_offset += 12
-                    year_offset -=1
-                target_year = today.year + year_offset
-                target_month = month_offset + 1 # 1-indexed month
-                current_target_date = datetime.date(target_year, target_month, 1)
-            
-            year = current_target_date.year
-            month = current_target_date.month
+        # 补全空档的月度序列，已按时间升序排列（从最早的月份到最近的月份），符合QML的期望
+        return [
+            {'month': item['key'], 'profitLoss': item['profit_loss']}
+            for item in self.get_profit_loss_series("month", 12)
+        ]
 
-            month_str = f"{year}-{month:02d}"
-            
-            # 获取该月的第一天和最后一天
-            first_day_of_month = datetime.date(year, month, 1)
-            last_day_of_month = datetime.date(year, month, calendar.monthrange(year, month)[1])
-            
-            # 获取该月的盈亏总额
-            profit_loss = self.db_manager.get_total_profit_loss(
-                first_day_of_month.isoformat(), 
-                last_day_of_month.isoformat()
-            )
-            
-            results.append({
-                'month': month_str,
-                'profitLoss': profit_loss if profit_loss is not None else 0
-            })
+    def get_daily_profit_loss_series(self, start_date=None, end_date=None, max_points=None,
+                                     preserve_extremes=False, cumulative=True):
+        """
+        获取每日盈亏序列，并按图表宽度降采样
+        max_points: 目标点数，通常由chart_points_for_width根据像素宽度得出；None表示不降采样
+        preserve_extremes: True使用保留极值的降采样，False使用LTTB
+        cumulative: True返回累计盈亏曲线，False返回每日盈亏
+        返回格式: {'dates': [...], 'values': [...], 'total_points': int}
+        """
+        daily_totals = self._get_daily_totals(start_date, end_date)
+        
+        # 以日期序数作为x轴，保证非交易日的间隔在降采样时被正确计入
+        points = []
+        running_total = 0
+        for date_str, profit_loss in daily_totals:
+            try:
+                x = datetime.date.fromisoformat(date_str).toordinal()
+            except ValueError:
+                continue
+            running_total += profit_loss
+            points.append((x, running_total if cumulative else profit_loss))
+        
+        total_points = len(points)
+        if max_points:
+            if preserve_extremes:
+                points = downsample_min_max(points, max_points)
+            else:
+                points = downsample_lttb(points, max_points)
+        
+        return {
+            'dates': [datetime.date.fromordinal(x).isoformat() for x, _ in points],
+            'values': [y for _, y in points],
+            'total_points': total_points
+        }
 
-        # QML希望数据是按时间升序排列的（从最早的月份到最近的月份）
-        return sorted(results, key=lambda x: x['month'])
\ No newline at end of file
+    def get_daily_heatmap(self, start_date=None, end_date=None):
+        """
+        获取日历热力图数据，每年一条紧凑的稠密序列
+        默认范围为最近5个自然年
+        返回格式: {
+            'years': [{'year': 2024, 'start': 'YYYY-MM-DD', 'start_weekday': 0-6, 'values': [float, ...]}, ...],
+            'min': float, 'max': float
+        }
+        values按天连续排列，从start开始，无交易的日期为0
+        """
+        today = datetime.date.today()
+        end = datetime.date.fromisoformat(end_date) if end_date else today
+        start = datetime.date.fromisoformat(start_date) if start_date else datetime.date(end.year - 4, 1, 1)
+        if start > end:
+            return {'years': [], 'min': 0, 'max': 0}
+        
+        # 每年一个稠密数组，首尾年份按范围截断
+        years = {}
+        for year in range(start.year, end.year + 1):
+            year_start = max(start, datetime.date(year, 1, 1))
+            year_end = min(end, datetime.date(year, 12, 31))
+            years[year] = {
+                'year': year,
+                'start': year_start.isoformat(),
+                'start_weekday': year_start.weekday(),
+                'values': [0] * ((year_end - year_start).days + 1)
+            }
+        
+        # 一次分组查询得到每日盈亏，填入对应年份的数组
+        min_value = 0
+        max_value = 0
+        for date_str, profit_loss in self._get_daily_totals(start.isoformat(), end.isoformat()):
+            try:
+                date_obj = datetime.date.fromisoformat(date_str)
+            except ValueError:
+                continue
+            year_data = years[date_obj.year]
+            index = (date_obj - datetime.date.fromisoformat(year_data['start'])).days
+            value = round(profit_loss, 2)
+            year_data['values'][index] = value
+            min_value = min(min_value, value)
+            max_value = max(max_value, value)
+        
+        return {
+            'years': [years[year] for year in sorted(years)],
+            'min': min_value,
+            'max': max_value
+        }
\ No newline at end of file
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import datetime
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from analyzer import period_label
+
+# 各汇总周期在数据库中的分组表达式，周数据由日小计合并得到
+PERIOD_GROUP_EXPRS = {
+    "day": "date",
+    "week": "date",
+    "month": "substr(date, 1, 7)",
+    "year": "substr(date, 1, 4)",
+}
+
+
+def aggregate_user_database(db_path, period, start_date, end_date):
+    """
+    以只读方式打开单个用户数据库，按(分组, 币种)汇总盈亏
+    在子进程中运行，只返回可序列化的小计，不做币种换算
+    返回: {'summary': [...], 'asset_type': [...], 'project': [...]}，
+    每项为(分组键, 币种, 合计, 笔数)
+    """
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        cursor = conn.cursor()
+        partial = {}
+        for name, group_expr in (
+            ("summary", PERIOD_GROUP_EXPRS.get(period, "date")),
+            ("asset_type", "asset_type"),
+            ("project", "project_name"),
+        ):
+            cursor.execute(f"""
+                SELECT {group_expr} AS group_key, currency, SUM(profit_loss), COUNT(*)
+                FROM transactions
+                WHERE date >= ? AND date <= ?
+                GROUP BY {group_expr}, currency
+            """, (start_date, end_date))
+            partial[name] = [tuple(row) for row in cursor.fetchall()]
+        return partial
+    finally:
+        conn.close()
+
+
+class ConsolidatedAnalyzer:
+    """多用户合并分析类，并行汇总各用户数据库后合并结果"""
+
+    def __init__(self, user_manager, currency_manager=None, max_workers=None):
+        """
+        初始化合并分析器
+        max_workers: 最大进程数，默认为CPU核数
+        """
+        self.user_manager = user_manager
+        self.currency_manager = currency_manager
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def _collect_partials(self, usernames, period, start_date, end_date):
+        """
+        每个用户数据库交给一个工作进程汇总
+        返回: ([(用户名, 小计)], [失败的用户名])
+        """
+        jobs = []
+        for username in usernames:
+            db_path = self.user_manager.get_user_db_path(username)
+            if os.path.exists(db_path):
+                jobs.append((username, db_path))
+
+        partials = []
+        failed = []
+
+        def run_inline():
+            for username, db_path in jobs:
+                try:
+                    partials.append((username, aggregate_user_database(db_path, period, start_date, end_date)))
+                except Exception as e:
+                    print(f"汇总用户 {username} 的数据失败: {e}")
+                    failed.append(username)
+
+        # 只有一个数据库时无需启动进程池
+        if len(jobs) <= 1:
+            run_inline()
+            return partials, failed
+
+        try:
+            with ProcessPoolExecutor(max_workers=min(len(jobs), self.max_workers)) as executor:
+                futures = [
+                    (username, executor.submit(aggregate_user_database, db_path, period, start_date, end_date))
+                    for username, db_path in jobs
+                ]
+                for username, future in futures:
+                    try:
+                        partials.append((username, future.result()))
+                    except Exception as e:
+                        print(f"汇总用户 {username} 的数据失败: {e}")
+                        failed.append(username)
+        except Exception as e:
+            # 进程池不可用时退回到当前进程逐个汇总
+            print(f"进程池汇总失败，改为顺序汇总: {e}")
+            partials.clear()
+            failed.clear()
+            run_inline()
+
+        return partials, failed
+
+    def _get_rate_table(self, currencies):
+        """获取各币种到基准货币的换算系数"""
+        if not self.currency_manager:
+            return {currency: 1.0 for currency in currencies}
+        return self.currency_manager.get_rate_table(currencies)
+
+    def get_consolidated_report(self, period="month", start_date=None, end_date=None,
+                                top_limit=5, usernames=None):
+        """
+        获取所有用户的合并报表
+        period: 汇总周期，可以是"day", "week", "month", "year"
+        usernames: 参与合并的用户，默认为全部用户
+        各用户的小计只在合并时换算一次币种，换算系数对所有用户共用
+        """
+        if period not in PERIOD_GROUP_EXPRS:
+            period = "month"
+        start_date = start_date or "1970-01-01"
+        end_date = end_date or datetime.date.today().isoformat()
+        if usernames is None:
+            usernames = self.user_manager.get_users()
+
+        partials, failed = self._collect_partials(usernames, period, start_date, end_date)
+
+        currencies = {
+            row[1]
+            for _, partial in partials
+            for rows in partial.values()
+            for row in rows
+        }
+        rates = self._get_rate_table(currencies)
+
+        def merge(rows, groups, key_func=None):
+            for key, currency, total, count in rows:
+                if key_func:
+                    key = key_func(key)
+                groups[key]['profit_loss'] += (total or 0) * rates.get(currency, 1.0)
+                groups[key]['transaction_count'] += count
+
+        def week_key(date_str):
+            year, week, _ = datetime.date.fromisoformat(date_str).isocalendar()
+            return f"{year}-W{week:02d}"
+
+        new_group = lambda: {'profit_loss': 0, 'transaction_count': 0}
+        summary_groups = defaultdict(new_group)
+        asset_groups = defaultdict(new_group)
+        project_groups = defaultdict(new_group)
+        users = []
+
+        for username, partial in partials:
+            merge(partial['summary'], summary_groups, week_key if period == "week" else None)
+            merge(partial['project'], project_groups)
+
+            # 用户合计由资产类别小计得到
+            user_groups = defaultdict(new_group)
+            merge(partial['asset_type'], user_groups)
+            merge(partial['asset_type'], asset_groups)
+            users.append({
+                'username': username,
+                'profit_loss': sum(g['profit_loss'] for g in user_groups.values()),
+                'transaction_count': sum(g['transaction_count'] for g in user_groups.values())
+            })
+
+        summary = [
+            {
+                'key': key,
+                'label': period_label(period, key),
+                'profit_loss': group['profit_loss'],
+                'transaction_count': group['transaction_count']
+            }
+            for key, group in sorted(summary_groups.items())
+        ]
+
+        asset_distribution = [
+            {
+                'asset_type': asset_type,
+                'profit_loss': group['profit_loss'],
+                'transaction_count': group['transaction_count']
+            }
+            for asset_type, group in asset_groups.items()
+        ]
+        asset_distribution.sort(key=lambda x: abs(x['profit_loss']), reverse=True)
+
+        project_list = [
+            {
+                'project_name': name,
+                'total_profit_loss': group['profit_loss'],
+                'transaction_count': group['transaction_count']
+            }
+            for name, group in project_groups.items()
+        ]
+        top_profit = sorted(
+            (p for p in project_list if p['total_profit_loss'] > 0),
+            key=lambda x: x['total_profit_loss'], reverse=True
+        )[:top_limit]
+        top_loss = sorted(
+            (p for p in project_list if p['total_profit_loss'] < 0),
+            key=lambda x: x['total_profit_loss']
+        )[:top_limit]
+
+        return {
+            'users': users,
+            'failed_users': failed,
+            'summary': summary,
+            'asset_distribution': asset_distribution,
+            'top_profit_projects': top_profit,
+            'top_loss_projects': top_loss,
+            'total_profit_loss': sum(user['profit_loss'] for user in users),
+            'transaction_count': sum(user['transaction_count'] for user in users)
+        }
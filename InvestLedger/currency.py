@@ -3,11 +3,16 @@
 
 import os
 import json
+import time
 import datetime
+import threading
 import urllib.request
 import urllib.error
 from pathlib import Path
 
+# 后台刷新汇率失败或缓存仍缺少汇率时，两次尝试之间的最短间隔（秒）
+RATE_REFRESH_INTERVAL = 600
+
 class CurrencyManager:
     """货币汇率管理类，负责获取和缓存汇率数据"""
     
@@ -20,6 +25,11 @@ class CurrencyManager:
         self.base_currency = base_currency
         self.exchange_rates = {}
         self.last_update = None
+        # 上次后台刷新的时间（time.monotonic），用于限制刷新频率
+        self.last_refresh_attempt = None
+        self.refresh_thread = None
+        # 后台刷新得到新汇率后调用的回调，签名为 callback()，在刷新线程中调用
+        self.rates_listeners = []
         self.cache_file = os.path.join(os.getenv('APPDATA'), 'InvestLedger', 'exchange_rates.json')
         
         # 确保缓存目录存在
@@ -87,6 +97,40 @@ class CurrencyManager:
             print(f"更新汇率失败: {e}")
             return False
     
+    def add_rates_listener(self, callback):
+        """注册汇率刷新回调"""
+        self.rates_listeners.append(callback)
+    
+    def refresh_rates_async(self):
+        """在后台线程中更新汇率，不阻塞调用方
+        
+        正在刷新或距上次尝试不足RATE_REFRESH_INTERVAL秒时不再发起，
+        离线时不会反复请求。
+        
+        Returns:
+            bool: 是否发起了刷新
+        """
+        if self.refresh_thread and self.refresh_thread.is_alive():
+            return False
+        now = time.monotonic()
+        if self.last_refresh_attempt is not None and now - self.last_refresh_attempt < RATE_REFRESH_INTERVAL:
+            return False
+        self.last_refresh_attempt = now
+        self.refresh_thread = threading.Thread(target=self._refresh_rates, name="rate-refresh", daemon=True)
+        self.refresh_thread.start()
+        return True
+    
+    def _refresh_rates(self):
+        """刷新线程主体，汇率有变化时通知监听器"""
+        old_rates = self.exchange_rates
+        if not self.update_rates() or self.exchange_rates is old_rates:
+            return
+        for callback in list(self.rates_listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"汇率刷新回调失败: {e}")
+    
     def get_rate(self, currency_code):
         """获取指定货币相对于基准货币的汇率
         
@@ -137,7 +181,54 @@ class CurrencyManager:
         # 计算转换后的金额
         # 先转换为基准货币，再转换为目标货币
         return amount * (to_rate / from_rate)
-    
+
+    def get_rate_table(self, currencies, to_currency=None):
+        """批量获取换算系数表
+
+        只读取缓存，不等待网络：缺失的汇率按1.0计算，并在后台刷新汇率，
+        可在界面线程和交易写入回调中调用。适合对按币种分组的汇总结果做整体换算。
+
+        Args:
+            currencies: 货币代码集合
+            to_currency: 目标货币代码，默认为基准货币
+
+        Returns:
+            dict: {货币代码: 换算系数}，金额乘以系数即为目标货币金额
+        """
+        if to_currency is None:
+            to_currency = self.base_currency
+
+        currencies = {c for c in currencies if c}
+
+        # 缓存中缺少需要的汇率时在后台刷新，本次按1.0计算
+        needed = (currencies | {to_currency}) - {self.base_currency}
+        if any(c not in self.exchange_rates for c in needed):
+            self.refresh_rates_async()
+
+        def cached_rate(code):
+            if code == self.base_currency:
+                return 1.0
+            return float(self.exchange_rates.get(code, 1.0))
+
+        to_rate = cached_rate(to_currency)
+        return {
+            code: (1.0 if code == to_currency else to_rate / cached_rate(code))
+            for code in currencies
+        }
+
+    def convert_totals(self, totals_by_currency, to_currency=None):
+        """将按币种分组的金额合计换算为目标货币总额
+
+        Args:
+            totals_by_currency: {货币代码: 金额}
+            to_currency: 目标货币代码，默认为基准货币
+
+        Returns:
+            float: 换算后的总额
+        """
+        rates = self.get_rate_table(totals_by_currency.keys(), to_currency)
+        return sum(amount * rates.get(code, 1.0) for code, amount in totals_by_currency.items())
+
     def get_available_currencies(self):
         """获取可用的货币列表
         
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import datetime
+
+# 支持的日期格式：(名称, strptime格式, 快速匹配正则)
+# 正则按年、月、日分组，与strptime一样允许一位数的月和日
+DATE_FORMATS = [
+    ('iso', '%Y-%m-%d', re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})$')),                      # 2023-01-01
+    ('slash', '%Y/%m/%d', re.compile(r'(\d{4})/(\d{1,2})/(\d{1,2})$')),                    # 2023/01/01
+    ('chinese', '%Y年%m月%d日', re.compile(r'(\d{4})年(\d{1,2})月(\d{1,2})日$')),           # 2023年01月01日
+    ('dot', '%Y.%m.%d', re.compile(r'(\d{4})\.(\d{1,2})\.(\d{1,2})$')),                    # 2023.01.01
+    ('iso_datetime', '%Y-%m-%d %H:%M:%S',
+     re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2}) \d{1,2}:\d{1,2}:\d{1,2}$')),                 # Excel单元格读出的时间戳
+]
+
+# 推断格式时使用的样本数
+DEFAULT_SAMPLE_SIZE = 200
+
+
+def _is_fixed_width_iso(value):
+    """是否为定长的YYYY-MM-DD字符串"""
+    return (len(value) == 10 and value[4] == '-' and value[7] == '-'
+            and value[:4].isdigit() and value[5:7].isdigit() and value[8:].isdigit())
+
+
+class DateParser:
+    """日期解析器
+
+    从一列日期的样本中推断格式，之后按推断的格式走快速路径：
+    定长ISO字符串直接切片，其他格式用一个预编译正则匹配。
+    只有不符合推断格式的值才逐个尝试全部格式。
+    """
+
+    def __init__(self, format_name=None):
+        """
+        Args:
+            format_name: 已知的格式名称，None表示尚未推断
+        """
+        self.format_name = None
+        self.pattern = None
+        self.sample_size = 0
+        self.sample_matched = 0
+
+        # 解析统计
+        self.fast_count = 0      # 快速路径解析成功
+        self.fallback_count = 0  # 回退到逐个尝试格式后成功
+        self.failed_count = 0    # 无法识别，保留原值
+
+        if format_name:
+            self._set_format(format_name)
+
+    def _set_format(self, format_name):
+        """设置快速路径使用的格式"""
+        for name, _, pattern in DATE_FORMATS:
+            if name == format_name:
+                self.format_name = name
+                self.pattern = pattern
+                return
+
+    @classmethod
+    def from_samples(cls, values, sample_size=DEFAULT_SAMPLE_SIZE):
+        """根据样本推断格式并创建解析器"""
+        parser = cls()
+        parser.infer(values, sample_size)
+        return parser
+
+    def infer(self, values, sample_size=DEFAULT_SAMPLE_SIZE):
+        """
+        从样本中推断日期格式，选择匹配数最多的格式
+
+        Args:
+            values: 日期值序列，空值会被忽略
+            sample_size: 最多检查的非空样本数
+
+        Returns:
+            str: 推断的格式名称，无法推断时为None
+        """
+        samples = []
+        for value in values:
+            if value is None:
+                continue
+            value = str(value).strip()
+            if value:
+                samples.append(value)
+                if len(samples) >= sample_size:
+                    break
+
+        best_name, best_count = None, 0
+        for name, _, pattern in DATE_FORMATS:
+            count = sum(1 for value in samples if pattern.match(value))
+            if count > best_count:
+                best_name, best_count = name, count
+
+        self.sample_size = len(samples)
+        self.sample_matched = best_count
+        self.format_name = None
+        self.pattern = None
+        if best_name:
+            self._set_format(best_name)
+        return self.format_name
+
+    def parse(self, value):
+        """
+        把日期值转换为YYYY-MM-DD
+
+        Returns:
+            str: 转换后的日期；无法识别时返回去除空格的原值
+        """
+        value = value.strip() if isinstance(value, str) else str(value).strip()
+
+        date_str = self._parse_fast(value)
+        if date_str:
+            self.fast_count += 1
+            return date_str
+
+        date_str = self._parse_slow(value)
+        if date_str:
+            self.fallback_count += 1
+            return date_str
+
+        self.failed_count += 1
+        return value
+
+    def _parse_fast(self, value):
+        """按推断的格式解析，不符合时返回None"""
+        if self.format_name == 'iso' and _is_fixed_width_iso(value):
+            year, month, day = value[:4], value[5:7], value[8:]
+        elif self.pattern:
+            match = self.pattern.match(value)
+            if not match:
+                return None
+            year, month, day = match.groups()
+        else:
+            return None
+
+        try:
+            return datetime.date(int(year), int(month), int(day)).isoformat()
+        except ValueError:
+            return None
+
+    def _parse_slow(self, value):
+        """逐个尝试全部格式"""
+        for _, fmt, _ in DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(value, fmt).date().isoformat()
+            except ValueError:
+                continue
+        return None
+
+    def formats_in_order(self):
+        """返回strptime格式列表，推断的格式排在最前"""
+        formats = [fmt for name, fmt, _ in DATE_FORMATS if name == self.format_name]
+        return formats + [fmt for name, fmt, _ in DATE_FORMATS if name != self.format_name]
+
+    def merge_counts(self, counts):
+        """合并其他解析器（如子进程中）的统计"""
+        fast_count, fallback_count, failed_count = counts
+        self.fast_count += fast_count
+        self.fallback_count += fallback_count
+        self.failed_count += failed_count
+
+    def counts(self):
+        """返回(快速路径数, 回退数, 失败数)"""
+        return self.fast_count, self.fallback_count, self.failed_count
+
+    def to_dict(self):
+        """将推断结果和解析统计转换为字典"""
+        formats = {name: fmt for name, fmt, _ in DATE_FORMATS}
+        return {
+            'format': self.format_name,
+            'pattern': formats.get(self.format_name),
+            'sample_size': self.sample_size,
+            'sample_matched': self.sample_matched,
+            'fast_count': self.fast_count,
+            'fallback_count': self.fallback_count,
+            'failed_count': self.failed_count
+        }
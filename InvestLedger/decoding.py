@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import codecs
+import hashlib
+import chardet
+
+# 编码检测结果的替换，GB18030是GB2312/GBK的超集，可避免生僻字解码失败
+ENCODING_ALIASES = {
+    'gb2312': 'gb18030',
+    'gbk': 'gb18030',
+    'ascii': 'utf-8',
+}
+
+# 检测的编码解码失败时依次尝试的编码，iso-8859-1可解码任意字节，总能兜底
+FALLBACK_ENCODINGS = ['utf-8', 'gb18030', 'iso-8859-1']
+
+# 用于编码检测的样本大小
+DETECT_SAMPLE_SIZE = 64 * 1024
+
+# 每次从文件读取的字节数
+READ_CHUNK_SIZE = 1024 * 1024
+
+# 字节顺序标记及对应编码，UTF-32的标记以UTF-16的标记开头，需要先判断
+BOM_ENCODINGS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def detect_encoding_from_bytes(sample):
+    """
+    根据文件开头的字节检测编码，先看BOM，再用chardet检测样本
+
+    Returns:
+        str: 检测到的编码，默认为utf-8
+    """
+    for bom, encoding in BOM_ENCODINGS:
+        if sample.startswith(bom):
+            return encoding
+
+    try:
+        result = chardet.detect(sample)
+    except Exception:
+        return 'utf-8'
+    if result['encoding'] and result['confidence'] > 0.7:
+        encoding = result['encoding'].lower()
+        return ENCODING_ALIASES.get(encoding, encoding)
+    return 'utf-8'  # 默认返回UTF-8
+
+# 计算文件指纹时分别读取开头和结尾的字节数
+FINGERPRINT_SAMPLE_SIZE = 1024 * 1024
+
+
+def file_fingerprint(file_path):
+    """
+    计算文件指纹，用于识别导入断点对应的源文件
+
+    只读取开头和结尾各一段并结合文件大小，大文件也无需完整读取。
+    文件被追加或改写后指纹随之变化，旧断点不再适用。
+    """
+    size = os.path.getsize(file_path)
+    digest = hashlib.sha256(str(size).encode('ascii'))
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_SAMPLE_SIZE))
+        if size > FINGERPRINT_SAMPLE_SIZE:
+            f.seek(max(FINGERPRINT_SAMPLE_SIZE, size - FINGERPRINT_SAMPLE_SIZE))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class DecodedFile:
+    """单次读取的增量解码文件
+
+    只打开和读取文件一次：开头的样本同时用于编码检测和解码。
+    按行迭代文本，某一行用当前编码解码失败时，从该行起改用下一个候选编码，
+    已解码的部分不会重新读取。byte_offset为已迭代出的行在文件中的结束位置。
+
+    用法:
+        with DecodedFile(path) as f:
+            for line in csv.reader(f): ...
+    """
+
+    def __init__(self, file_path, encoding=None, chunk_size=READ_CHUNK_SIZE, start_offset=0):
+        """
+        Args:
+            file_path: 文件路径
+            encoding: 指定编码，None表示自动检测
+            chunk_size: 每次读取的字节数
+            start_offset: 从文件的该字节位置开始读取，须位于行首
+        """
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.file = open(file_path, 'rb')
+
+        # 检测编码总是使用文件开头的样本
+        sample = self.file.read(DETECT_SAMPLE_SIZE)
+        self.detected_encoding = encoding or detect_encoding_from_bytes(sample)
+        self.encoding = self.detected_encoding
+        self.candidates = [self.detected_encoding] + [
+            enc for enc in FALLBACK_ENCODINGS if codecs.lookup(enc).name != codecs.lookup(self.detected_encoding).name
+        ]
+
+        # 编码切换记录: [(行号, 字节位置, 原编码, 新编码)]
+        self.switches = []
+        self.line_number = 0
+
+        # 样本的文本形式，用于判断文本格式等，无需再次读取文件
+        self.sample_text = sample.decode(self.detected_encoding, errors='replace')
+
+        if start_offset:
+            self.file.seek(start_offset)
+            self._pending = b''
+        else:
+            self._pending = sample
+        self.byte_offset = start_offset
+        self._lines = None
+
+    @property
+    def exact_offsets(self):
+        """byte_offset是否精确到行，UTF-16/32整块解码，只能精确到读取块"""
+        return not codecs.lookup(self.encoding).name.startswith(('utf-16', 'utf-32'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        """关闭文件"""
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        # 多次迭代共享同一个行生成器，与文件对象的行为一致
+        if self._lines is None:
+            if self.exact_offsets:
+                self._lines = self._iter_lines()
+            else:
+                self._lines = self._iter_wide_lines()
+        return next(self._lines)
+
+    def _iter_byte_lines(self):
+        """按行切分字节流，行尾保留换行符；跨块的最后一行留到下一块拼接"""
+        buffer = self._pending
+        self._pending = b''
+        while True:
+            chunk = self.file.read(self.chunk_size)
+            if not chunk:
+                break
+            buffer += chunk
+            lines = buffer.splitlines(keepends=True)
+            # 最后一行可能不完整（包括块末尾恰好是\r的情况），留到下一块
+            buffer = lines.pop() if lines else b''
+            yield from lines
+        if buffer:
+            yield from buffer.splitlines(keepends=True)
+
+    def _iter_lines(self):
+        """逐行解码，兼容ASCII的编码中换行符不会出现在多字节字符内部"""
+        for raw_line in self._iter_byte_lines():
+            self.line_number += 1
+            try:
+                text = raw_line.decode(self.encoding)
+            except UnicodeDecodeError:
+                text = self._switch_encoding(raw_line)
+            self.byte_offset += len(raw_line)
+            yield text
+
+    def _switch_encoding(self, raw_line):
+        """当前编码无法解码时，依次尝试后续候选编码，剩余部分沿用新编码"""
+        index = self.candidates.index(self.encoding) if self.encoding in self.candidates else -1
+        for encoding in self.candidates[index + 1:]:
+            try:
+                text = raw_line.decode(encoding)
+            except UnicodeDecodeError:
+                continue
+            print(f"第{self.line_number}行无法用{self.encoding}解码，剩余部分改用{encoding}")
+            self.switches.append((self.line_number, self.byte_offset, self.encoding, encoding))
+            self.encoding = encoding
+            return text
+        # 候选编码都失败时替换无法解码的字节
+        return raw_line.decode(self.encoding, errors='replace')
+
+    def _iter_wide_lines(self):
+        """UTF-16/32文件用增量解码器整体解码，再按行切分"""
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        carry = ''
+        data = self._pending
+        self._pending = b''
+        while True:
+            if not data:
+                data = self.file.read(self.chunk_size)
+            final = not data
+            text = carry + decoder.decode(data, final=final)
+            self.byte_offset += len(data)
+            data = b''
+            lines = text.splitlines(keepends=True)
+            carry = '' if final or not lines else lines.pop()
+            for line in lines:
+                self.line_number += 1
+                yield line
+            if final:
+                break
@@ -3,8 +3,10 @@
 
 import os
 import csv
+import json
 import datetime
 import logging
+from itertools import chain
 from pathlib import Path
 import io
 
@@ -25,11 +27,51 @@ except ImportError:
     has_pdf = False
     logging.warning("reportlab库未安装，PDF导出功能不可用")
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    has_parquet = True
+except ImportError:
+    has_parquet = False
+    logging.warning("pyarrow库未安装，Parquet导出功能不可用")
+
+# Parquet文件的列类型，与交易表的字段一一对应，日期为日期类型，标签为字符串列表
+if has_parquet:
+    PARQUET_SCHEMA = pa.schema([
+        ('id', pa.int64()),
+        ('date', pa.date32()),
+        ('asset_type', pa.string()),
+        ('project_name', pa.string()),
+        ('amount', pa.float64()),
+        ('unit_price', pa.float64()),
+        ('currency', pa.string()),
+        ('profit_loss', pa.float64()),
+        ('tags', pa.list_(pa.string())),
+        ('notes', pa.string()),
+    ])
+
+# Parquet列压缩算法
+PARQUET_COMPRESSION = "zstd"
+
+# Excel单个工作表的最大行数，超过时续写到新的工作表
+EXCEL_MAX_ROWS = 1048576
+
+# 记录数达到该值时Excel改用流式写出（constant_memory模式）
+EXCEL_STREAMING_MIN_ROWS = 50000
+
+# 流式写出Excel时附加的日期序列号列，1900-03-01之前的日期和带时间的日期保留原文本
+EXCEL_DATE_SERIAL_COLUMN = (
+    "*, CASE WHEN length(date) = 10 AND julianday(date) >= 2415079.5 "
+    "THEN julianday(date) - 2415018.5 END AS date_serial"
+)
+
 class ExportFormat:
     """导出格式枚举"""
     CSV = "csv"
     EXCEL = "excel"
     PDF = "pdf"
+    JSONL = "jsonl"
+    PARQUET = "parquet"
 
 class ExportResult:
     """导出结果类"""
@@ -53,7 +95,8 @@ class DataExporter:
         """
         self.db_manager = db_manager
     
-    def export_transactions(self, export_format, file_path=None, filters=None, include_header=True, summary=True):
+    def export_transactions(self, export_format, file_path=None, filters=None, include_header=True, summary=True,
+                            large_export=None):
         """
         导出交易数据
         
@@ -63,11 +106,44 @@ class DataExporter:
         - filters: 过滤条件列表，格式为[(字段, 操作符, 值), ...]
         - include_header: 是否包含表头
         - summary: 是否包含汇总信息
+        - large_export: Excel是否流式写出，None表示记录数达到EXCEL_STREAMING_MIN_ROWS时自动启用
         
         Returns:
         - ExportResult对象
         """
         try:
+            # CSV、JSON Lines和Parquet按批从数据库读取并写出，不一次性加载全部记录
+            if export_format in (ExportFormat.CSV, ExportFormat.JSONL, ExportFormat.PARQUET):
+                if export_format == ExportFormat.PARQUET and not has_parquet:
+                    return ExportResult(False, message="Parquet导出不可用，请安装pyarrow库")
+                
+                # CSV沿用日期倒序，JSON Lines和Parquet按ID顺序，导入后保持原来的先后
+                order_by = "date DESC" if export_format == ExportFormat.CSV else "id"
+                batches = self.db_manager.iter_transaction_rows(filters=filters, order_by=order_by)
+                first_batch = next(batches, None)
+                if not first_batch:
+                    return ExportResult(False, message="没有符合条件的交易数据")
+                batches = chain([first_batch], batches)
+                
+                if export_format == ExportFormat.CSV:
+                    return self._export_as_csv(batches, file_path, include_header, summary)
+                if export_format == ExportFormat.JSONL:
+                    return self._export_as_jsonl(batches, file_path)
+                return self._export_as_parquet(batches, file_path)
+            
+            if export_format == ExportFormat.EXCEL and has_excel:
+                if large_export is None:
+                    large_export = self.db_manager.count_transactions(filters) >= EXCEL_STREAMING_MIN_ROWS
+                if large_export:
+                    batches = self.db_manager.iter_transaction_rows(
+                        filters=filters, order_by="date DESC", columns=EXCEL_DATE_SERIAL_COLUMN
+                    )
+                    first_batch = next(batches, None)
+                    if not first_batch:
+                        return ExportResult(False, message="没有符合条件的交易数据")
+                    return self._export_as_excel_streaming(chain([first_batch], batches), file_path,
+                                                           include_header, summary)
+            
             # 获取数据
             transactions = self.db_manager.get_transactions(filters=filters)
             
@@ -75,9 +151,7 @@ class DataExporter:
                 return ExportResult(False, message="没有符合条件的交易数据")
             
             # 根据格式导出
-            if export_format == ExportFormat.CSV:
-                return self._export_as_csv(transactions, file_path, include_header, summary)
-            elif export_format == ExportFormat.EXCEL:
+            if export_format == ExportFormat.EXCEL:
                 if not has_excel:
                     return ExportResult(False, message="Excel导出不可用，请安装xlsxwriter库")
                 return self._export_as_excel(transactions, file_path, include_header, summary)
@@ -92,67 +166,130 @@ class DataExporter:
             logging.error(f"导出数据失败: {e}")
             return ExportResult(False, message=f"导出数据失败: {e}")
     
-    def _export_as_csv(self, transactions, file_path, include_header, summary):
-        """导出为CSV格式"""
+    def _export_as_csv(self, batches, file_path, include_header, summary):
+        """导出为CSV格式
+        
+        按批读取的记录直接写出，汇总信息在同一次遍历中累计，内存占用与记录数无关
+        """
         try:
             # 定义表头
             headers = ["交易ID", "日期", "资产类型", "项目名称", "数量", "单价", "货币", "盈亏", "备注"]
             
-            # 准备数据行
-            rows = []
-            if include_header:
-                rows.append(headers)
-            
-            # 添加交易数据
-            for trans in transactions:
-                rows.append([
-                    trans.id,
-                    trans.date,
-                    trans.asset_type,
-                    trans.project_name,
-                    trans.amount,
-                    trans.unit_price,
-                    trans.currency,
-                    trans.profit_loss,
-                    trans.notes
-                ])
-            
-            # 添加汇总信息
-            if summary and transactions:
-                total_profit = sum(t.profit_loss for t in transactions if t.profit_loss > 0)
-                total_loss = sum(t.profit_loss for t in transactions if t.profit_loss < 0)
-                net_profit_loss = total_profit + total_loss
-                
-                rows.append([])  # 空行
-                rows.append(["汇总信息", "", "", "", "", "", "", "", ""])
-                rows.append(["总交易数量", len(transactions), "", "", "", "", "", "", ""])
-                rows.append(["总盈利", total_profit, "", "", "", "", "", "", ""])
-                rows.append(["总亏损", total_loss, "", "", "", "", "", "", ""])
-                rows.append(["净盈亏", net_profit_loss, "", "", "", "", "", "", ""])
-            
-            # 写入文件或内存
             if file_path:
                 os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
-                
-                with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
-                    writer = csv.writer(f)
-                    writer.writerows(rows)
-                
-                return ExportResult(True, file_path=file_path, 
-                                   message=f"成功导出 {len(transactions)} 条交易记录到 {file_path}")
+                output = open(file_path, 'w', newline='', encoding='utf-8-sig')
             else:
                 output = io.StringIO()
+            
+            count = 0
+            total_profit = 0
+            total_loss = 0
+            try:
                 writer = csv.writer(output)
-                writer.writerows(rows)
-                csv_data = output.getvalue()
+                if include_header:
+                    writer.writerow(headers)
                 
-                return ExportResult(True, data=csv_data, 
-                                   message=f"成功导出 {len(transactions)} 条交易记录")
+                # 写出交易数据并累计汇总
+                for rows in batches:
+                    writer.writerows(
+                        [row['id'], row['date'], row['asset_type'], row['project_name'], row['amount'],
+                         row['unit_price'], row['currency'], row['profit_loss'], row['notes']]
+                        for row in rows
+                    )
+                    for row in rows:
+                        profit_loss = row['profit_loss'] or 0
+                        if profit_loss > 0:
+                            total_profit += profit_loss
+                        else:
+                            total_loss += profit_loss
+                    count += len(rows)
+                
+                # 添加汇总信息
+                if summary and count:
+                    writer.writerows([
+                        [],  # 空行
+                        ["汇总信息", "", "", "", "", "", "", "", ""],
+                        ["总交易数量", count, "", "", "", "", "", "", ""],
+                        ["总盈利", total_profit, "", "", "", "", "", "", ""],
+                        ["总亏损", total_loss, "", "", "", "", "", "", ""],
+                        ["净盈亏", total_profit + total_loss, "", "", "", "", "", "", ""],
+                    ])
+                csv_data = None if file_path else output.getvalue()
+            finally:
+                output.close()
+            
+            if file_path:
+                return ExportResult(True, file_path=file_path, 
+                                   message=f"成功导出 {count} 条交易记录到 {file_path}")
+            return ExportResult(True, data=csv_data, 
+                               message=f"成功导出 {count} 条交易记录")
         
         except Exception as e:
             logging.error(f"导出CSV失败: {e}")
             return ExportResult(False, message=f"导出CSV失败: {e}")
     
+    def _export_as_jsonl(self, batches, file_path):
+        """导出为JSON Lines格式，每行一条记录，保留数值类型和标签列表，可原样导入"""
+        try:
+            count = 0
+            if file_path:
+                os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+                output = open(file_path, 'w', newline='\n', encoding='utf-8')
+            else:
+                output = io.StringIO()
+            
+            try:
+                for rows in batches:
+                    output.write(''.join(
+                        json.dumps(_export_record(row), ensure_ascii=False) + '\n' for row in rows
+                    ))
+                    count += len(rows)
+                data = None if file_path else output.getvalue()
+            finally:
+                output.close()
+            
+            if file_path:
+                return ExportResult(True, file_path=file_path,
+                                   message=f"成功导出 {count} 条交易记录到 {file_path}")
+            return ExportResult(True, data=data, message=f"成功导出 {count} 条交易记录")
+        
+        except Exception as e:
+            logging.error(f"导出JSON Lines失败: {e}")
+            return ExportResult(False, message=f"导出JSON Lines失败: {e}")
+    
+    def _export_as_parquet(self, batches, file_path):
+        """导出为Parquet格式，每批记录写为一个行组，列按PARQUET_SCHEMA的类型压缩存储"""
+        if not has_parquet:
+            return ExportResult(False, message="Parquet导出不可用，请安装pyarrow库")
+        
+        try:
+            count = 0
+            if file_path:
+                os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+                sink = file_path
+            else:
+                sink = pa.BufferOutputStream()
+            
+            writer = pq.ParquetWriter(sink, PARQUET_SCHEMA, compression=PARQUET_COMPRESSION)
+            try:
+                for rows in batches:
+                    records = [_export_record(row) for row in rows]
+                    columns = {name: [record.get(name) for record in records] for name in PARQUET_SCHEMA.names}
+                    columns['date'] = [_parse_export_date(value) for value in columns['date']]
+                    writer.write_table(pa.Table.from_pydict(columns, schema=PARQUET_SCHEMA))
+                    count += len(rows)
+            finally:
+                writer.close()
+            
+            if file_path:
+                return ExportResult(True, file_path=file_path,
+                                   message=f"成功导出 {count} 条交易记录到 {file_path}")
+            return ExportResult(True, data=sink.getvalue().to_pybytes(), message=f"成功导出 {count} 条交易记录")
+        
+        except Exception as e:
+            logging.error(f"导出Parquet失败: {e}")
+            return ExportResult(False, message=f"导出Parquet失败: {e}")
+    
     def _export_as_excel(self, transactions, file_path, include_header, summary):
         """导出为Excel格式"""
         if not has_excel:
@@ -293,6 +430,139 @@ class DataExporter:
             logging.error(f"导出Excel失败: {e}")
             return ExportResult(False, message=f"导出Excel失败: {e}")
     
+    def _export_as_excel_streaming(self, batches, file_path, include_header, summary):
+        """流式导出为Excel格式，用于大量记录
+        
+        使用xlsxwriter的constant_memory模式，每行写完即落盘，内存占用与记录数无关。
+        整行写出不带单元格格式，数字和日期格式由列格式提供，盈亏颜色改用条件格式；
+        日期序列号由数据库查询算出，无需逐条解析。
+        超过EXCEL_MAX_ROWS行时续写到"交易记录2"、"交易记录3"等工作表，每个工作表重复表头。
+        """
+        if not has_excel:
+            return ExportResult(False, message="Excel导出不可用，请安装xlsxwriter库")
+        
+        try:
+            if file_path:
+                os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+                output = None
+                workbook = xlsxwriter.Workbook(file_path, {'constant_memory': True})
+            else:
+                # in_memory会关闭constant_memory，这里写入临时文件后再打包到内存
+                output = io.BytesIO()
+                workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+            
+            header_format = workbook.add_format({
+                'bold': True, 
+                'font_color': 'white',
+                'bg_color': '#2c3e50',
+                'align': 'center',
+                'valign': 'vcenter',
+                'border': 1
+            })
+            cell_format = workbook.add_format({'border': 1})
+            number_format = workbook.add_format({'border': 1, 'num_format': '#,##0.00'})
+            date_format = workbook.add_format({'border': 1, 'num_format': 'yyyy-mm-dd'})
+            summary_format = workbook.add_format({'bold': True, 'border': 1})
+            profit_format = workbook.add_format({'border': 1, 'num_format': '#,##0.00', 'font_color': 'red'})
+            loss_format = workbook.add_format({'border': 1, 'num_format': '#,##0.00', 'font_color': 'green'})
+            # 条件格式只改变字体颜色，数字格式仍由列格式提供
+            profit_font = workbook.add_format({'font_color': 'red'})
+            loss_font = workbook.add_format({'font_color': 'green'})
+            
+            headers = ["交易ID", "日期", "资产类型", "项目名称", "数量", "单价", "货币", "盈亏", "备注"]
+            column_formats = [cell_format, date_format, cell_format, cell_format, number_format,
+                              number_format, cell_format, number_format, cell_format]
+            column_widths = [10, 12, 12, 25, 10, 10, 8, 12, 30]
+            
+            sheets = []
+            
+            def add_sheet():
+                """新建工作表并写入列格式和表头，返回(工作表, 下一行)"""
+                name = "交易记录" if not sheets else f"交易记录{len(sheets) + 1}"
+                sheet = workbook.add_worksheet(name)
+                for col, (width, column_format) in enumerate(zip(column_widths, column_formats)):
+                    sheet.set_column(col, col, width, column_format)
+                sheets.append(sheet)
+                if include_header:
+                    sheet.write_row(0, 0, headers, header_format)
+                    return sheet, 1
+                return sheet, 0
+            
+            def finish_sheet(sheet, first_row, last_row):
+                """为工作表的盈亏列添加条件格式"""
+                if last_row < first_row:
+                    return
+                sheet.conditional_format(first_row, 7, last_row, 7,
+                                         {'type': 'cell', 'criteria': '>', 'value': 0, 'format': profit_font})
+                sheet.conditional_format(first_row, 7, last_row, 7,
+                                         {'type': 'cell', 'criteria': '<=', 'value': 0, 'format': loss_font})
+            
+            worksheet, row = add_sheet()
+            first_data_row = row
+            count = 0
+            total_profit = 0
+            total_loss = 0
+            
+            for rows in batches:
+                for trans in rows:
+                    if row >= EXCEL_MAX_ROWS:
+                        finish_sheet(worksheet, first_data_row, row - 1)
+                        worksheet, row = add_sheet()
+                        first_data_row = row
+                    
+                    profit_loss = trans['profit_loss'] or 0
+                    date_serial = trans['date_serial']
+                    worksheet.write_row(row, 0, (
+                        trans['id'],
+                        trans['date'] if date_serial is None else date_serial,
+                        trans['asset_type'],
+                        trans['project_name'],
+                        trans['amount'],
+                        trans['unit_price'],
+                        trans['currency'],
+                        profit_loss,
+                        trans['notes']
+                    ))
+                    if profit_loss > 0:
+                        total_profit += profit_loss
+                    else:
+                        total_loss += profit_loss
+                    row += 1
+                count += len(rows)
+            finish_sheet(worksheet, first_data_row, row - 1)
+            
+            # 添加汇总信息，当前工作表放不下时另起一个工作表
+            if summary and count:
+                if row + 6 > EXCEL_MAX_ROWS:
+                    worksheet, row = add_sheet()
+                net_profit_loss = total_profit + total_loss
+                
+                row += 1  # 空行
+                worksheet.write(row, 0, "汇总信息", summary_format)
+                row += 1
+                worksheet.write(row, 0, "总交易数量", summary_format)
+                worksheet.write(row, 1, count, summary_format)
+                row += 1
+                worksheet.write(row, 0, "总盈利", summary_format)
+                worksheet.write(row, 1, total_profit, profit_format)
+                row += 1
+                worksheet.write(row, 0, "总亏损", summary_format)
+                worksheet.write(row, 1, total_loss, loss_format)
+                row += 1
+                worksheet.write(row, 0, "净盈亏", summary_format)
+                worksheet.write(row, 1, net_profit_loss, profit_format if net_profit_loss > 0 else loss_format)
+            
+            workbook.close()
+            
+            if file_path:
+                return ExportResult(True, file_path=file_path,
+                                   message=f"成功导出 {count} 条交易记录到 {file_path}")
+            return ExportResult(True, data=output.getvalue(), message=f"成功导出 {count} 条交易记录")
+        
+        except Exception as e:
+            logging.error(f"导出Excel失败: {e}")
+            return ExportResult(False, message=f"导出Excel失败: {e}")
+    
     def _export_as_pdf(self, transactions, file_path, include_header, summary):
         """导出为PDF格式"""
         if not has_pdf:
@@ -446,4 +716,24 @@ class DataExporter:
                 
         except Exception as e:
             logging.error(f"导出PDF失败: {e}")
-            return ExportResult(False, message=f"导出PDF失败: {e}") 
\ No newline at end of file
+            return ExportResult(False, message=f"导出PDF失败: {e}") 
+
+
+def _export_record(row):
+    """把数据库中的记录转换为导出记录，标签从JSON字符串还原为列表"""
+    record = dict(row)
+    tags = record.get('tags')
+    if isinstance(tags, str):
+        try:
+            record['tags'] = json.loads(tags) if tags else []
+        except ValueError:
+            record['tags'] = [tags]
+    return record
+
+
+def _parse_export_date(value):
+    """把YYYY-MM-DD字符串转换为日期对象，无法识别时为None"""
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import fnmatch
+import hashlib
+import datetime
+import queue
+import threading
+
+from importer import DataImporter
+from import_jobs import ImportJobManager, JOB_COMPLETED, JOB_FAILED
+
+# 自动导入的文件扩展名及对应的文件类型
+WATCH_FILE_TYPES = {
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.txt': 'txt',
+    '.xlsx': 'excel',
+    '.xls': 'excel',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.parquet': 'parquet',
+}
+
+# 默认轮询间隔（秒）
+DEFAULT_POLL_INTERVAL = 10.0
+
+# 计算内容哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_content_hash(file_path):
+    """分块计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FolderWatcher:
+    """监视文件夹，自动导入新增或内容变化的对账单
+
+    在后台线程中定期扫描文件夹，只对修改时间或大小变化的文件计算内容哈希，
+    并且要求文件在连续两次扫描间保持不变，避免导入仍在写入的文件。
+    已处理的文件按(内容哈希, 大小)记录在数据库的ingested_files台账中，
+    同样内容的文件（包括改名或重新拷贝）不会再次解析。
+
+    新文件交给ImportJobManager在后台排队导入，只用一个工作线程依次写入，
+    避免多个写入者争用数据库锁，以及不同文件中的相同记录同时查重而重复写入。
+    每个文件按文件名匹配导入模板：
+    模板中的file_pattern（如"*券商A*.csv"）与文件名匹配时使用该模板的
+    mapping、delimiter、header_row和file_type，都不匹配时使用默认模板。
+    """
+
+    def __init__(self, folder, db_factory, poll_interval=DEFAULT_POLL_INTERVAL,
+                 default_template=None, on_file_finished=None, on_progress=None, on_job_finished=None):
+        """
+        Args:
+            folder: 监视的文件夹
+            db_factory: 无参可调用对象，返回新的DatabaseManager
+            poll_interval: 轮询间隔（秒）
+            default_template: 没有模板匹配文件名时使用的模板名称，None表示使用默认字段映射
+            on_file_finished: 文件处理结束后调用 callback(台账记录字典)
+            on_progress: 导入进度回调 callback(任务ID, 已写入数, 错误数)
+            on_job_finished: 导入任务结束回调 callback(任务)
+        """
+        self.folder = folder
+        self.db_factory = db_factory
+        self.poll_interval = max(1.0, poll_interval)
+        self.default_template = default_template or None
+        self.on_file_finished = on_file_finished
+        self.on_progress = on_progress
+        self.on_job_finished = on_job_finished
+        self.job_manager = ImportJobManager(db_factory, max_workers=1)
+        # 只用于读取导入模板，不访问数据库
+        self.template_loader = DataImporter(None)
+
+        # 各文件上次扫描时的(修改时间, 大小)和是否已处理
+        self.file_states = {}
+        # 已入队或已确认处理过的内容，避免同一内容重复入队
+        self.known_contents = set()
+        # 已结束的导入任务，由监视线程写入台账: (任务, 内容哈希, 大小, 模板名称)
+        self.finished_jobs = queue.Queue()
+
+        self.queued_count = 0
+        self.ingested_count = 0
+        self.last_scan_at = None
+        self.last_error = None
+
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """启动监视线程"""
+        if self.is_running():
+            return False
+        if not os.path.isdir(self.folder):
+            print(f"监视文件夹不存在: {self.folder}")
+            return False
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+        self.thread.start()
+        print(f"开始监视文件夹: {self.folder}")
+        return True
+
+    def stop(self):
+        """停止监视并取消尚未完成的导入任务，停止后不能再次启动
+
+        不等待线程退出：正在导入的文件在当前批次提交后结束，监视线程在后台退出
+        """
+        self.stop_event.set()
+        self.job_manager.shutdown(wait=False, cancel_futures=True)
+        print(f"停止监视文件夹: {self.folder}")
+
+    def is_running(self):
+        """监视线程是否在运行"""
+        return bool(self.thread and self.thread.is_alive())
+
+    def get_status(self):
+        """获取监视状态"""
+        return {
+            'folder': self.folder,
+            'running': self.is_running(),
+            'poll_interval': self.poll_interval,
+            'default_template': self.default_template,
+            'queued_count': self.queued_count,
+            'ingested_count': self.ingested_count,
+            'active_jobs': len(self.job_manager.get_active_jobs()),
+            'last_scan_at': self.last_scan_at,
+            'last_error': self.last_error
+        }
+
+    def _run(self):
+        """监视线程主循环，数据库连接只在本线程中使用"""
+        db_manager = self.db_factory()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self._record_finished(db_manager)
+                    self.scan(db_manager)
+                except Exception as e:
+                    print(f"扫描监视文件夹失败: {e}")
+                    self.last_error = str(e)
+                self.stop_event.wait(self.poll_interval)
+            self._record_finished(db_manager)
+        finally:
+            db_manager.close()
+
+    def scan(self, db_manager):
+        """扫描一次文件夹，把写入完成的新文件加入导入队列
+
+        Returns:
+            int: 本次入队的文件数
+        """
+        self.last_scan_at = datetime.datetime.now().isoformat()
+        submitted = 0
+        present = set()
+
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                name = entry.name
+                # 跳过隐藏文件和Office打开文件时生成的临时文件
+                if name.startswith(('.', '~$')) or not entry.is_file():
+                    continue
+                file_type = WATCH_FILE_TYPES.get(os.path.splitext(name)[1].lower())
+                if not file_type:
+                    continue
+
+                path = entry.path
+                present.add(path)
+                stat = entry.stat()
+                current = (stat.st_mtime_ns, stat.st_size)
+                state = self.file_states.get(path)
+
+                # 新出现或刚变化的文件可能仍在写入，下一次扫描大小和时间不变后再处理
+                if state is None or state['stat'] != current:
+                    self.file_states[path] = {'stat': current, 'handled': False}
+                    continue
+                if state['handled']:
+                    continue
+                state['handled'] = True
+
+                try:
+                    content_hash = file_content_hash(path)
+                except OSError as e:
+                    print(f"读取文件失败: {path}, {e}")
+                    continue
+
+                key = (content_hash, stat.st_size)
+                if key in self.known_contents:
+                    continue
+                self.known_contents.add(key)
+                if db_manager.is_file_ingested(content_hash, stat.st_size):
+                    continue
+
+                self._submit(path, file_type, content_hash, stat.st_size)
+                submitted += 1
+
+        # 已删除的文件不再跟踪
+        for path in set(self.file_states) - present:
+            del self.file_states[path]
+        return submitted
+
+    def choose_template(self, file_name):
+        """
+        为文件选择导入模板
+        返回: (模板名称, 模板数据)，没有可用模板时为(None, {})
+        """
+        for template_name in sorted(self.template_loader.get_available_templates()):
+            template = self.template_loader.load_import_template(template_name) or {}
+            pattern = template.get('file_pattern')
+            if pattern and fnmatch.fnmatch(file_name.lower(), pattern.lower()):
+                return template_name, template
+
+        if self.default_template:
+            template = self.template_loader.load_import_template(self.default_template)
+            if template is not None:
+                return self.default_template, template
+        return None, {}
+
+    def _submit(self, path, file_type, content_hash, file_size):
+        """按匹配的模板提交导入任务"""
+        template_name, template = self.choose_template(os.path.basename(path))
+
+        def on_finished(job):
+            self.finished_jobs.put((job, content_hash, file_size, template_name))
+            if self.on_job_finished:
+                self.on_job_finished(job)
+
+        self.job_manager.submit_file(
+            path,
+            file_type=template.get('file_type') or file_type,
+            delimiter=template.get('delimiter') or ',',
+            header_row=template.get('header_row', 0),
+            mapping=template.get('mapping'),
+            on_progress=self.on_progress,
+            on_finished=on_finished
+        )
+        self.queued_count += 1
+        print(f"自动导入文件: {path}，模板: {template_name or '默认字段映射'}")
+
+    def _record_finished(self, db_manager):
+        """把已结束的导入任务写入台账
+
+        完成和失败的文件都记入台账，内容不变时不再重试；取消的文件允许下次重新导入。
+        """
+        while True:
+            try:
+                job, content_hash, file_size, template_name = self.finished_jobs.get_nowait()
+            except queue.Empty:
+                break
+
+            if job.status not in (JOB_COMPLETED, JOB_FAILED):
+                self.known_contents.discard((content_hash, file_size))
+                state = self.file_states.get(job.description)
+                if state:
+                    state['handled'] = False
+                continue
+
+            result = job.result
+            record = {
+                'content_hash': content_hash,
+                'file_size': file_size,
+                'file_path': job.description,
+                'template_name': template_name,
+                'status': job.status,
+                'saved_count': result.saved_count if result else 0,
+                'skipped_count': result.skipped_count if result else 0,
+                'error_count': result.error_count if result else 0
+            }
+            db_manager.record_ingested_file(**record)
+            self.ingested_count += 1
+            if self.on_file_finished:
+                self.on_file_finished(record)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import uuid
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from importer import DataImporter, DEFAULT_IMPORT_BATCH_SIZE
+
+# 导入任务状态
+JOB_PENDING = "pending"        # 等待执行
+JOB_RUNNING = "running"        # 正在导入
+JOB_CANCELLING = "cancelling"  # 已请求取消，等待当前批次结束
+JOB_COMPLETED = "completed"    # 导入完成
+JOB_CANCELLED = "cancelled"    # 已取消
+JOB_FAILED = "failed"          # 导入失败
+
+
+class ImportJob:
+    """导入任务，记录任务状态和最终统计"""
+
+    def __init__(self, description, keep_partial=True):
+        """
+        Args:
+            description: 任务描述，如文件名
+            keep_partial: 取消时是否保留已提交的批次，False则回滚本任务写入的全部记录
+        """
+        self.id = uuid.uuid4().hex
+        self.description = description
+        self.keep_partial = keep_partial
+        self.status = JOB_PENDING
+        self.created_at = datetime.datetime.now().isoformat()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.rolled_back_count = 0
+        self.cancel_event = threading.Event()
+
+    def is_active(self):
+        """任务是否仍在等待或执行中"""
+        return self.status in (JOB_PENDING, JOB_RUNNING, JOB_CANCELLING)
+
+    def to_dict(self):
+        """将任务状态转换为字典"""
+        result = self.result
+        return {
+            "job_id": self.id,
+            "description": self.description,
+            "status": self.status,
+            "keep_partial": self.keep_partial,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "parsed_count": result.parsed_count if result else 0,
+            "success_count": result.saved_count if result else 0,
+            "skipped_count": result.skipped_count if result else 0,
+            "skipped_reasons": result.skipped_reasons if result else {},
+            "error_count": result.error_count if result else 0,
+            "import_id": result.id if result else None,
+            "sources": result.sources if result else [],
+            "resumed_from_row": result.resumed_from_row if result else 0,
+            "rolled_back_count": self.rolled_back_count,
+            "error": self.error
+        }
+
+
+class ImportJobManager:
+    """导入任务管理器，在后台线程中执行导入
+
+    SQLite连接不能跨线程使用，每个任务在工作线程中通过db_factory打开自己的连接。
+    默认只有一个工作线程，任务按提交顺序依次执行，避免多个写入者争用数据库锁。
+    """
+
+    def __init__(self, db_factory, batch_size=DEFAULT_IMPORT_BATCH_SIZE, max_workers=1):
+        """
+        Args:
+            db_factory: 无参可调用对象，返回新的DatabaseManager
+            batch_size: 每批写入的行数
+            max_workers: 同时执行的任务数，大于1时解析并行，写入仍由数据库锁串行化
+        """
+        self.db_factory = db_factory
+        self.batch_size = batch_size
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="import")
+
+    def submit_file(self, file_path, file_type=None, header_row=0, mapping=None, keep_partial=True,
+                    on_progress=None, on_finished=None, staged=False, delimiter=',', resume=False):
+        """提交文件导入任务，返回任务ID
+
+        staged为True时经暂存表在数据库中校验、查重并一次写入
+        resume为True时从该文件未完成的导入断点继续，暂存导入整体提交，没有断点
+        """
+        def run(importer, job, progress_callback):
+            options = dict(
+                file_type=file_type,
+                delimiter=delimiter,
+                header_row=header_row,
+                mapping=mapping,
+                batch_size=self.batch_size,
+                progress_callback=progress_callback,
+                should_cancel=job.cancel_event.is_set
+            )
+            if staged:
+                return importer.import_file_staged(file_path, **options)
+            return importer.import_file_parallel(file_path, resume=resume, **options)
+        return self._submit(file_path, keep_partial, run, on_progress, on_finished)
+
+    def submit_batch(self, file_paths, header_row=0, mapping=None, all_sheets=True, keep_partial=True,
+                     on_progress=None, on_finished=None):
+        """提交多文件批量导入任务，返回任务ID"""
+        def run(importer, job, progress_callback):
+            return importer.import_batch(
+                file_paths,
+                header_row=header_row,
+                mapping=mapping,
+                all_sheets=all_sheets,
+                batch_size=self.batch_size,
+                progress_callback=progress_callback,
+                should_cancel=job.cancel_event.is_set
+            )
+        description = file_paths[0] if len(file_paths) == 1 else f"批量导入{len(file_paths)}个文件"
+        return self._submit(description, keep_partial, run, on_progress, on_finished)
+    
+    def submit_database(self, source_path, on_progress=None, on_finished=None):
+        """提交账本数据库合并任务，返回任务ID
+
+        合并在一个事务中完成，不能中途取消
+        """
+        def run(importer, job, progress_callback):
+            return importer.import_database(source_path, progress_callback=progress_callback)
+        return self._submit(source_path, True, run, on_progress, on_finished)
+
+    def submit_text(self, text_content, format_type="auto", keep_partial=True,
+                    on_progress=None, on_finished=None):
+        """提交文本导入任务，返回任务ID"""
+        def run(importer, job, progress_callback):
+            result = importer.import_text(text_content, format_type=format_type)
+            return importer.save_imported_data_in_batches(
+                result,
+                batch_size=self.batch_size,
+                progress_callback=progress_callback,
+                should_cancel=job.cancel_event.is_set
+            )
+        return self._submit("文本导入", keep_partial, run, on_progress, on_finished)
+
+    def _submit(self, description, keep_partial, run, on_progress, on_finished):
+        """创建任务并交给工作线程执行"""
+        job = ImportJob(description, keep_partial)
+        with self.lock:
+            self.jobs[job.id] = job
+        future = self.executor.submit(self._run_job, job, run, on_progress, on_finished)
+        # 关闭线程池时被取消的任务不会执行_run_job，在这里结束任务并通知调用方
+        future.add_done_callback(lambda f: f.cancelled() and self._finish_unstarted(job, on_finished))
+        return job.id
+
+    def _finish_unstarted(self, job, on_finished):
+        """结束尚未开始执行就被取消的任务"""
+        job.status = JOB_CANCELLED
+        job.finished_at = datetime.datetime.now().isoformat()
+        if on_finished:
+            on_finished(job)
+
+    def _run_job(self, job, run, on_progress, on_finished):
+        """在工作线程中执行任务"""
+        db_manager = None
+        try:
+            if job.cancel_event.is_set():
+                job.status = JOB_CANCELLED
+                return
+
+            job.status = JOB_RUNNING
+            db_manager = self.db_factory()
+            importer = DataImporter(db_manager)
+
+            def progress_callback(saved_count, error_count):
+                if on_progress:
+                    on_progress(job.id, saved_count, error_count)
+
+            job.result = run(importer, job, progress_callback)
+
+            if job.result.cancelled:
+                if not job.keep_partial:
+                    job.rolled_back_count = db_manager.delete_transactions_by_id_ranges(job.result.inserted_ids)
+                    # 断点已包含被回滚的记录，不能再从断点继续
+                    if job.result.checkpoint_fingerprint:
+                        db_manager.delete_import_checkpoint(job.result.checkpoint_fingerprint)
+                    print(f"导入任务 {job.id} 已取消，回滚 {job.rolled_back_count} 条记录")
+                job.status = JOB_CANCELLED
+            else:
+                job.status = JOB_COMPLETED
+        except Exception as e:
+            print(f"导入任务 {job.id} 失败: {e}")
+            job.error = str(e)
+            job.status = JOB_FAILED
+        finally:
+            if job.result:
+                job.result.flush_errors()
+            if db_manager:
+                db_manager.close()
+            job.finished_at = datetime.datetime.now().isoformat()
+            if on_finished:
+                on_finished(job)
+
+    def cancel(self, job_id, keep_partial=None):
+        """请求取消任务，当前批次提交后生效
+
+        Args:
+            job_id: 任务ID
+            keep_partial: 覆盖任务创建时的设置，None表示沿用
+
+        Returns:
+            bool: 任务存在且仍在执行时返回True
+        """
+        job = self.get_job(job_id)
+        if not job or not job.is_active():
+            return False
+        if keep_partial is not None:
+            job.keep_partial = keep_partial
+        job.cancel_event.set()
+        if job.status == JOB_RUNNING:
+            job.status = JOB_CANCELLING
+        return True
+
+    def cancel_all(self):
+        """取消所有未完成的任务，返回取消的任务数"""
+        with self.lock:
+            job_ids = list(self.jobs)
+        return sum(1 for job_id in job_ids if self.cancel(job_id))
+
+    def get_job(self, job_id):
+        """按ID获取任务"""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def get_active_jobs(self):
+        """获取未完成的任务"""
+        with self.lock:
+            return [job for job in self.jobs.values() if job.is_active()]
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """取消未完成的任务并关闭线程池
+
+        Args:
+            wait: 是否等待工作线程退出，为False时正在执行的任务在后台结束
+            cancel_futures: 是否直接丢弃排队中的任务，不再逐个启动后再取消
+        """
+        self.cancel_all()
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
@@ -12,243 +12,551 @@ import io
 import re
 import datetime
 import pandas as pd  # 添加pandas库支持Excel文件
-import chardet        # 添加编码检测支持
+import copy
+import math
+import time
+import uuid
+from itertools import chain, islice
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from storage import Transaction
+from date_parser import DateParser, DEFAULT_SAMPLE_SIZE
+from decoding import DecodedFile, DETECT_SAMPLE_SIZE, detect_encoding_from_bytes, file_fingerprint
+from text_formats import TEXT_FORMATS, ParseTimer
+
+# 尝试导入openpyxl，用于只读流式预览xlsx
+try:
+    import openpyxl
+    has_openpyxl = True
+except ImportError:
+    has_openpyxl = False
+
+# 尝试导入pyarrow，用于读取Parquet文件
+try:
+    import pyarrow.parquet as pq
+    has_parquet = True
+except ImportError:
+    has_parquet = False
+
+# 流式导入时每批写入数据库的行数
+DEFAULT_IMPORT_BATCH_SIZE = 5000
+
+# 超过此大小的文件才启用多进程解析，小文件启动进程池的开销大于收益
+PARALLEL_PARSE_MIN_BYTES = 8 * 1024 * 1024
+
+# 多进程解析时每个块包含的记录数
+PARALLEL_CHUNK_ROWS = 20000
+
+# 预览缓存的最大文件数
+PREVIEW_CACHE_SIZE = 16
+
+# 导入结果在内存中保留的错误明细数，超出部分只写入错误日志
+DEFAULT_MAX_ERRORS_IN_MEMORY = 200
+
+# 保留的错误日志文件数
+ERROR_LOG_KEEP_COUNT = 20
+
+# 错误日志每积累多少行写入一次文件
+ERROR_LOG_FLUSH_LINES = 1000
+
+# 按记录存储的文件格式，字段名即交易字段名
+RECORD_FILE_TYPES = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.parquet': 'parquet'}
+
+# 按扩展名识别的文件类型，其他扩展名按CSV处理
+EXTENSION_FILE_TYPES = {'.csv': 'csv', '.tsv': 'tsv', '.txt': 'txt', '.xlsx': 'excel', '.xls': 'excel',
+                        **RECORD_FILE_TYPES}
+
+# 跳过记录的原因
+SKIP_DUPLICATE_IN_FILE = "文件内重复"
+SKIP_ALREADY_IN_LEDGER = "已存在于账本"
+
+# 默认字段映射
+DEFAULT_FIELD_MAPPING = {
+    '日期': 'date',
+    '资产类别': 'asset_type',
+    '项目名称': 'project_name',
+    '数量': 'amount',
+    '单价': 'unit_price',
+    '币种': 'currency',
+    '盈亏': 'profit_loss',
+    '备注': 'notes'
+}
+
+# JSON Lines和Parquet记录的字段映射：导出的字段名原样对应，也接受中文表头
+RECORD_FIELD_MAPPING = dict(
+    {field: field for field in ['date', 'asset_type', 'project_name', 'amount', 'unit_price',
+                                'currency', 'profit_loss', 'tags', 'notes']},
+    **DEFAULT_FIELD_MAPPING
+)
 
 class ImportResult:
     """导入结果对象，包含成功和失败的记录"""
     
-    def __init__(self):
-        """初始化导入结果"""
+    def __init__(self, keep_records=True, max_errors=None, error_log_path=None):
+        """初始化导入结果
+        
+        Args:
+            keep_records: 是否保留成功和跳过的记录，流式导入时为False，只计数
+            max_errors: 内存中保留的错误明细数，None表示不限制
+            error_log_path: 错误日志文件路径（JSONL，每行一个错误），None表示不写日志
+        """
+        self.id = uuid.uuid4().hex
         self.parsed_data = []  # 成功解析的数据
-        self.error_data = []   # 解析失败的数据
+        self.error_data = []   # 解析失败的数据，最多max_errors条
         self.skipped_data = [] # 跳过的重复数据
+        self.keep_records = keep_records
+        
+        # 计数器，流式导入时记录不保留在内存中，以计数为准
+        self.parsed_count = 0
+        self.saved_count = 0
+        self.skipped_count = 0
+        self.error_count = 0
+        # 按原因统计的跳过数
+        self.skipped_reasons = {}
+        
+        # 按错误信息统计的错误数，完整明细写入错误日志
+        self.max_errors = max_errors
+        self.error_summary = {}
+        self.error_log_path = error_log_path
+        self._pending_error_lines = []
+        
+        # 分批写入的ID范围，用于取消导入时回滚
+        self.inserted_ids = []
+        # 是否在导入完成前被取消
+        self.cancelled = False
+        # 日期格式推断结果和解析统计
+        self.date_format = None
+        # 文件解码使用的编码（中途切换时为最后使用的编码）
+        self.encoding = None
+        # 批量导入时各来源（文件或工作表）的统计
+        self.sources = []
+        # 导入断点对应的文件指纹，不记录断点时为None
+        self.checkpoint_fingerprint = None
+        # 从断点继续导入时断点所在的行号，0表示从头导入
+        self.resumed_from_row = 0
     
     def add_success(self, data):
         """添加成功解析的数据"""
-        self.parsed_data.append(data)
+        self.parsed_count += 1
+        if self.keep_records:
+            self.parsed_data.append(data)
     
     def add_error(self, row_index, row_data, error_message):
-        """添加解析失败的数据"""
-        self.error_data.append({
+        """添加解析失败的数据，超出内存上限的明细只写入错误日志"""
+        self.error_count += 1
+        self.error_summary[error_message] = self.error_summary.get(error_message, 0) + 1
+        error = {
             'row_index': row_index,
             'row_data': row_data,
             'error_message': error_message
-        })
+        }
+        if self.max_errors is None or len(self.error_data) < self.max_errors:
+            self.error_data.append(error)
+        
+        if self.error_log_path:
+            self._pending_error_lines.append(json.dumps(error, ensure_ascii=False, default=str))
+            if len(self._pending_error_lines) >= ERROR_LOG_FLUSH_LINES:
+                self.flush_errors()
+    
+    @property
+    def errors_truncated(self):
+        """内存中的错误明细是否不完整"""
+        return self.error_count > len(self.error_data)
+    
+    def flush_errors(self):
+        """把尚未写入的错误明细追加到错误日志，导入结束后由调用方调用"""
+        if not self._pending_error_lines:
+            return
+        lines, self._pending_error_lines = self._pending_error_lines, []
+        try:
+            with open(self.error_log_path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except Exception as e:
+            print(f"写入导入错误日志失败: {e}")
     
-    def add_skipped(self, data, reason="重复记录"):
+    def add_skipped(self, data, reason=SKIP_ALREADY_IN_LEDGER):
         """添加被跳过的数据"""
-        self.skipped_data.append({
-            'data': data,
-            'reason': reason
-        })
+        self.add_skipped_count(reason)
+        if self.keep_records:
+            self.skipped_data.append({
+                'data': data,
+                'reason': reason
+            })
+    
+    def get_error_summary(self):
+        """按错误信息汇总的错误数，数量多的在前"""
+        return [
+            {'error_message': message, 'count': count}
+            for message, count in sorted(self.error_summary.items(), key=lambda item: item[1], reverse=True)
+        ]
+    
+    def add_skipped_count(self, reason, count=1):
+        """只累加跳过数，不保留记录"""
+        if count <= 0:
+            return
+        self.skipped_count += count
+        self.skipped_reasons[reason] = self.skipped_reasons.get(reason, 0) + count
+
+def duplicate_key(transaction):
+    """
+    查重键：项目名称、日期和盈亏金额，与数据库查重的条件一致
+    盈亏统一为浮点数，整数和浮点数形式的同一金额视为相同
+    """
+    return (
+        str(transaction.project_name).strip(),
+        str(transaction.date).strip(),
+        float(transaction.profit_loss or 0)
+    )
+
+def _detect_file_type(file_path):
+    """根据扩展名判断文件类型"""
+    return EXTENSION_FILE_TYPES.get(os.path.splitext(file_path)[1].lower(), 'csv')
+
+class _BatchWriter:
+    """批量写入器，攒够一批后查重并一次性写入数据库"""
+    
+    def __init__(self, db_manager, result, batch_size=DEFAULT_IMPORT_BATCH_SIZE, progress_callback=None,
+                 should_cancel=None):
+        """
+        Args:
+            db_manager: 数据库管理器
+            result: 导入结果，写入和跳过的数量记录在其中
+            batch_size: 每批写入的行数
+            progress_callback: 每批写入后调用 callback(已写入数, 错误数)
+            should_cancel: 每条记录加入前和每批写入后调用，返回True时停止接收后续记录
+        """
+        self.db_manager = db_manager
+        self.result = result
+        self.batch_size = max(1, batch_size)
+        self.progress_callback = progress_callback
+        self.should_cancel = should_cancel
+        self.pending = []
+        # 本次导入已出现的查重键，文件内重复在集合中O(1)判断，无需查库
+        self.seen_keys = set()
+        # 导入断点的固定部分（指纹、路径、表头），None表示不记录断点
+        self.checkpoint = None
+        # 已读取到的位置: (字节位置, 行号, 编码)，随下一批次一起提交
+        self.position = None
+        # 有批次未能完整写入，断点停在之前最后一个完整写入的批次，之后不再前移
+        self.failed = False
+    
+    @property
+    def cancelled(self):
+        """导入是否已被取消"""
+        return self.result.cancelled
+    
+    def set_checkpoint_header(self, header):
+        """设置断点中保存的表头，继续导入时用于解析断点之后的记录"""
+        if self.checkpoint is not None:
+            self.checkpoint['header'] = header
+    
+    def mark_position(self, byte_offset, row_index, encoding):
+        """记录已读取到的位置，之前的记录都已交给add，下一批写入时随之提交"""
+        self.position = (byte_offset, row_index, encoding)
+    
+    def add(self, transaction, row_index=0):
+        """加入待写入记录，文件内重复的记录直接跳过，达到批量大小时自动写入
+        
+        row_index为记录在源文件中的行号，逐条写入仍失败时用于记录错误，未知时为0
+        """
+        if self.result.cancelled:
+            return
+        if self.should_cancel and self.should_cancel():
+            # 不足一批的小文件也能取消，尚未写入的记录不再写入，已提交的批次保持完整
+            self.result.cancelled = True
+            self.pending = []
+            return
+        key = duplicate_key(transaction)
+        if key in self.seen_keys:
+            self.result.add_skipped(transaction, SKIP_DUPLICATE_IN_FILE)
+            return
+        self.seen_keys.add(key)
+        self.pending.append((key, transaction, row_index))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """查重并写入当前批次"""
+        if not self.pending:
+            return
+        
+        batch, self.pending = self.pending, []
+        
+        # 文件内重复已在加入时排除，查库找到的都是账本中已有的记录
+        existing = self.db_manager.find_existing_transaction_keys(key for key, _, _ in batch)
+        if existing is None:
+            # 无法确认哪些记录已在账本中，整批不写入
+            self.failed = True
+            for _, transaction, row_index in batch:
+                self.result.add_error(row_index, transaction.to_dict(), "查重失败，未写入")
+            if self.progress_callback:
+                self.progress_callback(self.result.saved_count, self.result.error_count)
+            return
+        to_insert = []
+        row_indexes = []
+        for key, transaction, row_index in batch:
+            if key in existing:
+                self.result.add_skipped(transaction, SKIP_ALREADY_IN_LEDGER)
+                continue
+            to_insert.append(transaction)
+            row_indexes.append(row_index)
+        
+        checkpoint = None
+        if self.checkpoint is not None and self.position and not self.failed:
+            # 断点与本批记录在同一事务中提交，断点位置不会超前于已写入的记录
+            byte_offset, row_index, encoding = self.position
+            checkpoint = dict(
+                self.checkpoint,
+                byte_offset=byte_offset,
+                row_index=row_index,
+                encoding=encoding,
+                saved_count=self.result.saved_count + len(to_insert),
+                skipped_count=self.result.skipped_count,
+                error_count=self.result.error_count
+            )
+        
+        ids = self.db_manager.add_transactions_bulk(to_insert, checkpoint)
+        if ids is None:
+            # 整批已回滚，逐条重试，只有仍然写入失败的记录计为错误
+            error_count = self.result.error_count
+            id_ranges = self._insert_one_by_one(to_insert, row_indexes)
+            if self.result.error_count > error_count:
+                self.failed = True
+            elif checkpoint and self.db_manager.add_transactions_bulk([], checkpoint) is None:
+                self.failed = True
+        else:
+            id_ranges = [ids]
+        if checkpoint and not self.failed:
+            self.position = None
+        self.result.saved_count += sum(len(ids) for ids in id_ranges)
+        self.result.inserted_ids.extend(id_ranges)
+        
+        if self.progress_callback:
+            self.progress_callback(self.result.saved_count, self.result.error_count)
+        
+        # 写入后再检查一次，已提交的批次保持完整
+        if self.should_cancel and self.should_cancel():
+            self.result.cancelled = True
+    
+    def _insert_one_by_one(self, transactions, row_indexes):
+        """批量写入失败后逐条写入，返回写入记录的ID范围列表，连续的ID合并为一个范围"""
+        id_ranges = []
+        for transaction, row_index in zip(transactions, row_indexes):
+            transaction_id = self.db_manager.add_transaction(transaction, record=False)
+            if transaction_id is None:
+                self.result.add_error(row_index, transaction.to_dict(), "写入数据库失败")
+                continue
+            if id_ranges and id_ranges[-1].stop == transaction_id:
+                id_ranges[-1] = range(id_ranges[-1].start, transaction_id + 1)
+            else:
+                id_ranges.append(range(transaction_id, transaction_id + 1))
+        return id_ranges
 
 class DataImporter:
     """数据导入器，负责解析和导入各种格式的数据"""
     
     def __init__(self, db_manager):
         self.db_manager = db_manager
+        # 预览缓存，键包含文件路径、修改时间和大小，文件变化后自动失效
+        self.preview_cache = OrderedDict()
         self.templates_dir = os.path.join(os.getenv('APPDATA'), 'InvestLedger', 'import_templates')
+        # 每次导入的完整错误明细
+        self.error_logs_dir = os.path.join(os.getenv('APPDATA'), 'InvestLedger', 'import_errors')
+        self.max_errors = DEFAULT_MAX_ERRORS_IN_MEMORY
         
         # 确保模板目录存在
         Path(self.templates_dir).mkdir(parents=True, exist_ok=True)
     
+    def _new_result(self, keep_records=True):
+        """创建导入结果，内存中只保留有限的错误明细，完整明细写入本次导入的错误日志"""
+        result = ImportResult(keep_records, max_errors=self.max_errors)
+        if not self.error_logs_dir:
+            return result
+        Path(self.error_logs_dir).mkdir(parents=True, exist_ok=True)
+        result.error_log_path = os.path.join(self.error_logs_dir, f"{result.id}.jsonl")
+        self._cleanup_error_logs()
+        return result
+    
+    def _cleanup_error_logs(self):
+        """只保留最近的若干个错误日志"""
+        try:
+            logs = [entry for entry in os.scandir(self.error_logs_dir) if entry.name.endswith('.jsonl')]
+        except OSError:
+            return
+        if len(logs) < ERROR_LOG_KEEP_COUNT:
+            return
+        logs.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in logs[ERROR_LOG_KEEP_COUNT - 1:]:
+            try:
+                os.remove(entry.path)
+            except OSError as e:
+                print(f"删除导入错误日志失败: {e}")
+    
+    def read_import_errors(self, import_id, offset=0, limit=100):
+        """
+        分页读取某次导入的错误明细
+        
+        Args:
+            import_id: 导入结果的ID
+            offset: 起始序号
+            limit: 最多返回的条数
+            
+        Returns:
+            dict: {'total': 错误总数, 'errors': [{'row_index', 'row_data', 'error_message'}]}
+        """
+        # ID只能是十六进制字符串，避免拼出目录外的路径
+        if not re.fullmatch(r'[0-9a-f]{32}', import_id or ''):
+            return {'total': 0, 'errors': []}
+        
+        log_path = os.path.join(self.error_logs_dir, f"{import_id}.jsonl")
+        errors = []
+        total = 0
+        try:
+            with open(log_path, 'r', encoding='utf-8') as f:
+                for total, line in enumerate(f, start=1):
+                    if offset < total <= offset + limit:
+                        errors.append(json.loads(line))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"读取导入错误日志失败: {e}")
+        return {'total': total, 'errors': errors}
+    
     def import_csv(self, file_content, delimiter=',', mapping=None):
         """
         导入CSV数据
         mapping: 字段映射，如 {'项目名称': 'project_name', '日期': 'date', ...}
         """
-        result = ImportResult()
+        result = self._new_result()
         
         # 如果没有提供字段映射，使用默认映射
         if not mapping:
-            mapping = {
-                '日期': 'date',
-                '资产类别': 'asset_type',
-                '项目名称': 'project_name',
-                '数量': 'amount',
-                '单价': 'unit_price',
-                '币种': 'currency',
-                '盈亏': 'profit_loss',
-                '备注': 'notes'
-            }
+            mapping = DEFAULT_FIELD_MAPPING
         
         try:
             # 使用io.StringIO处理文件内容
             f = io.StringIO(file_content)
             reader = csv.DictReader(f, delimiter=delimiter)
+            rows, date_parser = self._infer_date_parser(reader, mapping)
             
-            for i, row in enumerate(reader, start=1):
-                try:
-                    # 转换字段名，并自动去除每个字段的前后空格
-                    transaction_data = {}
-                    for csv_field, model_field in mapping.items():
-                        if csv_field in row:
-                            # 自动去除前后空格
-                            value = row[csv_field]
-                            if isinstance(value, str):
-                                value = value.strip()
-                            transaction_data[model_field] = value
-                    
-                    # 验证必填字段
-                    if self._validate_transaction_data(transaction_data):
-                        # 类型转换
-                        self._convert_transaction_data_types(transaction_data)
-                        
-                        # 创建交易对象
-                        transaction = Transaction(**transaction_data)
-                        result.add_success(transaction)
-                    else:
-                        result.add_error(i, row, "缺少必填字段")
-                        
-                except Exception as e:
-                    result.add_error(i, row, str(e))
+            for i, row in enumerate(rows, start=1):
+                transaction = self._map_row(i, row, mapping, result, date_parser)
+                if transaction:
+                    result.add_success(transaction)
+            result.date_format = date_parser.to_dict()
         
         except Exception as e:
             result.add_error(0, {}, f"CSV解析错误: {str(e)}")
         
         return result
     
+    def _infer_date_parser(self, rows, mapping):
+        """
+        从前若干行推断日期列的格式
+        返回: (包含已读取样本行的完整行迭代器, 日期解析器)
+        """
+        rows = iter(rows)
+        sample = list(islice(rows, DEFAULT_SAMPLE_SIZE))
+        date_fields = [source for source, field in mapping.items() if field == 'date']
+        values = [row.get(date_fields[0]) for row in sample] if date_fields else []
+        return chain(sample, rows), DateParser.from_samples(values)
+    
+    def _map_row(self, row_index, row, mapping, result, date_parser=None):
+        """
+        按字段映射把一行数据转换为交易对象
+        失败时把错误记录到result中并返回None
+        """
+        try:
+            # 转换字段名，并自动去除每个字段的前后空格
+            transaction_data = {}
+            for csv_field, model_field in mapping.items():
+                if csv_field in row:
+                    # 自动去除前后空格
+                    value = row[csv_field]
+                    if isinstance(value, str):
+                        value = value.strip()
+                    transaction_data[model_field] = value
+            
+            # 验证必填字段
+            if not self._validate_transaction_data(transaction_data):
+                result.add_error(row_index, row, "缺少必填字段")
+                return None
+            
+            # 类型转换
+            self._convert_transaction_data_types(transaction_data, date_parser)
+            
+            # 创建交易对象
+            return Transaction(**transaction_data)
+        
+        except Exception as e:
+            result.add_error(row_index, row, str(e))
+            return None
+    
     def import_text(self, text_content, format_type="auto"):
         """导入文本内容，支持多种格式
         
+        格式由text_formats中的注册表提供，自动识别只检查开头若干行。
+        
         Args:
             text_content: 文本内容
-            format_type: 格式类型，可选值："auto"(自动检测), "custom"(自定义), "csv", "tsv"
+            format_type: 格式名称，"auto"表示自动检测，内置格式有"custom"(自定义), "csv", "tsv",
+                "broker"(券商清仓盈亏对账单)
             
         Returns:
             ImportResult: 导入结果
         """
-        result = ImportResult()
+        result = self._new_result()
         
         # 如果文本内容为空，直接返回
         if not text_content or not text_content.strip():
             result.add_error(0, {}, "文本内容为空")
             return result
         
-        # 自动检测格式
         if format_type == "auto":
-            # 检查是否包含制表符，如果是则认为是TSV
-            if '\t' in text_content:
-                format_type = "tsv"
-            # 检查是否符合自定义文本格式 (更宽松的匹配)
-            elif re.search(r'(.+)[：:]\s*(盈|亏)(\d+)元?', text_content):
-                format_type = "custom"
-            # 检查是否包含逗号，如果是则认为是CSV
-            elif ',' in text_content:
-                format_type = "csv"
-            else:
-                # 默认为自定义格式
-                format_type = "custom"
+            text_format = TEXT_FORMATS.detect(text_content)
+        else:
+            text_format = TEXT_FORMATS.get(format_type)
+        if not text_format:
+            result.add_error(0, {}, f"不支持的文本格式: {format_type}")
+            return result
         
-        # 根据格式类型处理
-        if format_type == "custom":
-            # 处理自定义文本格式，如 "项目名称：盈/亏XXX元，日期"
-            lines = text_content.strip().split("\n")
-            
-            for i, line in enumerate(lines, start=1):
+        if text_format.delimiter:
+            # 分隔符格式按CSV解析
+            with ParseTimer(TEXT_FORMATS, text_format.name) as timer:
+                result = self.import_csv(text_content, delimiter=text_format.delimiter)
+                timer.parsed = result.parsed_count
+                timer.failed = result.error_count
+                timer.lines = timer.parsed + timer.failed
+            return result
+        
+        # 逐行格式，如 "项目名称：盈/亏XXX元，日期"
+        parse_line = text_format.parse_line
+        with ParseTimer(TEXT_FORMATS, text_format.name) as timer:
+            for i, line in enumerate(text_content.strip().split("\n"), start=1):
+                line = line.strip()
+                # 跳过空行
+                if not line:
+                    continue
                 try:
-                    # 跳过空行
-                    if not line.strip():
-                        continue
-                        
-                    # 现在_parse_custom_text_line返回交易对象和错误信息    
-                    transaction, error_message = self._parse_custom_text_line(line.strip())
-                    if transaction:
-                        result.add_success(transaction)
-                    else:
-                        result.add_error(i, line, error_message or "无法解析行")
+                    transaction, error_message = parse_line(line)
                 except Exception as e:
-                    result.add_error(i, line, str(e))
-        
-        elif format_type == "tsv":
-            # 制表符分隔的数据
-            return self.import_csv(text_content, delimiter='\t')
+                    transaction, error_message = None, f"解析失败: {str(e)}"
+                # 表头、合计等非数据行
+                if transaction is None and error_message is None:
+                    continue
+                timer.lines += 1
+                if transaction:
+                    result.add_success(transaction)
+                else:
+                    result.add_error(i, line, error_message or "无法解析行")
+            timer.parsed = result.parsed_count
+            timer.failed = result.error_count
         
-        elif format_type == "csv":
-            # 逗号分隔的数据
-            return self.import_csv(text_content, delimiter=',')
-            
         return result
     
-    def _parse_custom_text_line(self, line):
-        """
-        解析自定义文本行格式：项目名称：盈/亏XXX元，日期
-        例如：若羽臣：盈310元， 2025年4月10日
-        """
-        try:
-            # 首先尝试匹配标准格式 - 修改以支持元后多个空格再跟逗号的情况
-            pattern = r'(.+)：(盈|亏)(\d+)元\s*[，,]\s*(\d{4})年(\d{1,2})月(\d{1,2})日'
-            match = re.match(pattern, line)
-            
-            if not match:
-                # 尝试匹配带冒号的更宽松格式 - 同样修改空格处理
-                pattern2 = r'(.+)[:：]?\s*(盈|亏)(\d+)元\s*[，,]?\s*(\d{4})[-/年](\d{1,2})[-/月](\d{1,2})[日]?'
-                match = re.match(pattern2, line)
-            
-            if not match:
-                # 再尝试匹配更宽松的格式，少一些约束
-                pattern3 = r'(.+)[：:]\s*(盈|亏)(\d+)[元]?\s*[，,]?\s*(\d{4})\D+(\d{1,2})\D+(\d{1,2})\D*'
-                match = re.match(pattern3, line)
-            
-            if not match:
-                # 检查可能的格式问题
-                if "：" not in line and ":" not in line:
-                    return None, "格式错误: 缺少冒号分隔项目名称与盈亏信息"
-                if "盈" not in line and "亏" not in line:
-                    return None, "格式错误: 缺少盈亏标识(盈或亏)"
-                if not re.search(r'\d+元', line):
-                    return None, "格式错误: 缺少金额或金额格式不正确"
-                if not re.search(r'\d{4}[-/年]\d{1,2}[-/月]\d{1,2}', line) and not re.search(r'\d{4}年\d{1,2}月\d{1,2}', line):
-                    return None, "格式错误: 日期格式不正确，支持的格式有YYYY年MM月DD日或YYYY-MM-DD"
-                
-                # 提取有用的信息用于调试
-                project_match = re.search(r'^(.+?)[：:]', line)
-                project_name = project_match.group(1).strip() if project_match else "未找到项目名"
-                
-                profit_match = re.search(r'(盈|亏)(\d+)', line)
-                profit_info = profit_match.group(0) if profit_match else "未找到盈亏信息"
-                
-                date_match = re.search(r'(\d{4})[\D]+(\d{1,2})[\D]+(\d{1,2})', line)
-                date_info = f"{date_match.group(1)}年{date_match.group(2)}月{date_match.group(3)}日" if date_match else "未找到日期"
-                
-                return None, f"格式不符合规范，无法正确解析。解析结果: 项目={project_name}, 盈亏={profit_info}, 日期={date_info}"
-            
-            # 提取数据并自动去除前后空格
-            project_name = match.group(1).strip()
-            profit_type = match.group(2)  # "盈" 或 "亏"
-            amount = int(match.group(3))
-            year = int(match.group(4))
-            month = int(match.group(5))
-            day = int(match.group(6))
-            
-            # 验证日期有效性
-            try:
-                datetime.date(year, month, day)
-            except ValueError:
-                return None, f"日期无效: {year}年{month}月{day}日不是有效日期"
-            
-            # 构建日期字符串 YYYY-MM-DD
-            date_str = f"{year:04d}-{month:02d}-{day:02d}"
-            
-            # 根据盈亏类型确定金额正负
-            profit_loss = amount if profit_type == "盈" else -amount
-            
-            # 创建交易记录
-            return Transaction(
-                date=date_str,
-                asset_type="股票",  # 默认为股票类型
-                project_name=project_name,
-                amount=1,  # 默认为1
-                unit_price=profit_loss,  # 用盈亏金额作为单价
-                currency="CNY",  # 默认为人民币
-                profit_loss=profit_loss,
-                notes=""  # 不再将原始文本作为备注
-            ), None
-            
-        except Exception as e:
-            print(f"解析行失败: {e}")
-            return None, f"解析失败: {str(e)}"
+    def get_text_format_stats(self):
+        """各文本格式的解析计数和耗时"""
+        return TEXT_FORMATS.get_stats()
     
     def _validate_transaction_data(self, data):
         """验证交易数据必填字段"""
@@ -258,43 +566,33 @@ class DataImporter:
                 return False
         return True
     
-    def _convert_transaction_data_types(self, data):
-        """转换数据类型"""
+    def _convert_transaction_data_types(self, data, date_parser=None):
+        """转换数据类型
+        
+        Args:
+            data: 交易字段字典，原地转换
+            date_parser: 已推断格式的日期解析器，None时逐个尝试支持的格式
+        """
         # 对所有字符串类型字段自动去除空格
         for field in data:
             if isinstance(data[field], str):
                 data[field] = data[field].strip()
         
-        # 数值类型转换
-        for field in ['amount', 'unit_price', 'profit_loss']:
+        # 数值类型转换，无法识别的记为0，NaN和无穷大作为错误行
+        for field, label in (('amount', '数量'), ('unit_price', '单价'), ('profit_loss', '盈亏')):
             if field in data and data[field]:
                 try:
-                    data[field] = float(data[field])
+                    value = float(data[field])
                 except (ValueError, TypeError):
                     data[field] = 0
+                    continue
+                if not math.isfinite(value):
+                    raise ValueError(f"{label}不是有效数值: {data[field]}")
+                data[field] = value
         
-        # 日期格式化
+        # 日期格式化，无法识别时保持原始值
         if 'date' in data and data['date']:
-            try:
-                # 尝试解析各种日期格式
-                date_formats = [
-                    '%Y-%m-%d',  # 2023-01-01
-                    '%Y/%m/%d',  # 2023/01/01
-                    '%Y年%m月%d日',  # 2023年01月01日
-                    '%Y.%m.%d'   # 2023.01.01
-                ]
-                
-                for fmt in date_formats:
-                    try:
-                        date_obj = datetime.datetime.strptime(data['date'], fmt).date()
-                        data['date'] = date_obj.isoformat()
-                        break
-                    except ValueError:
-                        continue
-                
-            except Exception:
-                # 保持原始值
-                pass
+            data['date'] = (date_parser or DateParser()).parse(data['date'])
     
     # 导入模板管理方法
     
@@ -393,27 +691,73 @@ class DataImporter:
             return False
     
     def save_imported_data(self, import_result):
-        """将导入结果保存到数据库"""
+        """将导入结果保存到数据库
+        
+        文件内重复用集合判断，与账本重复的记录在写入前一次性查出，
+        不再逐条查询数据库。
+        """
         success_count = 0
         skipped_count = 0
         
-        for transaction in import_result.parsed_data:
+        keys = [duplicate_key(transaction) for transaction in import_result.parsed_data]
+        existing = self.db_manager.find_existing_transaction_keys(keys)
+        if existing is None:
+            # 无法确认哪些记录已在账本中，全部不写入
+            for transaction in import_result.parsed_data:
+                import_result.add_error(0, transaction.to_dict(), "查重失败，未写入")
+            import_result.saved_count = 0
+            return 0
+        seen = set()
+        
+        for key, transaction in zip(keys, import_result.parsed_data):
             # 检查是否存在相同的交易记录（项目名称、金额和日期相同）
-            existing = self.check_duplicate_transaction(transaction)
-            if existing:
-                print(f"跳过重复的交易: {transaction.project_name}, {transaction.date}, {transaction.profit_loss}")
-                import_result.add_skipped(transaction)
+            if key in seen:
+                reason = SKIP_DUPLICATE_IN_FILE
+            elif key in existing:
+                reason = SKIP_ALREADY_IN_LEDGER
+            else:
+                reason = None
+            seen.add(key)
+            if reason:
+                print(f"跳过重复的交易({reason}): {transaction.project_name}, {transaction.date}, {transaction.profit_loss}")
+                import_result.add_skipped(transaction, reason)
                 skipped_count += 1
                 continue
                 
             if self.db_manager.add_transaction(transaction):
                 success_count += 1
         
+        import_result.saved_count = success_count
+        
         if skipped_count > 0:
             print(f"成功导入{success_count}条记录，跳过{skipped_count}条重复记录")
         
         return success_count
     
+    def save_imported_data_in_batches(self, import_result, batch_size=DEFAULT_IMPORT_BATCH_SIZE,
+                                      progress_callback=None, should_cancel=None):
+        """分批查重并写入已解析的数据，每批之间可报告进度和响应取消
+        
+        Args:
+            import_result: 导入结果，写入数量和ID范围记录在其中
+            batch_size: 每批写入的行数
+            progress_callback: 每批写入后调用 callback(已写入数, 错误数)
+            should_cancel: 每批写入后调用，返回True时停止写入剩余记录
+            
+        Returns:
+            ImportResult: 传入的导入结果
+        """
+        writer = _BatchWriter(self.db_manager, import_result, batch_size, progress_callback, should_cancel)
+        for transaction in import_result.parsed_data:
+            writer.add(transaction)
+            if writer.cancelled:
+                break
+        writer.flush()
+        
+        if progress_callback and not import_result.parsed_data:
+            progress_callback(import_result.saved_count, import_result.error_count)
+        return import_result
+    
     def check_duplicate_transaction(self, transaction):
         """检查是否存在重复的交易记录
         
@@ -456,57 +800,115 @@ class DataImporter:
         Returns:
             ImportResult: 导入结果
         """
-        result = ImportResult()
+        result = self._new_result()
         
         # 如果没有提供字段映射，使用默认映射
         if not mapping:
-            mapping = {
-                '日期': 'date',
-                '资产类别': 'asset_type',
-                '项目名称': 'project_name',
-                '数量': 'amount',
-                '单价': 'unit_price',
-                '币种': 'currency',
-                '盈亏': 'profit_loss',
-                '备注': 'notes'
-            }
+            mapping = DEFAULT_FIELD_MAPPING
         
         try:
             # 使用pandas读取Excel文件
             df = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row)
-            
-            # 处理每一行数据
-            for i, row in df.iterrows():
-                try:
-                    # 转换字段名
-                    transaction_data = {}
-                    for excel_field, model_field in mapping.items():
-                        if excel_field in row.index:
-                            # 处理NaN值
-                            value = row[excel_field]
-                            if pd.isna(value):
-                                value = None
-                            transaction_data[model_field] = value
-                    
-                    # 验证必填字段
-                    if self._validate_transaction_data(transaction_data):
-                        # 类型转换
-                        self._convert_transaction_data_types(transaction_data)
-                        
-                        # 创建交易对象
-                        transaction = Transaction(**transaction_data)
-                        result.add_success(transaction)
-                    else:
-                        result.add_error(i + header_row + 1, row.to_dict(), "缺少必填字段")
-                        
-                except Exception as e:
-                    result.add_error(i + header_row + 1, row.to_dict(), str(e))
+            self._convert_frame(df, mapping, header_row + 1, result)
         
         except Exception as e:
             result.add_error(0, {}, f"Excel解析错误: {str(e)}")
         
         return result
     
+    def _convert_frame(self, df, mapping, row_offset, result):
+        """
+        按列转换DataFrame为交易对象
+        
+        字段映射只做一次，日期和数值按整列转换，必填字段用掩码校验，
+        避免逐行构造Series。
+        
+        Args:
+            df: 原始数据
+            mapping: 字段映射
+            row_offset: DataFrame位置到报告行号的偏移
+            result: 导入结果，成功和失败的记录写入其中
+        """
+        if df.empty:
+            return
+        
+        # 映射字段名，只保留映射中存在的列
+        columns = {excel_field: model_field for excel_field, model_field in mapping.items() if excel_field in df.columns}
+        frame = pd.DataFrame(index=df.index)
+        for excel_field, model_field in columns.items():
+            frame[model_field] = df[excel_field]
+        
+        # 文本列：空值为None，其余转为去除空格的字符串
+        for field in frame.columns:
+            if field in ('date', 'amount', 'unit_price', 'profit_loss'):
+                continue
+            column = frame[field]
+            present = column.notna()
+            frame[field] = column.astype(object).where(~present, column.astype(str).str.strip()).where(present, None)
+        
+        # 数值列：无法转换的值记为0
+        for field in ('amount', 'unit_price', 'profit_loss'):
+            if field in frame.columns:
+                frame[field] = pd.to_numeric(frame[field], errors='coerce').fillna(0).astype(float)
+        
+        # 日期列：统一为YYYY-MM-DD，无法识别的保留原文
+        if 'date' in frame.columns:
+            frame['date'], date_parser = self._convert_date_column(frame['date'])
+            result.date_format = date_parser.to_dict()
+        
+        # 必填字段掩码
+        valid = pd.Series(True, index=frame.index)
+        for field in ('project_name', 'date'):
+            if field in frame.columns:
+                valid &= frame[field].notna() & (frame[field].astype(str) != '')
+            else:
+                valid &= False
+        
+        # 按原始顺序记录失败行
+        if not valid.all():
+            invalid_rows = df.loc[~valid]
+            for position, row_data in zip(invalid_rows.index, invalid_rows.to_dict('records')):
+                result.add_error(position + row_offset, row_data, "缺少必填字段")
+        
+        for record in frame.loc[valid].to_dict('records'):
+            result.add_success(Transaction(**record))
+    
+    def _convert_date_column(self, column):
+        """
+        按列把日期统一转换为YYYY-MM-DD字符串，空值为None
+        返回: (转换后的列, 带推断结果和统计的日期解析器)
+        """
+        converted = pd.Series(None, index=column.index, dtype=object)
+        present = column.notna()
+        
+        if pd.api.types.is_datetime64_any_dtype(column):
+            # 整列都是Excel日期单元格，无需推断
+            converted[present] = column[present].dt.strftime('%Y-%m-%d')
+            date_parser = DateParser()
+            date_parser.fast_count = int(present.sum())
+            return converted, date_parser
+        
+        text = column[present].astype(str).str.strip()
+        remaining = text
+        # 推断的格式排在最前，大多数值在第一轮就转换完成
+        date_parser = DateParser.from_samples(text.head(DEFAULT_SAMPLE_SIZE).tolist())
+        for i, fmt in enumerate(date_parser.formats_in_order()):
+            if remaining.empty:
+                break
+            parsed = pd.to_datetime(remaining, format=fmt, errors='coerce')
+            ok = parsed.notna()
+            converted[remaining.index[ok]] = parsed[ok].dt.strftime('%Y-%m-%d')
+            if i == 0 and date_parser.format_name:
+                date_parser.fast_count += int(ok.sum())
+            else:
+                date_parser.fallback_count += int(ok.sum())
+            remaining = remaining[~ok]
+        date_parser.failed_count += len(remaining)
+        
+        # 无法识别的日期保留原文
+        converted[remaining.index] = remaining
+        return converted, date_parser
+    
     def detect_encoding(self, file_path):
         """
         检测文件编码
@@ -519,99 +921,736 @@ class DataImporter:
         """
         try:
             with open(file_path, 'rb') as f:
-                raw_data = f.read(4096)  # 读取部分文件内容用于检测
-            result = chardet.detect(raw_data)
-            if result['encoding'] and result['confidence'] > 0.7:
-                return result['encoding']
-            return 'utf-8'  # 默认返回UTF-8
+                raw_data = f.read(DETECT_SAMPLE_SIZE)  # 读取部分文件内容用于检测
+            return detect_encoding_from_bytes(raw_data)
         except Exception:
             return 'utf-8'
     
-    def import_file(self, file_path, file_type=None, delimiter=',', header_row=0, mapping=None):
+    def import_file(self, file_path, file_type=None, delimiter=',', header_row=0, mapping=None, sheet_name=0):
         """
         通用文件导入方法，根据文件类型调用对应的导入方法
         
         Args:
             file_path: 文件路径
-            file_type: 文件类型，可选值：'csv', 'tsv', 'excel', 'txt'
+            file_type: 文件类型，可选值：'csv', 'tsv', 'excel', 'txt', 'jsonl', 'parquet'
             delimiter: 分隔符，用于CSV/TSV文件
             header_row: 表头行索引
             mapping: 字段映射
+            sheet_name: Excel工作表名称或索引
             
         Returns:
             ImportResult: 导入结果
         """
         # 如果未指定文件类型，则根据扩展名判断
         if not file_type:
-            ext = os.path.splitext(file_path)[1].lower()
-            if ext == '.csv':
-                file_type = 'csv'
-            elif ext == '.tsv':
-                file_type = 'tsv'
-            elif ext in ['.xlsx', '.xls']:
-                file_type = 'excel'
-            elif ext == '.txt':
-                file_type = 'txt'
-            else:
-                file_type = 'csv'  # 默认为CSV
+            file_type = _detect_file_type(file_path)
         
         # 根据文件类型调用对应的导入方法
         if file_type == 'excel':
-            return self.import_excel(file_path, header_row=header_row, mapping=mapping)
+            return self.import_excel(file_path, sheet_name=sheet_name, header_row=header_row, mapping=mapping)
         elif file_type in ['tsv', 'csv', 'txt']:
-            # 检测文件编码
-            encoding = self.detect_encoding(file_path)
+            # 单次读取并解码文件内容，编码自动检测，必要时中途切换
+            with DecodedFile(file_path) as f:
+                file_content = ''.join(f)
+                encoding = f.encoding
             
-            try:
-                # 读取文件内容
-                with open(file_path, 'r', encoding=encoding) as f:
-                    file_content = f.read()
-                
-                if file_type == 'tsv':
-                    return self.import_csv(file_content, delimiter='\t', mapping=mapping)
-                elif file_type == 'csv':
-                    return self.import_csv(file_content, delimiter=delimiter, mapping=mapping)
-                else:  # txt
-                    # 尝试自动检测格式
-                    return self.import_text(file_content, format_type="auto")
-            except UnicodeDecodeError:
-                # 如果编码检测失败，尝试使用不同的编码
-                for enc in ['utf-8', 'gb2312', 'gbk', 'gb18030', 'iso-8859-1']:
-                    try:
-                        with open(file_path, 'r', encoding=enc) as f:
-                            file_content = f.read()
-                        
-                        if file_type == 'tsv':
-                            return self.import_csv(file_content, delimiter='\t', mapping=mapping)
-                        elif file_type == 'csv':
-                            return self.import_csv(file_content, delimiter=delimiter, mapping=mapping)
-                        else:  # txt
-                            return self.import_text(file_content, format_type="auto")
-                    except UnicodeDecodeError:
-                        continue
-                
-                # 所有编码都失败了
-                result = ImportResult()
-                result.add_error(0, {}, "文件编码不支持，请尝试转换为UTF-8编码")
-                return result
+            if file_type == 'tsv':
+                result = self.import_csv(file_content, delimiter='\t', mapping=mapping)
+            elif file_type == 'csv':
+                result = self.import_csv(file_content, delimiter=delimiter, mapping=mapping)
+            else:  # txt
+                # 尝试自动检测格式
+                result = self.import_text(file_content, format_type="auto")
+            result.encoding = encoding
+            return result
+        elif file_type == 'jsonl':
+            return self.import_jsonl(file_path, mapping=mapping)
+        elif file_type == 'parquet':
+            return self.import_parquet(file_path, mapping=mapping)
         else:
-            result = ImportResult()
+            result = self._new_result()
             result.add_error(0, {}, f"不支持的文件类型: {file_type}")
             return result
     
-    def generate_preview(self, file_path, file_type=None, delimiter=',', lines=10):
+    def import_jsonl(self, file_path, mapping=None):
+        """
+        导入JSON Lines文件，每行一个JSON对象
+        字段名为交易字段名（与导出一致）或中文表头，数值和标签列表保持原类型
+        """
+        result = self._new_result()
+        try:
+            with DecodedFile(file_path) as f:
+                self._import_records(_iter_jsonl_records(f), mapping, result)
+                result.encoding = f.encoding
+        except Exception as e:
+            result.add_error(0, {}, f"JSON Lines解析错误: {str(e)}")
+        return result
+    
+    def import_parquet(self, file_path, mapping=None):
+        """
+        导入Parquet文件，按行组分批读取
+        列名规则与JSON Lines相同，日期列可以是日期类型或字符串
+        """
+        result = self._new_result()
+        if not has_parquet:
+            result.add_error(0, {}, "Parquet导入不可用，请安装pyarrow库")
+            return result
+        try:
+            self._import_records(_iter_parquet_records(file_path), mapping, result)
+        except Exception as e:
+            result.add_error(0, {}, f"Parquet解析错误: {str(e)}")
+        return result
+    
+    def _import_records(self, records, mapping, result, writer=None):
+        """
+        把(行号, 记录, 错误信息, 读取位置)序列转换为交易对象
+        writer不为None时逐条交给写入器，并记录导入断点的读取位置
+        """
+        mapping = mapping or RECORD_FIELD_MAPPING
+        records = iter(records)
+        sample = list(islice(records, DEFAULT_SAMPLE_SIZE))
+        date_fields = [source for source, field in mapping.items() if field == 'date']
+        date_parser = DateParser.from_samples([
+            next((record[field] for field in date_fields if field in record), None)
+            for _, record, error, _ in sample if not error
+        ])
+        
+        for row_index, record, error, position in chain(sample, records):
+            if error:
+                result.add_error(row_index, record, error)
+                transaction = None
+            else:
+                transaction = self._map_row(row_index, record, mapping, result, date_parser)
+            if writer is None:
+                if transaction:
+                    result.add_success(transaction)
+                continue
+            # 读取位置在生成记录时取得，预读的样本也对应各自的行
+            if position:
+                writer.mark_position(*position)
+            if transaction:
+                result.add_success(transaction)
+                writer.add(transaction, row_index)
+            if writer.cancelled:
+                break
+        result.date_format = date_parser.to_dict()
+    
+    def import_file_streaming(self, file_path, file_type=None, delimiter=',', header_row=0, mapping=None,
+                              batch_size=DEFAULT_IMPORT_BATCH_SIZE, progress_callback=None, should_cancel=None,
+                              resume=False):
+        """
+        流式导入文件并直接写入数据库
+        
+        CSV/TSV文件逐行解码、解析和校验，每batch_size行查重后批量写入并提交，
+        内存占用与文件大小无关。其他文件类型仍整体解析后保存。
+        CSV/TSV文件每批写入时同时提交导入断点，中断后可从断点继续。
+        JSON Lines文件同样逐行写入并记录断点，Parquet文件按行组分批读取写入。
+        
+        Args:
+            file_path: 文件路径
+            file_type: 文件类型，可选值：'csv', 'tsv', 'excel', 'txt', 'jsonl', 'parquet'
+            delimiter: 分隔符，用于CSV文件
+            header_row: 表头行索引，用于Excel文件
+            mapping: 字段映射
+            batch_size: 每批写入的行数
+            progress_callback: 每批写入后调用 callback(已写入数, 错误数)
+            should_cancel: 每批写入后调用，返回True时取消剩余部分的导入
+            resume: 存在未完成的导入断点时从断点继续，不再读取和查重断点之前的部分
+            
+        Returns:
+            ImportResult: 导入结果，saved_count为写入的记录数（继续导入时包括断点之前的部分）
+        """
+        if not file_type:
+            file_type = _detect_file_type(file_path)
+        
+        if file_type == 'jsonl':
+            def read_jsonl(f, result, writer, checkpoint):
+                first_line = checkpoint['row_index'] + 1 if checkpoint else 1
+                self._import_records(_iter_jsonl_records(f, first_line), mapping, result, writer)
+            
+            return self._import_decoded_file(file_path, read_jsonl, batch_size, progress_callback, should_cancel,
+                                             resume)
+        
+        if file_type == 'parquet' and has_parquet:
+            return self._import_parquet_streaming(file_path, mapping, batch_size, progress_callback, should_cancel)
+        
+        if file_type not in ['csv', 'tsv']:
+            result = self.import_file(file_path, file_type=file_type, delimiter=delimiter,
+                                      header_row=header_row, mapping=mapping)
+            return self.save_imported_data_in_batches(result, batch_size, progress_callback, should_cancel)
+        
+        if file_type == 'tsv':
+            delimiter = '\t'
+        if not mapping:
+            mapping = DEFAULT_FIELD_MAPPING
+        
+        def read_records(f, result, writer, checkpoint):
+            if checkpoint:
+                # 断点位于记录边界，之后没有表头，沿用断点中保存的表头
+                reader = csv.DictReader(f, fieldnames=checkpoint['header'], delimiter=delimiter)
+                start_row = checkpoint['row_index'] + 1
+            else:
+                reader = csv.DictReader(f, delimiter=delimiter)
+                start_row = 1
+            rows, date_parser = self._infer_date_parser(reader, mapping)
+            writer.set_checkpoint_header(reader.fieldnames)
+            result.date_format = date_parser.to_dict()
+            # 推断日期格式时已预读样本行，读取位置要到样本的最后一行才与当前行对应
+            sample_end_row = start_row + DEFAULT_SAMPLE_SIZE - 1
+            for i, row in enumerate(rows, start=start_row):
+                transaction = self._map_row(i, row, mapping, result, date_parser)
+                if i >= sample_end_row:
+                    writer.mark_position(f.byte_offset, i, f.encoding)
+                if transaction:
+                    result.add_success(transaction)
+                    writer.add(transaction, i)
+                if writer.cancelled:
+                    break
+            result.date_format = date_parser.to_dict()
+        
+        return self._import_decoded_file(file_path, read_records, batch_size, progress_callback, should_cancel,
+                                         resume)
+    
+    def _import_parquet_streaming(self, file_path, mapping, batch_size, progress_callback, should_cancel):
+        """按行组分批读取Parquet文件并写入，内存中只有当前批次"""
+        result = self._new_result(keep_records=False)
+        writer = _BatchWriter(self.db_manager, result, batch_size, progress_callback, should_cancel)
+        try:
+            self._import_records(_iter_parquet_records(file_path, batch_size), mapping, result, writer)
+            writer.flush()
+        except Exception as e:
+            writer.flush()
+            result.add_error(0, {}, f"Parquet解析错误: {str(e)}")
+        return result
+    
+    def _import_decoded_file(self, file_path, read_records, batch_size, progress_callback, should_cancel,
+                             resume=False):
+        """
+        单次读取并解码文件，交给read_records(f, result, writer, checkpoint)逐条写入
+        某行无法用检测到的编码解码时，从该行起改用下一个候选编码
+        
+        能精确定位行的编码下，每批写入时提交导入断点。resume为True且存在
+        未完成的断点时，直接定位到断点处读取，checkpoint为断点字典，否则为None。
+        """
+        result = self._new_result(keep_records=False)
+        writer = _BatchWriter(self.db_manager, result, batch_size, progress_callback, should_cancel)
+        
+        checkpoint = None
+        try:
+            fingerprint = file_fingerprint(file_path)
+        except OSError as e:
+            print(f"计算文件指纹失败: {e}")
+            fingerprint = None
+        if resume and fingerprint:
+            checkpoint = self.db_manager.get_import_checkpoint(fingerprint)
+            if checkpoint and checkpoint['status'] != 'running':
+                checkpoint = None
+        if checkpoint:
+            # 断点之前的部分已写入，计数从断点继续累计
+            result.saved_count = checkpoint['saved_count']
+            result.skipped_count = checkpoint['skipped_count']
+            result.error_count = checkpoint['error_count']
+            result.resumed_from_row = checkpoint['row_index']
+            print(f"从断点继续导入: {file_path}，第{checkpoint['row_index']}行之后，字节位置{checkpoint['byte_offset']}")
+        
+        try:
+            with DecodedFile(file_path,
+                             encoding=checkpoint['encoding'] if checkpoint else None,
+                             start_offset=checkpoint['byte_offset'] if checkpoint else 0) as f:
+                if fingerprint and f.exact_offsets:
+                    writer.checkpoint = {'fingerprint': fingerprint, 'file_path': file_path, 'header': None}
+                    result.checkpoint_fingerprint = fingerprint
+                read_records(f, result, writer, checkpoint)
+                result.encoding = f.encoding
+            writer.flush()
+        except Exception as e:
+            writer.flush()
+            result.add_error(0, {}, f"CSV解析错误: {str(e)}")
+            return result
+        
+        # 有批次写入失败时断点保持running，停在最后一个完整写入的批次，可以从那里重新导入
+        if result.checkpoint_fingerprint and not result.cancelled and not writer.failed:
+            self.db_manager.finish_import_checkpoint(result.checkpoint_fingerprint)
+        return result
+    
+    def import_file_parallel(self, file_path, file_type=None, delimiter=',', header_row=0, mapping=None,
+                             batch_size=DEFAULT_IMPORT_BATCH_SIZE, progress_callback=None, should_cancel=None,
+                             workers=None, resume=False):
+        """
+        多进程并行解析大文件并写入数据库
+        
+        文件按记录边界切分为块（引号内的换行不会被切开），各块在进程池中解析，
+        结果按原始顺序合并，行号为全局行号，由当前线程作为唯一写入者分批写入。
+        导入断点记录在已写完的块的末尾。
+        小文件和Excel文件使用流式导入。参数与import_file_streaming相同。
+        
+        Args:
+            workers: 解析进程数，默认为CPU核数
+            
+        Returns:
+            ImportResult: 导入结果，saved_count为写入的记录数
+        """
+        workers = workers or os.cpu_count() or 1
+        if not file_type:
+            file_type = _detect_file_type(file_path)
+        
+        try:
+            file_size = os.path.getsize(file_path)
+        except OSError:
+            file_size = 0
+        
+        if file_type not in ['csv', 'tsv', 'txt'] or workers < 2 or file_size < PARALLEL_PARSE_MIN_BYTES:
+            return self.import_file_streaming(
+                file_path, file_type=file_type, delimiter=delimiter, header_row=header_row, mapping=mapping,
+                batch_size=batch_size, progress_callback=progress_callback, should_cancel=should_cancel,
+                resume=resume
+            )
+        
+        if file_type == 'tsv':
+            delimiter = '\t'
+        if not mapping:
+            mapping = DEFAULT_FIELD_MAPPING
+        
+        def read_records(f, result, writer, checkpoint):
+            text_format = file_type
+            if file_type == 'txt':
+                # 按文件开头的内容判断文本格式，规则与import_text相同
+                detected = TEXT_FORMATS.detect(f.sample_text)
+                if detected and detected.delimiter:
+                    text_format, delimiter_used = 'csv', detected.delimiter
+                else:
+                    text_format, delimiter_used = 'custom', None
+                    line_format = detected.name if detected else 'custom'
+            else:
+                delimiter_used = delimiter
+            
+            date_parser = DateParser()
+            started = time.perf_counter()
+            start_row = checkpoint['row_index'] + 1 if checkpoint else 1
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # 块在切分出来时f.byte_offset恰好是块的末尾，与块的最后一行一起作为断点位置
+                if text_format == 'custom':
+                    tasks = (
+                        ((f.byte_offset, last_line, f.encoding),
+                         (_parse_text_chunk, chunk, first_line, line_format))
+                        for chunk, first_line, last_line in _iter_line_chunks(f, PARALLEL_CHUNK_ROWS, start_row)
+                    )
+                else:
+                    if checkpoint:
+                        fieldnames = checkpoint['header']
+                    else:
+                        fieldnames = _read_csv_header(f, delimiter_used)
+                    writer.set_checkpoint_header(fieldnames)
+                    chunks = (
+                        (chunk, first_row, last_row, f.byte_offset, f.encoding)
+                        for chunk, first_row, last_row in _iter_record_chunks(f, PARALLEL_CHUNK_ROWS, start_row)
+                    )
+                    first_chunk = next(chunks, None)
+                    if first_chunk is None:
+                        return
+                    
+                    # 在主进程中用第一个块推断一次日期格式，子进程直接使用推断结果
+                    sample_rows = csv.DictReader(io.StringIO(first_chunk[0], newline=''),
+                                                 fieldnames=fieldnames, delimiter=delimiter_used)
+                    _, date_parser = self._infer_date_parser(sample_rows, mapping)
+                    tasks = (
+                        ((byte_offset, last_row, encoding),
+                         (_parse_csv_chunk, chunk, fieldnames, delimiter_used, mapping, first_row,
+                          date_parser.format_name))
+                        for chunk, first_row, last_row, byte_offset, encoding in chain([first_chunk], chunks)
+                    )
+                
+                def write_next():
+                    # 块写完后立即提交，使断点与计数都落在块的边界上；
+                    # 块中途取消时，块内已写入的记录在继续导入时计为已存在
+                    position, future = pending.popleft()
+                    self._write_parsed_chunk(future.result(), result, writer, date_parser)
+                    if not writer.cancelled:
+                        writer.mark_position(*position)
+                        writer.flush()
+                
+                # 限制同时在途的块数，内存占用与文件大小无关
+                pending = deque()
+                for position, (func, *args) in tasks:
+                    pending.append((position, executor.submit(func, *args)))
+                    if len(pending) >= workers * 2:
+                        write_next()
+                        if writer.cancelled:
+                            break
+                while pending and not writer.cancelled:
+                    write_next()
+                for _, future in pending:
+                    future.cancel()
+            
+            if text_format != 'custom':
+                result.date_format = date_parser.to_dict()
+            else:
+                TEXT_FORMATS.record(line_format, result.parsed_count + result.error_count, result.parsed_count,
+                                    result.error_count, time.perf_counter() - started)
+        
+        return self._import_decoded_file(file_path, read_records, batch_size, progress_callback, should_cancel,
+                                         resume)
+    
+    def _write_parsed_chunk(self, parsed_chunk, result, writer, date_parser):
+        """把子进程的解析结果按顺序并入导入结果并写入"""
+        transactions, errors, date_counts = parsed_chunk
+        date_parser.merge_counts(date_counts)
+        for error in errors:
+            result.add_error(error['row_index'], error['row_data'], error['error_message'])
+        for transaction in transactions:
+            result.add_success(transaction)
+            writer.add(transaction)
+            if writer.cancelled:
+                break
+
+    def import_batch(self, file_paths, delimiter=',', header_row=0, mapping=None, all_sheets=True,
+                     batch_size=DEFAULT_IMPORT_BATCH_SIZE, progress_callback=None, should_cancel=None,
+                     workers=None):
+        """
+        批量导入多个文件，Excel文件可导入全部工作表
+        
+        每个文件或工作表作为一个来源，在进程池中并行解析，
+        解析结果按来源顺序交给唯一的写入者，所有来源共用同一个查重集合，
+        不同来源之间的重复记录也只写入一次。
+        
+        Args:
+            file_paths: 文件路径列表
+            all_sheets: Excel文件是否导入全部工作表，False时只导入第一个
+            workers: 解析进程数，默认为CPU核数
+            其余参数与import_file_streaming相同
+            
+        Returns:
+            ImportResult: 汇总的导入结果，sources为各来源的统计
+        """
+        workers = workers or os.cpu_count() or 1
+        result = self._new_result(keep_records=False)
+        writer = _BatchWriter(self.db_manager, result, batch_size, progress_callback, should_cancel)
+        
+        # 展开为来源列表: (文件路径, 文件类型, 工作表)
+        sources = []
+        for file_path in file_paths:
+            file_type = _detect_file_type(file_path)
+            if file_type != 'excel':
+                sources.append((file_path, file_type, None))
+                continue
+            try:
+                sheets = self.list_excel_sheets(file_path) if all_sheets else [0]
+            except Exception as e:
+                result.sources.append(self._source_stats(file_path, None, error=f"Excel解析错误: {str(e)}"))
+                result.add_error(0, {'source': file_path}, f"Excel解析错误: {str(e)}")
+                continue
+            sources.extend((file_path, file_type, sheet) for sheet in sheets)
+        
+        tasks = [(file_path, file_type, sheet, delimiter, header_row, mapping) for file_path, file_type, sheet in sources]
+        
+        def write_source(source, parsed):
+            file_path, _, sheet = source
+            transactions, errors, summary = parsed
+            before = (result.saved_count, result.skipped_count, result.error_count)
+            for error in errors:
+                row_data = {'source': file_path, 'sheet': sheet, 'row': error['row_data']}
+                result.add_error(error['row_index'], row_data, error['error_message'])
+            for transaction in transactions:
+                result.add_success(transaction)
+                writer.add(transaction)
+                if writer.cancelled:
+                    break
+            # 每个来源结束时写入剩余记录，各来源的写入数才准确
+            writer.flush()
+            result.sources.append(self._source_stats(
+                file_path, sheet,
+                parsed_count=len(transactions),
+                saved_count=result.saved_count - before[0],
+                skipped_count=result.skipped_count - before[1],
+                error_count=result.error_count - before[2],
+                **summary
+            ))
+        
+        def write_failure(source, e):
+            file_path, _, sheet = source
+            print(f"解析 {file_path} {sheet if sheet is not None else ''} 失败: {e}")
+            result.sources.append(self._source_stats(file_path, sheet, error=str(e)))
+            result.add_error(0, {'source': file_path, 'sheet': sheet}, f"解析失败: {str(e)}")
+        
+        # 只有一个来源或单进程时不启动进程池
+        if len(tasks) <= 1 or workers < 2:
+            for source, task in zip(sources, tasks):
+                if writer.cancelled:
+                    break
+                try:
+                    parsed = _parse_source(*task)
+                except Exception as e:
+                    write_failure(source, e)
+                    continue
+                write_source(source, parsed)
+            return result
+        
+        def write_next(pending):
+            source, future = pending.popleft()
+            try:
+                parsed = future.result()
+            except Exception as e:
+                write_failure(source, e)
+                return
+            write_source(source, parsed)
+        
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            # 按提交顺序写入，结果与逐个导入的顺序一致；限制在途的来源数，控制内存占用
+            pending = deque()
+            for source, task in zip(sources, tasks):
+                pending.append((source, executor.submit(_parse_source, *task)))
+                if len(pending) >= workers * 2:
+                    write_next(pending)
+                    if writer.cancelled:
+                        break
+            while pending and not writer.cancelled:
+                write_next(pending)
+            for _, future in pending:
+                future.cancel()
+        return result
+    
+    def _source_stats(self, file_path, sheet, parsed_count=0, saved_count=0, skipped_count=0, error_count=0,
+                      date_format=None, encoding=None, error=None):
+        """批量导入中单个来源的统计"""
+        return {
+            'file_path': file_path,
+            'file_name': os.path.basename(file_path),
+            'sheet': sheet,
+            'parsed_count': parsed_count,
+            'success_count': saved_count,
+            'skipped_count': skipped_count,
+            'error_count': error_count,
+            'date_format': date_format,
+            'encoding': encoding,
+            'error': error
+        }
+    
+    def import_file_staged(self, file_path, file_type=None, delimiter=',', header_row=0, mapping=None,
+                           batch_size=DEFAULT_IMPORT_BATCH_SIZE, progress_callback=None, should_cancel=None):
+        """
+        经暂存表导入文件
+
+        Python只做字段映射，原始值分批写入临时暂存表；类型转换、必填字段校验、
+        文件内和账本内查重都在数据库中以集合操作完成，最后一条INSERT ... SELECT写入。
+        合并在一个事务中完成，要么全部写入，要么全部不写入。
+        自定义文本格式不适用，改用流式导入。参数与import_file_streaming相同。
+
+        Args:
+            should_cancel: 每批写入暂存表后调用，返回True时放弃导入，不写入任何记录
+
+        Returns:
+            ImportResult: 导入结果，计数含义与其他导入方式相同
+        """
+        if not file_type:
+            file_type = _detect_file_type(file_path)
+
+        if file_type not in ['csv', 'tsv', 'excel']:
+            return self.import_file_streaming(
+                file_path, file_type=file_type, delimiter=delimiter, header_row=header_row, mapping=mapping,
+                batch_size=batch_size, progress_callback=progress_callback, should_cancel=should_cancel
+            )
+
+        if file_type == 'tsv':
+            delimiter = '\t'
+        if not mapping:
+            mapping = DEFAULT_FIELD_MAPPING
+
+        result = self._new_result(keep_records=False)
+        batch_size = max(1, batch_size)
+        date_samples = []
+        try:
+            self.db_manager.create_import_staging()
+            if file_type == 'excel':
+                df = pd.read_excel(file_path, header=header_row)
+                rows = enumerate(df.to_dict('records'), start=header_row + 1)
+                date_samples = self._stage_rows(rows, mapping, batch_size, result, should_cancel)
+            else:
+                with DecodedFile(file_path) as f:
+                    reader = csv.DictReader(f, delimiter=delimiter)
+                    date_samples = self._stage_rows(enumerate(reader, start=1), mapping, batch_size, result,
+                                                    should_cancel)
+                    result.encoding = f.encoding
+
+            if result.cancelled:
+                self.db_manager.drop_import_staging()
+                return result
+
+            merged = self.db_manager.merge_import_staging()
+        except Exception as e:
+            self.db_manager.drop_import_staging()
+            result.add_error(0, {}, f"{'Excel' if file_type == 'excel' else 'CSV'}解析错误: {str(e)}")
+            return result
+
+        if merged is None:
+            result.add_error(0, {}, "写入数据库失败")
+            return result
+
+        for row_index, raw, error_message in merged['errors']:
+            result.add_error(row_index, json.loads(raw), error_message)
+        result.add_skipped_count(SKIP_DUPLICATE_IN_FILE, merged['duplicate_in_file_count'])
+        result.add_skipped_count(SKIP_ALREADY_IN_LEDGER, merged['existing_count'])
+        result.saved_count = len(merged['inserted_ids'])
+        result.parsed_count = result.saved_count + result.skipped_count
+        result.inserted_ids.append(merged['inserted_ids'])
+
+        date_parser = DateParser.from_samples(date_samples)
+        date_parser.failed_count = merged['invalid_date_count']
+        date_parser.fast_count = result.parsed_count - date_parser.failed_count
+        result.date_format = date_parser.to_dict()
+
+        if progress_callback:
+            progress_callback(result.saved_count, result.error_count)
+        return result
+
+    def import_database(self, source_path, progress_callback=None):
+        """
+        从另一个账本数据库（其他用户的data.db或备份文件）导入
+
+        源数据库只读附加到当前连接，字段映射、查重、标签合并和写入都在
+        一个事务中以集合操作完成，不经过逐行解析。
+
+        Args:
+            source_path: 源数据库文件路径
+            progress_callback: 写入后调用 callback(已写入数, 错误数)
+
+        Returns:
+            ImportResult: 导入结果，源库内重复计为文件内重复
+        """
+        result = self._new_result(keep_records=False)
+        merged = self.db_manager.merge_from_database(source_path)
+        if merged is None:
+            result.add_error(0, {}, "合并账本数据库失败")
+            return result
+
+        for source_id in merged['invalid_ids']:
+            result.add_error(source_id, {'id': source_id}, "缺少必填字段")
+        result.add_skipped_count(SKIP_DUPLICATE_IN_FILE, merged['duplicate_in_source_count'])
+        result.add_skipped_count(SKIP_ALREADY_IN_LEDGER, merged['existing_count'])
+        result.saved_count = len(merged['inserted_ids'])
+        result.parsed_count = result.saved_count + result.skipped_count
+        result.inserted_ids.append(merged['inserted_ids'])
+        print(f"新建标签{merged['tag_count']}个，写入标签关联{merged['link_count']}条")
+
+        if progress_callback:
+            progress_callback(result.saved_count, result.error_count)
+        return result
+
+    def _stage_rows(self, rows, mapping, batch_size, result, should_cancel):
+        """
+        按字段映射取出原始值，分批写入暂存表
+        返回: 前若干个非空日期，作为日期格式推断的样本
+        """
+        fields = ['date', 'asset_type', 'project_name', 'amount', 'unit_price', 'currency', 'profit_loss', 'notes']
+        columns = [(source, field) for source, field in mapping.items() if field in fields]
+        date_samples = []
+
+        batch = []
+        for row_index, row in rows:
+            values = dict.fromkeys(fields)
+            for source, field in columns:
+                if source in row:
+                    values[field] = _staging_value(row[source])
+            if values['date'] and len(date_samples) < DEFAULT_SAMPLE_SIZE:
+                date_samples.append(values['date'])
+            batch.append((row_index, *(values[field] for field in fields),
+                          json.dumps(row, ensure_ascii=False, default=str)))
+            if len(batch) >= batch_size:
+                self.db_manager.stage_import_rows(batch)
+                batch = []
+                if should_cancel and should_cancel():
+                    result.cancelled = True
+                    return date_samples
+        if batch:
+            self.db_manager.stage_import_rows(batch)
+        return date_samples
+
+    def generate_preview(self, file_path, file_type=None, delimiter=',', lines=10, sheet_name=None):
         """
         生成文件预览
         
+        同一文件未修改时直接返回缓存的预览
+        
         Args:
             file_path: 文件路径
             file_type: 文件类型，可选值：'csv', 'tsv', 'excel', 'txt'
             delimiter: 分隔符，用于CSV/TSV文件
             lines: 预览行数
+            sheet_name: Excel工作表名称，默认为第一个工作表
             
         Returns:
             dict: 包含预览数据和列信息的字典
         """
+        try:
+            stat = os.stat(file_path)
+            cache_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size,
+                         file_type, delimiter, lines, sheet_name)
+        except OSError:
+            cache_key = None
+        
+        if cache_key in self.preview_cache:
+            self.preview_cache.move_to_end(cache_key)
+            return copy.deepcopy(self.preview_cache[cache_key])
+        
+        preview_data = self._build_preview(file_path, file_type, delimiter, lines, sheet_name)
+        
+        # 只缓存成功的预览，按最近使用淘汰
+        if cache_key and preview_data['success']:
+            self.preview_cache[cache_key] = copy.deepcopy(preview_data)
+            while len(self.preview_cache) > PREVIEW_CACHE_SIZE:
+                self.preview_cache.popitem(last=False)
+        
+        return preview_data
+    
+    def list_excel_sheets(self, file_path):
+        """
+        列出Excel文件中的工作表名称，不加载工作表内容
+        
+        Args:
+            file_path: Excel文件路径
+            
+        Returns:
+            list: 工作表名称列表
+        """
+        if has_openpyxl and os.path.splitext(file_path)[1].lower() != '.xls':
+            # 只读模式只解析工作簿目录
+            workbook = openpyxl.load_workbook(file_path, read_only=True)
+            try:
+                return list(workbook.sheetnames)
+            finally:
+                workbook.close()
+        return list(pd.ExcelFile(file_path).sheet_names)
+    
+    def _preview_excel(self, file_path, lines, sheet_name=None):
+        """
+        读取Excel文件的前若干行
+        xlsx使用openpyxl只读模式逐行读取，读够行数即停止，不解析整个工作表
+        
+        Returns:
+            tuple: (表头列表, 数据行列表, 工作表名称列表)
+        """
+        if not has_openpyxl or os.path.splitext(file_path)[1].lower() == '.xls':
+            excel_file = pd.ExcelFile(file_path)
+            df = excel_file.parse(sheet_name if sheet_name else 0, nrows=lines)
+            return df.columns.tolist(), df.head(lines).values.tolist(), list(excel_file.sheet_names)
+        
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheets = list(workbook.sheetnames)
+            worksheet = workbook[sheet_name] if sheet_name else workbook[sheets[0]]
+            rows_iter = worksheet.iter_rows(values_only=True)
+            headers = list(next(rows_iter, ()))
+            rows = [list(row) for row in islice(rows_iter, lines)]
+        finally:
+            workbook.close()
+        
+        # 去掉末尾的空列，与pandas读取的列数一致
+        while headers and headers[-1] is None:
+            headers.pop()
+        rows = [row[:len(headers)] for row in rows]
+        return headers, rows, sheets
+    
+    def _build_preview(self, file_path, file_type, delimiter, lines, sheet_name):
+        """读取文件开头部分生成预览数据"""
         preview_data = {
             'success': False,
             'headers': [],
@@ -622,110 +1661,242 @@ class DataImporter:
         try:
             # 如果未指定文件类型，则根据扩展名判断
             if not file_type:
-                ext = os.path.splitext(file_path)[1].lower()
-                if ext == '.csv':
-                    file_type = 'csv'
-                elif ext == '.tsv':
-                    file_type = 'tsv'
-                elif ext in ['.xlsx', '.xls']:
-                    file_type = 'excel'
-                elif ext == '.txt':
-                    file_type = 'txt'
-                else:
-                    file_type = 'csv'  # 默认为CSV
+                file_type = _detect_file_type(file_path)
             
             if file_type == 'excel':
-                # 使用pandas读取Excel文件
-                df = pd.read_excel(file_path, nrows=lines)
-                preview_data['headers'] = df.columns.tolist()
-                preview_data['rows'] = df.head(lines).values.tolist()
+                headers, rows, sheets = self._preview_excel(file_path, lines, sheet_name)
+                # 日期等单元格值转为字符串，便于序列化为JSON
+                preview_data['headers'] = [
+                    header if isinstance(header, str) else ('' if header is None else str(header))
+                    for header in headers
+                ]
+                preview_data['rows'] = [
+                    [value if value is None or isinstance(value, (str, int, float)) else str(value) for value in row]
+                    for row in rows
+                ]
+                preview_data['sheets'] = sheets
                 preview_data['success'] = True
             
             elif file_type in ['csv', 'tsv', 'txt']:
-                # 检测文件编码
-                encoding = self.detect_encoding(file_path)
-                
-                try:
-                    if file_type == 'csv':
-                        with open(file_path, 'r', encoding=encoding) as f:
-                            reader = csv.reader(f, delimiter=delimiter)
-                            headers = next(reader, [])
-                            preview_data['headers'] = headers
-                            
-                            rows = []
-                            for i, row in enumerate(reader):
-                                if i >= lines:
-                                    break
-                                rows.append(row)
-                            
-                            preview_data['rows'] = rows
-                            preview_data['success'] = True
-                    
-                    elif file_type == 'tsv':
-                        with open(file_path, 'r', encoding=encoding) as f:
-                            reader = csv.reader(f, delimiter='\t')
-                            headers = next(reader, [])
-                            preview_data['headers'] = headers
-                            
-                            rows = []
-                            for i, row in enumerate(reader):
-                                if i >= lines:
-                                    break
-                                rows.append(row)
-                            
-                            preview_data['rows'] = rows
-                            preview_data['success'] = True
+                # 单次读取并解码，只读取预览需要的开头部分
+                with DecodedFile(file_path) as f:
+                    if file_type in ['csv', 'tsv']:
+                        reader = csv.reader(f, delimiter=delimiter if file_type == 'csv' else '\t')
+                        headers = next(reader, [])
+                        preview_data['headers'] = headers
+                        
+                        rows = []
+                        for i, row in enumerate(reader):
+                            if i >= lines:
+                                break
+                            rows.append(row)
+                        
+                        preview_data['rows'] = rows
                     
                     else:  # txt
-                        with open(file_path, 'r', encoding=encoding) as f:
-                            lines_data = []
-                            for i, line in enumerate(f):
-                                if i >= lines:
-                                    break
-                                lines_data.append(line.strip())
-                            
-                            preview_data['headers'] = ['内容']
-                            preview_data['rows'] = [[line] for line in lines_data]
-                            preview_data['success'] = True
-                
-                except UnicodeDecodeError:
-                    # 如果编码检测失败，尝试使用不同的编码
-                    for enc in ['utf-8', 'gb2312', 'gbk', 'gb18030', 'iso-8859-1']:
-                        try:
-                            if file_type in ['csv', 'tsv']:
-                                with open(file_path, 'r', encoding=enc) as f:
-                                    reader = csv.reader(f, delimiter=',' if file_type == 'csv' else '\t')
-                                    headers = next(reader, [])
-                                    preview_data['headers'] = headers
-                                    
-                                    rows = []
-                                    for i, row in enumerate(reader):
-                                        if i >= lines:
-                                            break
-                                        rows.append(row)
-                                    
-                                    preview_data['rows'] = rows
-                                    preview_data['success'] = True
-                                    break
-                            else:  # txt
-                                with open(file_path, 'r', encoding=enc) as f:
-                                    lines_data = []
-                                    for i, line in enumerate(f):
-                                        if i >= lines:
-                                            break
-                                        lines_data.append(line.strip())
-                                    
-                                    preview_data['headers'] = ['内容']
-                                    preview_data['rows'] = [[line] for line in lines_data]
-                                    preview_data['success'] = True
-                                    break
-                        except UnicodeDecodeError:
-                            continue
+                        lines_data = []
+                        for i, line in enumerate(f):
+                            if i >= lines:
+                                break
+                            lines_data.append(line.strip())
+                        
+                        preview_data['headers'] = ['内容']
+                        preview_data['rows'] = [[line] for line in lines_data]
                     
-                    if not preview_data['success']:
-                        preview_data['error'] = "文件编码不支持，请尝试转换为UTF-8编码"
+                    preview_data['encoding'] = f.encoding
+                    preview_data['success'] = True
+            
+            else:
+                preview_data['error'] = f"不支持预览的文件类型: {file_type}"
         
         except Exception as e:
             preview_data['error'] = f"生成预览失败: {str(e)}"
         
-        return preview_data
\ No newline at end of file
+        # 报告日期列的格式推断结果
+        if preview_data['success']:
+            preview_data['date_format'] = self._infer_preview_date_format(preview_data)
+        
+        return preview_data
+    
+    def _infer_preview_date_format(self, preview_data):
+        """按默认字段映射找到预览中的日期列并推断格式"""
+        headers = [str(header).strip() for header in preview_data['headers']]
+        for index, header in enumerate(headers):
+            if DEFAULT_FIELD_MAPPING.get(header) == 'date' or header.lower() == 'date':
+                values = [row[index] for row in preview_data['rows'] if index < len(row)]
+                date_format = DateParser.from_samples(values).to_dict()
+                date_format['column'] = header
+                return date_format
+        return None
+
+
+# 多进程解析使用的模块级函数，子进程中不访问数据库
+
+_worker_importer = None
+
+
+def _staging_value(value):
+    """把单元格的值转换为暂存表中的文本，空值为None，日期单元格转为YYYY-MM-DD"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.strip()
+    if pd.isna(value):
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
+
+
+def _get_worker_importer():
+    """获取子进程内复用的导入器"""
+    global _worker_importer
+    if _worker_importer is None:
+        _worker_importer = DataImporter(None)
+        # 子进程的错误全部返回主进程，由主进程限制数量和写日志
+        _worker_importer.error_logs_dir = None
+        _worker_importer.max_errors = None
+    return _worker_importer
+
+
+def _parse_source(file_path, file_type, sheet_name, delimiter, header_row, mapping):
+    """
+    在子进程中解析批量导入的一个文件或工作表
+    返回: (交易列表, 错误列表, {'date_format', 'encoding'})
+    """
+    importer = _get_worker_importer()
+    if file_type == 'excel':
+        result = importer.import_excel(file_path, sheet_name=sheet_name, header_row=header_row, mapping=mapping)
+    else:
+        result = importer.import_file(file_path, file_type=file_type, delimiter=delimiter,
+                                      header_row=header_row, mapping=mapping)
+    return result.parsed_data, result.error_data, {'date_format': result.date_format, 'encoding': result.encoding}
+
+
+def _iter_jsonl_records(f, first_line=1):
+    """
+    逐行解析JSON Lines，跳过空行
+    生成: (行号, 记录字典或原始行, 错误信息, 读取位置)，读取位置用于导入断点
+    """
+    for i, line in enumerate(f, start=first_line):
+        position = (f.byte_offset, i, f.encoding)
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield i, line, f"JSON解析错误: {e}", position
+            continue
+        if not isinstance(record, dict):
+            yield i, line, "每行应为一个JSON对象", position
+            continue
+        yield i, _normalize_record(record), None, position
+
+
+def _iter_parquet_records(file_path, batch_size=DEFAULT_IMPORT_BATCH_SIZE):
+    """按批读取Parquet文件，生成: (行号, 记录字典, 错误信息, 读取位置)"""
+    parquet_file = pq.ParquetFile(file_path)
+    row_index = 0
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        for record in batch.to_pylist():
+            row_index += 1
+            yield row_index, _normalize_record(record), None, None
+
+
+def _normalize_record(record):
+    """把记录中的日期对象转换为YYYY-MM-DD字符串，其他值保持原类型"""
+    for key, value in record.items():
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            record[key] = value.strftime('%Y-%m-%d')
+    return record
+
+
+def _read_csv_header(f, delimiter):
+    """读取CSV表头记录，跳过开头的空行"""
+    for header_text, _, _ in _iter_record_chunks(f, 1):
+        rows = [row for row in csv.reader(io.StringIO(header_text, newline=''), delimiter=delimiter) if row]
+        if rows:
+            return rows[0]
+    return []
+
+
+def _iter_record_chunks(f, chunk_rows, first_row=1):
+    """
+    把CSV文本行按记录边界切分为块
+    引号数为奇数的行会进入或离开引号内，引号内的换行不会被切开
+    空行不计入记录数，与csv.DictReader跳过空行的行为一致
+    生成: (块文本, 块内第一条记录的全局行号, 块内最后一条记录的全局行号)
+    """
+    buffer = []
+    records = 0
+    in_quotes = False
+    
+    for line in f:
+        starts_record = not in_quotes
+        buffer.append(line)
+        if line.count('"') % 2:
+            in_quotes = not in_quotes
+        if in_quotes:
+            continue
+        if not (starts_record and line.strip('\r\n') == ''):
+            records += 1
+        if records >= chunk_rows:
+            yield ''.join(buffer), first_row, first_row + records - 1
+            first_row += records
+            buffer = []
+            records = 0
+    
+    if buffer:
+        yield ''.join(buffer), first_row, first_row + records - 1
+
+
+def _iter_line_chunks(f, chunk_rows, first_line=1):
+    """把文本按行切分为块，生成: (行列表, 块内第一行的行号, 块内最后一行的行号)"""
+    buffer = []
+    for line in f:
+        buffer.append(line)
+        if len(buffer) >= chunk_rows:
+            yield buffer, first_line, first_line + len(buffer) - 1
+            first_line += len(buffer)
+            buffer = []
+    if buffer:
+        yield buffer, first_line, first_line + len(buffer) - 1
+
+
+def _parse_csv_chunk(chunk_text, fieldnames, delimiter, mapping, first_row, date_format=None):
+    """在子进程中解析一个CSV块，返回(交易列表, 错误列表, 日期解析统计)"""
+    importer = _get_worker_importer()
+    result = ImportResult()
+    date_parser = DateParser(date_format)
+    reader = csv.DictReader(io.StringIO(chunk_text, newline=''), fieldnames=fieldnames, delimiter=delimiter)
+    for i, row in enumerate(reader, start=first_row):
+        transaction = importer._map_row(i, row, mapping, result, date_parser)
+        if transaction:
+            result.add_success(transaction)
+    return result.parsed_data, result.error_data, date_parser.counts()
+
+
+def _parse_text_chunk(lines, first_line, format_name='custom'):
+    """在子进程中解析一个逐行文本格式块，返回(交易列表, 错误列表, 日期解析统计)"""
+    # 运行时注册的格式在子进程中不一定存在，此时按自定义文本格式解析
+    text_format = TEXT_FORMATS.get(format_name) or TEXT_FORMATS.get('custom')
+    parse_line = text_format.parse_line
+    result = ImportResult()
+    for i, line in enumerate(lines, start=first_line):
+        line = line.strip()
+        # 跳过空行
+        if not line:
+            continue
+        try:
+            transaction, error_message = parse_line(line)
+            if transaction:
+                result.add_success(transaction)
+            elif error_message is None:
+                # 表头、合计等非数据行
+                continue
+            else:
+                result.add_error(i, line, error_message or "无法解析行")
+        except Exception as e:
+            result.add_error(i, line, str(e))
+    return result.parsed_data, result.error_data, (0, 0, 0)
@@ -3,6 +3,7 @@
 
 import os
 import sys
+import multiprocessing
 import datetime
 import logging
 from pathlib import Path
@@ -314,4 +315,6 @@ def main():
     sys.exit(app.start())
 
 if __name__ == "__main__":
+    # 打包后的程序中启动合并报表等进程池的子进程需要此调用
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
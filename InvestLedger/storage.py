@@ -2,12 +2,19 @@
 # -*- coding: utf-8 -*-
 
 import os
+import math
 import sqlite3
 import json
 import datetime
 import shutil
 from pathlib import Path
 
+# 流式读取交易记录时每次从游标取出的行数
+TRANSACTION_FETCH_SIZE = 5000
+
+# 批量查重时每条语句携带的键数，每个键4个参数，低于旧版SQLite的999个参数上限
+KEY_LOOKUP_CHUNK_SIZE = 200
+
 class Transaction:
     """交易记录模型类"""
     
@@ -51,6 +58,20 @@ class Transaction:
                 setattr(transaction, key, value)
         return transaction
 
+def _to_number(value):
+    """暂存导入的数值转换，规则与逐条导入相同：
+
+    空值和float()无法识别的值记为0，NaN和无穷大返回NULL，由调用方记为错误行
+    """
+    if value is None or value == '':
+        return 0.0
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return number if math.isfinite(number) else None
+
+
 class DatabaseManager:
     """数据库管理类，负责SQLite连接和CRUD操作"""
     
@@ -103,10 +124,15 @@ class DatabaseManager:
         # 初始化操作历史栈
         self.undo_stack = []
         self.redo_stack = []
+        
+        # 交易变更监听器，回调签名为 callback(old_transaction, new_transaction)
+        # 新增时old为None，删除时new为None，批量变更时两者均为None
+        self.change_listeners = []
     
     def _connect_db(self):
         """连接到SQLite数据库"""
-        conn = sqlite3.connect(self.db_file)
+        # 以URI方式打开，ATTACH其他数据库时才能使用?mode=ro只读附加
+        conn = sqlite3.connect(Path(self.db_file).resolve().as_uri(), uri=True)
         # 启用外键约束
         conn.execute("PRAGMA foreign_keys = ON")
         # 行工厂设置为字典
@@ -133,6 +159,12 @@ class DatabaseManager:
         )
         ''')
         
+        # 日期索引，供按日期范围汇总和序列查询使用
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date)")
+        
+        # 查重索引，导入时按项目名称和日期定位重复记录
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_project_date ON transactions (project_name, date)")
+        
         # 资产类别表
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS asset_types (
@@ -161,6 +193,40 @@ class DatabaseManager:
         )
         ''')
         
+        # 自动导入文件台账，按内容哈希和大小识别已处理的文件
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingested_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content_hash TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            file_path TEXT NOT NULL,
+            template_name TEXT,
+            status TEXT NOT NULL,
+            saved_count INTEGER NOT NULL DEFAULT 0,
+            skipped_count INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            ingested_at TEXT NOT NULL,
+            UNIQUE(content_hash, file_size)
+        )
+        ''')
+        
+        # 导入断点，记录每个源文件最后提交的位置，用于中断后继续导入
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            fingerprint TEXT PRIMARY KEY,
+            file_path TEXT NOT NULL,
+            byte_offset INTEGER NOT NULL,
+            row_index INTEGER NOT NULL,
+            header TEXT,
+            encoding TEXT,
+            saved_count INTEGER NOT NULL DEFAULT 0,
+            skipped_count INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        ''')
+        
         # 插入默认资产类别数据
         default_asset_types = ["股票", "基金", "债券", "外汇", "其他"]
         for asset_type in default_asset_types:
@@ -210,6 +276,26 @@ class DatabaseManager:
         if self.conn:
             self.conn.close()
     
+    # 交易变更通知
+    
+    def add_change_listener(self, callback):
+        """注册交易变更监听器"""
+        if callback not in self.change_listeners:
+            self.change_listeners.append(callback)
+    
+    def remove_change_listener(self, callback):
+        """移除交易变更监听器"""
+        if callback in self.change_listeners:
+            self.change_listeners.remove(callback)
+    
+    def notify_change(self, old_transaction=None, new_transaction=None):
+        """通知监听器交易已变更，两个参数均为None表示批量变更"""
+        for callback in list(self.change_listeners):
+            try:
+                callback(old_transaction, new_transaction)
+            except Exception as e:
+                print(f"交易变更通知失败: {e}")
+    
     # 交易记录CRUD操作
     
     # 操作历史记录相关方法
@@ -298,6 +384,7 @@ class DatabaseManager:
             query = f"INSERT INTO transactions ({fields}) VALUES ({placeholders})"
             cursor.execute(query, list(data.values()))
             self.conn.commit()
+            self.notify_change(None, transaction)
             return True
         except Exception as e:
             self.conn.rollback()
@@ -322,6 +409,7 @@ class DatabaseManager:
             
             # 获取新记录的ID
             transaction.id = cursor.lastrowid
+            self.notify_change(None, transaction)
             
             # 记录操作到历史栈
             if record:
@@ -333,8 +421,538 @@ class DatabaseManager:
             print(f"添加交易记录失败: {e}")
             return None
     
+    def add_transactions_bulk(self, transactions, checkpoint=None):
+        """批量添加交易记录
+
+        在一个事务中用executemany写入，适合大批量导入。
+        批量写入不记录撤销历史，写入后以批量变更通知监听器。
+
+        Args:
+            transactions: 交易对象列表
+            checkpoint: 导入断点字典，与本批记录在同一事务中保存，None表示不记录
+
+        Returns:
+            range: 写入记录的ID范围；写入失败时整批回滚，返回None
+        """
+        if not transactions and not checkpoint:
+            return range(0)
+
+        cursor = self.conn.cursor()
+        try:
+            last_id = 0
+            if transactions:
+                fields = [field for field in transactions[0].to_dict() if field != 'id']
+                query = f"INSERT INTO transactions ({', '.join(fields)}) VALUES ({', '.join('?' for _ in fields)})"
+                cursor.executemany(query, (
+                    [data[field] for field in fields]
+                    for data in (transaction.to_dict() for transaction in transactions)
+                ))
+                # 写事务持有数据库锁，同一批次的自增ID是连续的
+                last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+            if checkpoint:
+                self._write_import_checkpoint(cursor, checkpoint)
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"批量添加交易记录失败: {e}")
+            return None
+
+        if not transactions:
+            return range(0)
+        self.notify_change(None, None)
+        return range(last_id - len(transactions) + 1, last_id + 1)
+
+    def _write_import_checkpoint(self, cursor, checkpoint):
+        """写入导入断点（不提交），由调用方与数据写入放在同一事务中"""
+        cursor.execute('''
+            INSERT OR REPLACE INTO import_checkpoints
+            (fingerprint, file_path, byte_offset, row_index, header, encoding,
+             saved_count, skipped_count, error_count, status, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            checkpoint['fingerprint'],
+            checkpoint['file_path'],
+            checkpoint['byte_offset'],
+            checkpoint['row_index'],
+            json.dumps(checkpoint.get('header'), ensure_ascii=False),
+            checkpoint.get('encoding'),
+            checkpoint.get('saved_count', 0),
+            checkpoint.get('skipped_count', 0),
+            checkpoint.get('error_count', 0),
+            checkpoint.get('status', 'running'),
+            datetime.datetime.now().isoformat()
+        ))
+
+    def get_import_checkpoint(self, fingerprint):
+        """获取源文件的导入断点，不存在时返回None"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT * FROM import_checkpoints WHERE fingerprint = ?", (fingerprint,))
+            row = cursor.fetchone()
+        except Exception as e:
+            print(f"获取导入断点失败: {e}")
+            return None
+        if not row:
+            return None
+        checkpoint = dict(row)
+        checkpoint['header'] = json.loads(checkpoint['header']) if checkpoint['header'] else None
+        return checkpoint
+
+    def finish_import_checkpoint(self, fingerprint, status='completed'):
+        """标记导入断点的最终状态"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                "UPDATE import_checkpoints SET status = ?, updated_at = ? WHERE fingerprint = ?",
+                (status, datetime.datetime.now().isoformat(), fingerprint)
+            )
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"更新导入断点失败: {e}")
+
+    def delete_import_checkpoint(self, fingerprint):
+        """删除导入断点，如回滚了导入写入的记录之后"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("DELETE FROM import_checkpoints WHERE fingerprint = ?", (fingerprint,))
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"删除导入断点失败: {e}")
+
+    def delete_transactions_by_id_ranges(self, id_ranges):
+        """按ID范围批量删除交易记录，用于回滚批量导入
+
+        Args:
+            id_ranges: range对象列表
+
+        Returns:
+            int: 删除的记录数
+        """
+        id_ranges = [ids for ids in id_ranges if len(ids) > 0]
+        if not id_ranges:
+            return 0
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany(
+                "DELETE FROM transactions WHERE id BETWEEN ? AND ?",
+                [(ids[0], ids[-1]) for ids in id_ranges]
+            )
+            deleted = cursor.rowcount
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"批量删除交易记录失败: {e}")
+            return 0
+
+        self.notify_change(None, None)
+        return deleted
+
+    def find_existing_transaction_keys(self, keys):
+        """查找已存在的交易键
+
+        用于导入时的批量查重，重复的定义与逐条查重一致：项目名称、日期和盈亏金额都相同。
+
+        Args:
+            keys: (project_name, date, profit_loss)元组的集合
+
+        Returns:
+            set: 数据库中已存在的键，查询失败时为None（不能返回部分结果，否则会把重复记录当作新记录写入）
+        """
+        keys = list(set(keys))
+        if not keys:
+            return set()
+
+        existing = set()
+        cursor = self.conn.cursor()
+        try:
+            # 每批键作为VALUES表与交易表半连接，一条语句查出整批，由(project_name, date)索引定位
+            for start in range(0, len(keys), KEY_LOOKUP_CHUNK_SIZE):
+                chunk = keys[start:start + KEY_LOOKUP_CHUNK_SIZE]
+                values = ", ".join(["(?, ?, ?, ?)"] * len(chunk))
+                parameters = [value for i, key in enumerate(chunk, start) for value in (i, *key)]
+                cursor.execute(f'''
+                WITH batch_keys(i, project_name, date, profit_loss) AS (VALUES {values})
+                SELECT batch_keys.i FROM batch_keys
+                WHERE EXISTS (
+                    SELECT 1 FROM transactions
+                    WHERE transactions.project_name = batch_keys.project_name
+                      AND transactions.date = batch_keys.date
+                      AND transactions.profit_loss = batch_keys.profit_loss
+                )
+                ''', parameters)
+                existing.update(keys[row[0]] for row in cursor.fetchall())
+        except Exception as e:
+            print(f"批量查重失败: {e}")
+            return None
+        return existing
+
+    def create_import_staging(self):
+        """创建导入暂存表
+
+        暂存表是连接内的临时表，保存映射字段后尚未转换类型的原始值，
+        关闭连接后自动删除。已存在时先清空。
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("DROP TABLE IF EXISTS temp.import_staging")
+        cursor.execute('''
+        CREATE TEMP TABLE import_staging (
+            row_index INTEGER PRIMARY KEY,
+            date TEXT,
+            asset_type TEXT,
+            project_name TEXT,
+            amount TEXT,
+            unit_price TEXT,
+            currency TEXT,
+            profit_loss TEXT,
+            notes TEXT,
+            raw TEXT
+        )
+        ''')
+
+    def stage_import_rows(self, rows):
+        """批量写入暂存表
+
+        Args:
+            rows: (行号, 日期, 资产类别, 项目名称, 数量, 单价, 币种, 盈亏, 备注, 原始行JSON)元组列表
+        """
+        self.conn.executemany(
+            "INSERT INTO temp.import_staging VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def merge_from_database(self, source_path):
+        """把另一个账本数据库（其他用户的data.db或备份文件）合并到当前账本
+
+        源数据库以只读方式ATTACH，全部步骤在一个事务中以集合操作完成：
+        1. 按源表实际存在的列映射字段，缺少的列和空值使用默认值，文本去除空格
+        2. 项目名称或日期为空的行记为无效
+        3. 项目名称、日期和盈亏都相同即为重复：源库内重复的只保留源ID最小的一行，
+           与当前账本重复的跳过
+        4. 为保留的记录按源ID顺序分配连续的新ID，一条INSERT ... SELECT写入
+        5. 按名称合并标签，缺少的标签新建，transaction_tags按新的交易ID和标签ID重建
+
+        Args:
+            source_path: 源数据库文件路径
+
+        Returns:
+            dict: {'source_count': 源记录数, 'invalid_ids': 无效记录在源库中的ID,
+                   'duplicate_in_source_count': 源库内重复数, 'existing_count': 与账本重复数,
+                   'inserted_ids': 写入记录的ID范围, 'tag_count': 新建标签数, 'link_count': 写入的标签关联数}，
+                  失败时为None
+        """
+        source_path = os.path.abspath(source_path)
+        if not os.path.isfile(source_path):
+            print(f"源数据库不存在: {source_path}")
+            return None
+        if os.path.exists(self.db_file) and os.path.samefile(source_path, self.db_file):
+            print("不能把账本合并到自身")
+            return None
+
+        cursor = self.conn.cursor()
+        try:
+            # ATTACH不能在事务中执行
+            self.conn.commit()
+            cursor.execute("ATTACH DATABASE ? AS merge_src", (Path(source_path).resolve().as_uri() + "?mode=ro",))
+        except Exception as e:
+            print(f"附加源数据库失败: {e}")
+            return None
+
+        try:
+            source_tables = {row[0] for row in cursor.execute(
+                "SELECT name FROM merge_src.sqlite_master WHERE type = 'table'"
+            ).fetchall()}
+            if 'transactions' not in source_tables:
+                raise ValueError("源数据库中没有交易表")
+            source_columns = {row[1] for row in cursor.execute("PRAGMA merge_src.table_info(transactions)").fetchall()}
+            target_tables = {row[0] for row in cursor.execute(
+                "SELECT name FROM main.sqlite_master WHERE type = 'table'"
+            ).fetchall()}
+
+            def text(column, default="''"):
+                if column not in source_columns:
+                    return default
+                return f"COALESCE(NULLIF(trim({column}), ''), {default})"
+
+            def number(column):
+                return f"CAST(COALESCE({column}, 0) AS REAL)" if column in source_columns else "0.0"
+
+            def blank(column):
+                return f"trim(COALESCE({column}, '')) = ''" if column in source_columns else "1"
+
+            columns = "date, asset_type, project_name, amount, unit_price, currency, profit_loss, tags, notes"
+
+            # 先取得写锁，查重和分配ID期间账本不会被其他连接修改
+            cursor.execute("BEGIN IMMEDIATE")
+            source_count = cursor.execute("SELECT COUNT(*) FROM merge_src.transactions").fetchone()[0]
+            invalid_ids = [row[0] for row in cursor.execute(
+                f"SELECT id FROM merge_src.transactions WHERE {blank('project_name')} OR {blank('date')} ORDER BY id"
+            ).fetchall()]
+
+            # 分步写入临时表，避免多层子查询展开后重复计算同一表达式
+            cursor.execute(f'''
+            CREATE TEMP TABLE merge_source AS
+            SELECT id AS source_id,
+                   {text('date')} AS date,
+                   {text('asset_type', "'股票'")} AS asset_type,
+                   {text('project_name')} AS project_name,
+                   {number('amount')} AS amount,
+                   {number('unit_price')} AS unit_price,
+                   {text('currency', "'CNY'")} AS currency,
+                   {number('profit_loss')} AS profit_loss,
+                   {text('tags', "'[]'")} AS tags,
+                   {text('notes')} AS notes
+            FROM merge_src.transactions
+            WHERE NOT ({blank('project_name')} OR {blank('date')})
+            ''')
+
+            # 每个查重键保留源ID最小的一行：SQLite中与MIN()同查的其他列取自取得最小值的那一行
+            cursor.execute(f'''
+            CREATE TEMP TABLE merge_unique AS
+            SELECT s.*, EXISTS (
+                       SELECT 1 FROM main.transactions t
+                       WHERE t.project_name = s.project_name AND t.date = s.date AND t.profit_loss = s.profit_loss
+                   ) AS in_ledger
+            FROM (
+                SELECT MIN(source_id) AS source_id, {columns}, COUNT(*) AS copies
+                FROM temp.merge_source
+                GROUP BY project_name, date, profit_loss
+            ) s
+            ''')
+            unique_count, duplicate_in_source_count, existing_count = cursor.execute(
+                "SELECT COUNT(*), COALESCE(SUM(copies - 1), 0), COALESCE(SUM(in_ledger), 0) FROM temp.merge_unique"
+            ).fetchone()
+
+            # 按源ID顺序编号，新ID接在自增序列之后，源ID到新ID的对应关系用于重建标签关联
+            cursor.execute('''
+            CREATE TEMP TABLE merge_rows (
+                row_number INTEGER PRIMARY KEY,
+                source_id INTEGER,
+                date, asset_type, project_name, amount, unit_price, currency, profit_loss, tags, notes
+            )
+            ''')
+            cursor.execute(f'''
+            INSERT INTO temp.merge_rows (source_id, {columns})
+            SELECT source_id, {columns} FROM temp.merge_unique
+            WHERE NOT in_ledger
+            ORDER BY source_id
+            ''')
+            inserted_count = unique_count - existing_count
+            base_id = cursor.execute('''
+                SELECT MAX(COALESCE((SELECT seq FROM main.sqlite_sequence WHERE name = 'transactions'), 0),
+                           COALESCE((SELECT MAX(id) FROM main.transactions), 0))
+            ''').fetchone()[0]
+
+            cursor.execute(f'''
+            INSERT INTO main.transactions (id, {columns})
+            SELECT ? + row_number, {columns} FROM temp.merge_rows
+            ORDER BY row_number
+            ''', (base_id,))
+
+            tag_count = 0
+            if 'tags' in source_tables:
+                cursor.execute('''
+                INSERT INTO main.tags (name, color)
+                SELECT s.name, s.color FROM merge_src.tags s
+                WHERE s.name IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM main.tags t WHERE t.name = s.name)
+                ''')
+                tag_count = cursor.rowcount
+
+            link_count = 0
+            if {'tags', 'transaction_tags'} <= source_tables and 'transaction_tags' in target_tables:
+                cursor.execute('''
+                INSERT OR IGNORE INTO main.transaction_tags (transaction_id, tag_id)
+                SELECT ? + r.row_number, t.id
+                FROM merge_src.transaction_tags st
+                JOIN temp.merge_rows r ON r.source_id = st.transaction_id
+                JOIN merge_src.tags s ON s.id = st.tag_id
+                JOIN main.tags t ON t.name = s.name
+                ''', (base_id,))
+                link_count = cursor.rowcount
+
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"合并账本数据库失败: {e}")
+            return None
+        finally:
+            try:
+                for table in ('merge_source', 'merge_unique', 'merge_rows'):
+                    cursor.execute(f"DROP TABLE IF EXISTS temp.{table}")
+                cursor.execute("DETACH DATABASE merge_src")
+            except Exception as e:
+                print(f"分离源数据库失败: {e}")
+
+        print(f"合并账本数据库 {source_path}: 源记录{source_count}条，写入{inserted_count}条，"
+              f"源库内重复{duplicate_in_source_count}条，与账本重复{existing_count}条")
+        if inserted_count:
+            self.notify_change(None, None)
+        return {
+            'source_count': source_count,
+            'invalid_ids': invalid_ids,
+            'duplicate_in_source_count': duplicate_in_source_count,
+            'existing_count': existing_count,
+            'inserted_ids': range(base_id + 1, base_id + inserted_count + 1),
+            'tag_count': tag_count,
+            'link_count': link_count
+        }
+
+    def drop_import_staging(self):
+        """删除暂存表和中间结果"""
+        try:
+            self.conn.rollback()
+            for table in ('import_staging', 'import_cleaned', 'import_normalized', 'import_ranked'):
+                self.conn.execute(f"DROP TABLE IF EXISTS temp.{table}")
+        except Exception as e:
+            print(f"删除导入暂存表失败: {e}")
+
+    def merge_import_staging(self):
+        """校验暂存表中的记录并合并到交易表
+
+        全部步骤在一个事务中以集合操作完成：
+        1. 去除空格、填充默认值，数值列无法识别时记为0，
+           日期统一为YYYY-MM-DD（支持-、/、.和年月日分隔，无法识别的保留原文）
+        2. 项目名称或日期为空、数值为NaN或无穷大的行记为错误
+        3. 与逐条导入相同，项目名称、日期和盈亏都相同即为重复：
+           文件内重复的只保留第一行，与账本已有记录重复的跳过，两者分别计数
+        4. 一条INSERT ... SELECT ... WHERE NOT EXISTS写入剩余记录
+
+        数值列用注册到连接上的to_number()按float()转换，NaN和无穷大所在的行记为错误。
+
+        Returns:
+            dict: {'errors': [(行号, 原始行JSON, 错误信息)], 'duplicate_in_file_count': 文件内重复数,
+                   'existing_count': 与账本重复数,
+                   'inserted_ids': 写入记录的ID范围, 'invalid_date_count': 无法识别的日期数}，
+                  失败时为None
+        """
+        # 数值转换直接调用float()，与逐条导入的结果一致
+        self.conn.create_function('to_number', 1, _to_number, deterministic=True)
+
+        cursor = self.conn.cursor()
+        try:
+            # 分步写入临时表，避免多层子查询展开后重复计算同一表达式
+            cursor.execute('''
+            CREATE TEMP TABLE import_cleaned AS
+            SELECT *, substr(d, 1, 4) AS y,
+                   substr(substr(d, 6), 1, instr(substr(d, 6), '-') - 1) AS m,
+                   substr(substr(d, 6), instr(substr(d, 6), '-') + 1) AS dd
+            FROM (
+                SELECT row_index, raw, raw_date, asset_type, project_name, currency, notes,
+                       amount AS raw_amount, unit_price AS raw_unit_price, profit_loss AS raw_profit_loss,
+                       to_number(amount) AS amount,
+                       to_number(unit_price) AS unit_price,
+                       to_number(profit_loss) AS profit_loss,
+                       -- 统一分隔符，去掉Excel时间戳的时间部分
+                       replace(replace(replace(replace(replace(
+                           CASE WHEN raw_date GLOB '????-*-* [0-9]*:[0-9]*:[0-9]*'
+                                THEN substr(raw_date, 1, instr(raw_date, ' ') - 1) ELSE raw_date END,
+                           '/', '-'), '.', '-'), '年', '-'), '月', '-'), '日', '') AS d
+                FROM (
+                    SELECT row_index, raw,
+                           trim(COALESCE(date, '')) AS raw_date,
+                           COALESCE(NULLIF(trim(COALESCE(asset_type, '')), ''), '股票') AS asset_type,
+                           trim(COALESCE(project_name, '')) AS project_name,
+                           trim(COALESCE(amount, '')) AS amount,
+                           trim(COALESCE(unit_price, '')) AS unit_price,
+                           COALESCE(NULLIF(trim(COALESCE(currency, '')), ''), 'CNY') AS currency,
+                           trim(COALESCE(profit_loss, '')) AS profit_loss,
+                           trim(COALESCE(notes, '')) AS notes
+                    FROM temp.import_staging
+                )
+            )
+            ''')
+            cursor.execute('''
+            CREATE TEMP TABLE import_normalized AS
+            SELECT row_index, raw, asset_type, project_name, currency, notes, amount, unit_price, profit_loss,
+                   raw_date,
+                   -- 加修饰符后date()会把2月30日这类日期进位到下月，与原值不等即为非法日期
+                   CASE WHEN date(iso_date, '+0 days') = iso_date THEN iso_date ELSE raw_date END AS date,
+                   iso_date IS NULL OR date(iso_date, '+0 days') IS NOT iso_date AS invalid_date,
+                   CASE WHEN project_name = '' OR raw_date = '' THEN '缺少必填字段'
+                        WHEN amount IS NULL THEN '数量不是有效数值: ' || raw_amount
+                        WHEN unit_price IS NULL THEN '单价不是有效数值: ' || raw_unit_price
+                        WHEN profit_loss IS NULL THEN '盈亏不是有效数值: ' || raw_profit_loss
+                   END AS error
+            FROM (
+                SELECT *, CASE
+                           WHEN y GLOB '[0-9][0-9][0-9][0-9]' AND substr(d, 5, 1) = '-'
+                                AND length(m) BETWEEN 1 AND 2 AND NOT m GLOB '*[^0-9]*'
+                                AND length(dd) BETWEEN 1 AND 2 AND NOT dd GLOB '*[^0-9]*'
+                           THEN printf('%04d-%02d-%02d', CAST(y AS INTEGER), CAST(m AS INTEGER), CAST(dd AS INTEGER))
+                       END AS iso_date
+                FROM temp.import_cleaned
+            )
+            ''')
+
+            errors = [tuple(row) for row in cursor.execute('''
+                SELECT row_index, raw, error FROM temp.import_normalized
+                WHERE error IS NOT NULL
+                ORDER BY row_index
+            ''')]
+
+            invalid_date_count = cursor.execute('''
+                SELECT COUNT(*) FROM temp.import_normalized
+                WHERE invalid_date AND error IS NULL
+            ''').fetchone()[0]
+
+            # 文件内按出现顺序编号，每组重复只保留第一行
+            cursor.execute('''
+                CREATE TEMP TABLE import_ranked AS
+                SELECT *, ROW_NUMBER() OVER (
+                           PARTITION BY project_name, date, profit_loss ORDER BY row_index
+                       ) AS duplicate_rank
+                FROM temp.import_normalized
+                WHERE error IS NULL
+            ''')
+            cursor.execute("DROP TABLE temp.import_normalized")
+            cursor.execute("ALTER TABLE temp.import_ranked RENAME TO import_normalized")
+
+            exists = '''EXISTS (
+                SELECT 1 FROM transactions t
+                WHERE t.project_name = n.project_name AND t.date = n.date AND t.profit_loss = n.profit_loss
+            )'''
+            duplicate_in_file_count, existing_count = cursor.execute(f'''
+                SELECT COALESCE(SUM(duplicate_rank > 1), 0),
+                       COALESCE(SUM(duplicate_rank = 1 AND {exists}), 0)
+                FROM temp.import_normalized n
+            ''').fetchone()
+
+            cursor.execute(f'''
+                INSERT INTO transactions (date, asset_type, project_name, amount, unit_price,
+                                          currency, profit_loss, tags, notes)
+                SELECT date, asset_type, project_name, amount, unit_price, currency, profit_loss, '[]', notes
+                FROM temp.import_normalized n
+                WHERE duplicate_rank = 1 AND NOT {exists}
+                ORDER BY row_index
+            ''')
+            inserted_count = cursor.rowcount
+            # 一条语句在写事务中插入，自增ID是连续的
+            last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"合并导入暂存表失败: {e}")
+            return None
+        finally:
+            self.drop_import_staging()
+
+        if inserted_count > 0:
+            self.notify_change(None, None)
+        return {
+            'errors': errors,
+            'duplicate_in_file_count': duplicate_in_file_count,
+            'existing_count': existing_count,
+            'inserted_ids': range(last_id - inserted_count + 1, last_id + 1) if inserted_count > 0 else range(0),
+            'invalid_date_count': invalid_date_count
+        }
+
     def _update_transaction(self, transaction, record=True):
         """更新交易记录（内部方法）"""
+        # 有监听器时先取出旧记录，用于计算变更差量
+        old_transaction = self.get_transaction(transaction.id) if self.change_listeners else None
         cursor = self.conn.cursor()
         try:
             data = transaction.to_dict()
@@ -347,6 +965,8 @@ class DatabaseManager:
             
             cursor.execute(query, parameters)
             self.conn.commit()
+            if cursor.rowcount > 0:
+                self.notify_change(old_transaction, transaction)
             return cursor.rowcount > 0
         except Exception as e:
             self.conn.rollback()
@@ -373,10 +993,14 @@ class DatabaseManager:
     
     def _delete_transaction_by_id(self, transaction_id, record=True):
         """删除交易记录（内部方法）"""
+        # 有监听器时先取出旧记录，用于计算变更差量
+        old_transaction = self.get_transaction(transaction_id) if self.change_listeners else None
         cursor = self.conn.cursor()
         try:
             cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
             self.conn.commit()
+            if cursor.rowcount > 0:
+                self.notify_change(old_transaction, None)
             return cursor.rowcount > 0
         except Exception as e:
             self.conn.rollback()
@@ -456,6 +1080,55 @@ class DatabaseManager:
             print(f"获取交易记录列表失败: {e}")
             return []
     
+    def _filter_clause(self, filters):
+        """把过滤条件列表转换为WHERE子句和参数，格式与get_transactions相同"""
+        if not filters:
+            return "", []
+        clause = " WHERE " + " AND ".join(f"{field} {operator} ?" for field, operator, _ in filters)
+        return clause, [value for _, _, value in filters]
+    
+    def count_transactions(self, filters=None):
+        """统计符合过滤条件的交易记录数"""
+        clause, parameters = self._filter_clause(filters)
+        try:
+            return self.conn.execute(f"SELECT COUNT(*) FROM transactions{clause}", parameters).fetchone()[0]
+        except Exception as e:
+            print(f"统计交易记录数失败: {e}")
+            return 0
+    
+    def iter_transaction_rows(self, filters=None, order_by="date DESC", batch_size=TRANSACTION_FETCH_SIZE,
+                              columns="*"):
+        """流式读取交易记录，用于导出大量数据
+        
+        用游标的fetchmany分批取出，内存中最多只有一批记录。
+        记录为数据库中的原始字典，tags仍是JSON字符串。
+        
+        Args:
+            filters: 过滤条件列表，格式与get_transactions相同
+            order_by: 排序表达式
+            batch_size: 每批的行数
+            columns: 查询的列，可附加计算列，如"*, julianday(date) AS jd"
+            
+        Yields:
+            list: 一批记录字典
+        """
+        clause, parameters = self._filter_clause(filters)
+        query = f"SELECT {columns} FROM transactions{clause}"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        
+        # 使用独立的游标，分批读取期间不影响其他查询
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, parameters)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+        finally:
+            cursor.close()
+    
     def get_transactions_by_date_range(self, start_date, end_date):
         """按日期范围获取交易记录"""
         filters = [
@@ -495,7 +1168,241 @@ class DatabaseManager:
         except Exception as e:
             print(f"获取总盈亏失败: {e}")
             return 0
-    
+
+    def get_profit_loss_subtotals(self, group_expr=None, start_date=None, end_date=None, asset_type=None):
+        """按分组表达式和币种获取盈亏小计
+
+        每个分组按币种各返回一行，调用方只需对每个币种换算一次即可得到基准货币汇总。
+
+        Args:
+            group_expr: 分组SQL表达式，如 "date"、"substr(date, 1, 7)"、"asset_type"，None表示不分组
+            start_date: 开始日期
+            end_date: 结束日期
+            asset_type: 资产类别过滤
+
+        Returns:
+            list: [{'group_key': ..., 'currency': ..., 'total': float, 'count': int}, ...]
+        """
+        cursor = self.conn.cursor()
+        key_expr = group_expr or "NULL"
+        query = (f"SELECT {key_expr} AS group_key, currency, SUM(profit_loss) AS total, COUNT(*) AS count "
+                 f"FROM transactions")
+        parameters = []
+
+        # 构建WHERE子句
+        where_clauses = []
+
+        if start_date:
+            where_clauses.append("date >= ?")
+            parameters.append(start_date)
+
+        if end_date:
+            where_clauses.append("date <= ?")
+            parameters.append(end_date)
+
+        if asset_type:
+            where_clauses.append("asset_type = ?")
+            parameters.append(asset_type)
+
+        if where_clauses:
+            query += " WHERE " + " AND ".join(where_clauses)
+
+        query += f" GROUP BY {group_expr}, currency" if group_expr else " GROUP BY currency"
+
+        try:
+            cursor.execute(query, parameters)
+            return [
+                {
+                    'group_key': row['group_key'],
+                    'currency': row['currency'],
+                    'total': row['total'] or 0,
+                    'count': row['count']
+                }
+                for row in cursor.fetchall()
+            ]
+        except Exception as e:
+            print(f"获取盈亏小计失败: {e}")
+            return []
+
+    def get_profit_loss_series(self, period="month", count=6, end_date=None, amount_expr="profit_loss", amount_params=None):
+        """获取补全空档的周期盈亏序列
+
+        使用递归CTE生成以end_date所在周期结尾的连续count个周期，
+        再左连接交易记录汇总，没有交易的周期也会返回0。
+
+        Args:
+            period: 周期，'day'、'week'（周一开始）、'month' 或 'year'
+            count: 周期数量
+            end_date: 序列最后一个周期包含的日期，默认为今天
+            amount_expr: 金额SQL表达式，可用于换算币种
+            amount_params: 金额表达式的参数
+
+        Returns:
+            list: 按时间升序的[{'start_date', 'end_date', 'total', 'count'}, ...]，count不大于0时为空
+        """
+        if count <= 0:
+            return []
+        
+        # 各周期的起点计算方式和步长
+        period_rules = {
+            'day': ("date(?)", "-1 day", "+1 day"),
+            'week': ("date(?, '-6 days', 'weekday 1')", "-7 days", "+7 days"),
+            'month': ("date(?, 'start of month')", "-1 month", "+1 month"),
+            'year': ("date(?, 'start of year')", "-1 year", "+1 year"),
+        }
+        if period not in period_rules:
+            print(f"不支持的周期: {period}")
+            return []
+        anchor_expr, step_back, step_forward = period_rules[period]
+
+        query = f"""
+            WITH RECURSIVE buckets(idx, bucket_start) AS (
+                SELECT 0, {anchor_expr}
+                UNION ALL
+                SELECT idx + 1, date(bucket_start, '{step_back}') FROM buckets WHERE idx + 1 < ?
+            ),
+            ranges AS (
+                SELECT idx, bucket_start, date(bucket_start, '{step_forward}', '-1 day') AS bucket_end
+                FROM buckets
+            )
+            SELECT r.bucket_start AS start_date, r.bucket_end AS end_date,
+                   COALESCE(SUM({amount_expr}), 0.0) AS total, COUNT(t.id) AS count
+            FROM ranges r
+            LEFT JOIN transactions t ON t.date BETWEEN r.bucket_start AND r.bucket_end
+            GROUP BY r.idx
+            ORDER BY r.bucket_start
+        """
+        parameters = [end_date or datetime.date.today().isoformat(), count] + list(amount_params or [])
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query, parameters)
+            return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"获取盈亏序列失败: {e}")
+            return []
+
+    def get_currencies(self):
+        """获取交易记录中出现过的所有币种"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT DISTINCT currency FROM transactions")
+            return [row['currency'] for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"获取币种列表失败: {e}")
+            return []
+
+    def get_profit_loss_distribution(self, group_by="asset_type", amount_expr="profit_loss", amount_params=None,
+                                     quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), bins=10,
+                                     start_date=None, end_date=None):
+        """按分组获取盈亏分布统计，全部在SQL中完成（窗口函数计算分位数，分组计数生成直方图）
+
+        Args:
+            group_by: 分组方式，'asset_type'、'project' 或 'tag'
+            amount_expr: 金额SQL表达式，可用于换算币种，默认为原始盈亏
+            amount_params: 金额表达式的参数
+            quantiles: 需要计算的分位数（0-1）
+            bins: 直方图分箱数
+            start_date: 开始日期
+            end_date: 结束日期
+
+        Returns:
+            list: [{'group', 'count', 'total', 'mean', 'stdev', 'min', 'max',
+                    'quantiles': [(lo, hi), ...], 'bin_counts': {bin: count}}, ...]
+            分位数以相邻两个次序统计量返回，由调用方线性插值
+        """
+        group_columns = {
+            'asset_type': ("t.asset_type", "transactions t"),
+            'project': ("t.project_name", "transactions t"),
+            'tag': ("g.name", "transactions t "
+                              "JOIN transaction_tags tt ON tt.transaction_id = t.id "
+                              "JOIN tags g ON g.id = tt.tag_id"),
+        }
+        if group_by not in group_columns:
+            print(f"不支持的分组方式: {group_by}")
+            return []
+        group_column, from_clause = group_columns[group_by]
+
+        # 构建基础数据集：分组键与金额
+        base_query = f"SELECT {group_column} AS grp, {amount_expr} AS value FROM {from_clause}"
+        base_parameters = list(amount_params or [])
+        where_clauses = []
+        if start_date:
+            where_clauses.append("t.date >= ?")
+            base_parameters.append(start_date)
+        if end_date:
+            where_clauses.append("t.date <= ?")
+            base_parameters.append(end_date)
+        if where_clauses:
+            base_query += " WHERE " + " AND ".join(where_clauses)
+
+        # 分位数：取 floor((n-1)*q) 与其下一个次序统计量
+        quantile_columns = []
+        quantile_parameters = []
+        for i, q in enumerate(quantiles):
+            quantile_columns.append(
+                f"MAX(CASE WHEN rn = CAST((n - 1) * ? AS INTEGER) THEN value END) AS q{i}_lo, "
+                f"MAX(CASE WHEN rn = MIN(CAST((n - 1) * ? AS INTEGER) + 1, n - 1) THEN value END) AS q{i}_hi"
+            )
+            quantile_parameters.extend([q, q])
+
+        stats_query = f"""
+            WITH base AS ({base_query}),
+            ranked AS (
+                SELECT grp, value,
+                       ROW_NUMBER() OVER (PARTITION BY grp ORDER BY value) - 1 AS rn,
+                       COUNT(*) OVER (PARTITION BY grp) AS n,
+                       AVG(value) OVER (PARTITION BY grp) AS grp_mean
+                FROM base
+            )
+            SELECT grp, n, SUM(value) AS total, AVG(value) AS mean,
+                   SUM((value - grp_mean) * (value - grp_mean)) AS sq_dev,
+                   MIN(value) AS min_value, MAX(value) AS max_value
+                   {''.join(', ' + column for column in quantile_columns)}
+            FROM ranked
+            GROUP BY grp, n
+        """
+
+        # 直方图：按组内最小/最大值等宽分箱计数
+        histogram_query = f"""
+            WITH base AS ({base_query}),
+            bounds AS (SELECT grp, MIN(value) AS lo, MAX(value) AS hi FROM base GROUP BY grp)
+            SELECT base.grp AS grp,
+                   CASE WHEN bounds.hi = bounds.lo THEN 0
+                        ELSE MIN(CAST((base.value - bounds.lo) * ? / (bounds.hi - bounds.lo) AS INTEGER), ? - 1)
+                   END AS bin,
+                   COUNT(*) AS count
+            FROM base JOIN bounds ON bounds.grp = base.grp
+            GROUP BY base.grp, bin
+        """
+
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(stats_query, base_parameters + quantile_parameters)
+            groups = {}
+            for row in cursor.fetchall():
+                groups[row['grp']] = {
+                    'group': row['grp'],
+                    'count': row['n'],
+                    'total': row['total'],
+                    'mean': row['mean'],
+                    'stdev': (row['sq_dev'] / (row['n'] - 1)) ** 0.5 if row['n'] > 1 else 0.0,
+                    'min': row['min_value'],
+                    'max': row['max_value'],
+                    'quantiles': [(row[f'q{i}_lo'], row[f'q{i}_hi']) for i in range(len(quantiles))],
+                    'bin_counts': {}
+                }
+
+            cursor.execute(histogram_query, base_parameters + [bins, bins])
+            for row in cursor.fetchall():
+                if row['grp'] in groups:
+                    groups[row['grp']]['bin_counts'][row['bin']] = row['count']
+
+            return list(groups.values())
+        except Exception as e:
+            print(f"获取盈亏分布失败: {e}")
+            return []
+
     # 资产类别操作
     
     def get_asset_types(self):
@@ -523,6 +1430,50 @@ class DatabaseManager:
     
     # 预算目标操作
     
+    # 自动导入文件台账
+    
+    def is_file_ingested(self, content_hash, file_size):
+        """文件内容是否已经处理过"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT 1 FROM ingested_files WHERE content_hash = ? AND file_size = ?",
+                (content_hash, file_size)
+            )
+            return cursor.fetchone() is not None
+        except Exception as e:
+            print(f"查询导入台账失败: {e}")
+            return False
+    
+    def record_ingested_file(self, content_hash, file_size, file_path, template_name, status,
+                             saved_count=0, skipped_count=0, error_count=0):
+        """记录已处理的文件，相同内容再次处理时覆盖原记录"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT OR REPLACE INTO ingested_files
+                (content_hash, file_size, file_path, template_name, status,
+                 saved_count, skipped_count, error_count, ingested_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (content_hash, file_size, file_path, template_name, status,
+                  saved_count, skipped_count, error_count, datetime.datetime.now().isoformat()))
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            print(f"记录导入台账失败: {e}")
+            return False
+    
+    def get_ingested_files(self, limit=100):
+        """获取最近处理的文件，按处理时间倒序"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT * FROM ingested_files ORDER BY ingested_at DESC, id DESC LIMIT ?", (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"获取导入台账失败: {e}")
+            return []
+    
     def set_budget_goal(self, year, month, goal_amount):
         """设置月度预算目标"""
         cursor = self.conn.cursor()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import datetime
+import threading
+
+from storage import Transaction
+
+# 嗅探格式时检查的非空行数
+SNIFF_LINE_COUNT = 20
+
+# 自定义文本格式："项目名称：盈/亏XXX元，日期"，按从严到宽的顺序尝试
+CUSTOM_LINE_PATTERNS = [
+    # 标准格式，允许元后多个空格再跟逗号
+    re.compile(r'(.+)：(盈|亏)(\d+)元\s*[，,]\s*(\d{4})年(\d{1,2})月(\d{1,2})日'),
+    # 冒号可省略，日期可用-或/分隔
+    re.compile(r'(.+)[:：]?\s*(盈|亏)(\d+)元\s*[，,]?\s*(\d{4})[-/年](\d{1,2})[-/月](\d{1,2})[日]?'),
+    # 更宽松的格式，少一些约束
+    re.compile(r'(.+)[：:]\s*(盈|亏)(\d+)[元]?\s*[，,]?\s*(\d{4})\D+(\d{1,2})\D+(\d{1,2})\D*'),
+]
+
+# 判断一行是否像自定义文本格式
+CUSTOM_SNIFF_PATTERN = re.compile(r'(.+)[：:]\s*(盈|亏)(\d+)元?')
+
+# 券商清仓盈亏对账单：以空格或制表符分列，表头含以下关键字，
+# 数据行依次为日期、6位证券代码、证券名称，中间可有其他列，最后一列为盈亏
+BROKER_HEADER_KEYWORDS = ('证券代码', '证券名称', '盈亏')
+BROKER_LINE_PATTERN = re.compile(
+    r'^(\d{4})[-/]?(\d{2})[-/]?(\d{2})\s+(\d{6})\s+(\S+)(?:\s+\S+)*?\s+([-+]?\d[\d,]*(?:\.\d+)?)$'
+)
+# 表头和合计行不是交易记录
+BROKER_SKIP_PATTERN = re.compile(r'证券代码|合计|小计|汇总')
+
+# 解析失败时用于诊断的正则
+_AMOUNT_PATTERN = re.compile(r'\d+元')
+_DATE_PATTERN = re.compile(r'\d{4}[-/年]\d{1,2}[-/月]\d{1,2}')
+_PROJECT_PATTERN = re.compile(r'^(.+?)[：:]')
+_PROFIT_PATTERN = re.compile(r'(盈|亏)(\d+)')
+_LOOSE_DATE_PATTERN = re.compile(r'(\d{4})[\D]+(\d{1,2})[\D]+(\d{1,2})')
+
+
+def _sample_lines(text_or_lines, count=SNIFF_LINE_COUNT):
+    """取开头若干个非空行，文本只切分开头部分"""
+    if isinstance(text_or_lines, str):
+        # 只切分开头部分，避免对整段文本split
+        lines = []
+        start = 0
+        while len(lines) < count and start < len(text_or_lines):
+            end = text_or_lines.find('\n', start)
+            if end == -1:
+                end = len(text_or_lines)
+            line = text_or_lines[start:end].strip()
+            if line:
+                lines.append(line)
+            start = end + 1
+        return lines
+    lines = []
+    for line in text_or_lines:
+        line = line.strip()
+        if line:
+            lines.append(line)
+            if len(lines) >= count:
+                break
+    return lines
+
+
+def _diagnose_custom_line(line):
+    """自定义文本行解析失败时给出原因"""
+    if "：" not in line and ":" not in line:
+        return "格式错误: 缺少冒号分隔项目名称与盈亏信息"
+    if "盈" not in line and "亏" not in line:
+        return "格式错误: 缺少盈亏标识(盈或亏)"
+    if not _AMOUNT_PATTERN.search(line):
+        return "格式错误: 缺少金额或金额格式不正确"
+    if not _DATE_PATTERN.search(line):
+        return "格式错误: 日期格式不正确，支持的格式有YYYY年MM月DD日或YYYY-MM-DD"
+
+    # 提取有用的信息用于调试
+    project_match = _PROJECT_PATTERN.search(line)
+    project_name = project_match.group(1).strip() if project_match else "未找到项目名"
+
+    profit_match = _PROFIT_PATTERN.search(line)
+    profit_info = profit_match.group(0) if profit_match else "未找到盈亏信息"
+
+    date_match = _LOOSE_DATE_PATTERN.search(line)
+    date_info = f"{date_match.group(1)}年{date_match.group(2)}月{date_match.group(3)}日" if date_match else "未找到日期"
+
+    return f"格式不符合规范，无法正确解析。解析结果: 项目={project_name}, 盈亏={profit_info}, 日期={date_info}"
+
+
+def parse_custom_line(line):
+    """
+    解析自定义文本行格式：项目名称：盈/亏XXX元，日期
+    例如：若羽臣：盈310元， 2025年4月10日
+    返回: (交易对象, 错误信息)，成功时错误信息为None
+    """
+    match = None
+    for pattern in CUSTOM_LINE_PATTERNS:
+        match = pattern.match(line)
+        if match:
+            break
+
+    if not match:
+        return None, _diagnose_custom_line(line)
+
+    # 提取数据并自动去除前后空格
+    project_name = match.group(1).strip()
+    profit_type = match.group(2)  # "盈" 或 "亏"
+    amount = int(match.group(3))
+    year = int(match.group(4))
+    month = int(match.group(5))
+    day = int(match.group(6))
+
+    # 验证日期有效性
+    try:
+        datetime.date(year, month, day)
+    except ValueError:
+        return None, f"日期无效: {year}年{month}月{day}日不是有效日期"
+
+    # 根据盈亏类型确定金额正负
+    profit_loss = amount if profit_type == "盈" else -amount
+
+    return Transaction(
+        date=f"{year:04d}-{month:02d}-{day:02d}",
+        asset_type="股票",  # 默认为股票类型
+        project_name=project_name,
+        amount=1,  # 默认为1
+        unit_price=profit_loss,  # 用盈亏金额作为单价
+        currency="CNY",  # 默认为人民币
+        profit_loss=profit_loss,
+        notes=""
+    ), None
+
+
+def parse_broker_line(line):
+    """
+    解析券商清仓盈亏对账单的一行：日期 证券代码 证券名称 … 盈亏
+    例如：20250410  600519  贵州茅台  100  1650.00  -1,234.56
+    返回: (交易对象, 错误信息)，表头和合计行返回(None, None)
+    """
+    if BROKER_SKIP_PATTERN.search(line):
+        return None, None
+
+    match = BROKER_LINE_PATTERN.match(line)
+    if not match:
+        return None, "格式错误: 对账单行应依次为日期、6位证券代码、证券名称，最后一列为盈亏"
+
+    year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3))
+    try:
+        datetime.date(year, month, day)
+    except ValueError:
+        return None, f"日期无效: {year}年{month}月{day}日不是有效日期"
+
+    code = match.group(4)
+    profit_loss = float(match.group(6).replace(',', ''))
+
+    return Transaction(
+        date=f"{year:04d}-{month:02d}-{day:02d}",
+        asset_type="股票",
+        project_name=match.group(5),
+        amount=1,
+        unit_price=profit_loss,
+        currency="CNY",
+        profit_loss=profit_loss,
+        notes=f"证券代码: {code}"
+    ), None
+
+
+class TextFormat:
+    """文本格式
+
+    逐行格式提供parse_line(line) -> (交易对象, 错误信息)，
+    表头、合计等非数据行返回(None, None)，导入时跳过；
+    分隔符格式提供delimiter，由导入器按CSV解析。
+    sniff(lines)只接收开头若干个非空行，返回是否像该格式。
+    """
+
+    def __init__(self, name, description, sniff, parse_line=None, delimiter=None):
+        self.name = name
+        self.description = description
+        self.sniff = sniff
+        self.parse_line = parse_line
+        self.delimiter = delimiter
+
+
+class TextFormatRegistry:
+    """文本格式注册表
+
+    自动识别时按注册顺序调用各格式的嗅探函数，第一个认可的格式胜出，
+    都不认可时使用默认格式。同时按格式累计解析行数、成功数、失败数和耗时。
+    """
+
+    def __init__(self, default_format=None):
+        self.formats = []
+        self.default_format = default_format
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def register(self, text_format, before=None):
+        """
+        注册格式，同名格式会被替换
+        before: 插到该名称的格式之前，用于让券商专用格式先于通用格式嗅探
+        """
+        self.formats = [f for f in self.formats if f.name != text_format.name]
+        index = next((i for i, f in enumerate(self.formats) if f.name == before), len(self.formats))
+        self.formats.insert(index, text_format)
+
+    def get(self, name):
+        """按名称获取格式"""
+        for text_format in self.formats:
+            if text_format.name == name:
+                return text_format
+        return None
+
+    def detect(self, text_or_lines):
+        """根据开头若干个非空行识别格式"""
+        lines = _sample_lines(text_or_lines)
+        for text_format in self.formats:
+            try:
+                if text_format.sniff(lines):
+                    return text_format
+            except Exception as e:
+                print(f"嗅探文本格式 {text_format.name} 失败: {e}")
+        return self.get(self.default_format)
+
+    def record(self, name, lines, parsed, failed, seconds):
+        """累计一次解析的统计"""
+        with self.lock:
+            stats = self.stats.setdefault(name, {
+                'format': name, 'runs': 0, 'lines': 0, 'parsed': 0, 'failed': 0, 'seconds': 0.0
+            })
+            stats['runs'] += 1
+            stats['lines'] += lines
+            stats['parsed'] += parsed
+            stats['failed'] += failed
+            stats['seconds'] += seconds
+
+    def get_stats(self):
+        """各格式的解析统计，附每千行耗时（毫秒）"""
+        with self.lock:
+            stats = [dict(s) for s in self.stats.values()]
+        for s in stats:
+            s['ms_per_1000_lines'] = s['seconds'] * 1000 * 1000 / s['lines'] if s['lines'] else 0
+        return stats
+
+    def reset_stats(self):
+        """清空解析统计"""
+        with self.lock:
+            self.stats.clear()
+
+
+class ParseTimer:
+    """统计一次解析耗时的上下文管理器，退出时把计数记入注册表"""
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.lines = 0
+        self.parsed = 0
+        self.failed = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.registry.record(self.name, self.lines, self.parsed, self.failed, time.perf_counter() - self.start)
+        return False
+
+
+# 内置格式：券商对账单 → 制表符 → 自定义文本 → 逗号，后三者与原先的自动识别规则一致
+TEXT_FORMATS = TextFormatRegistry(default_format='custom')
+TEXT_FORMATS.register(TextFormat(
+    'tsv', '制表符分隔',
+    sniff=lambda lines: any('\t' in line for line in lines),
+    delimiter='\t'
+))
+TEXT_FORMATS.register(TextFormat(
+    'custom', '项目名称：盈/亏XXX元，日期',
+    sniff=lambda lines: any(CUSTOM_SNIFF_PATTERN.search(line) for line in lines),
+    parse_line=parse_custom_line
+))
+TEXT_FORMATS.register(TextFormat(
+    'csv', '逗号分隔',
+    sniff=lambda lines: any(',' in line for line in lines),
+    delimiter=','
+))
+# 券商对账单常以制表符分列，需先于制表符格式嗅探
+TEXT_FORMATS.register(TextFormat(
+    'broker', '券商清仓盈亏对账单：日期 证券代码 证券名称 … 盈亏',
+    sniff=lambda lines: any(all(keyword in line for keyword in BROKER_HEADER_KEYWORDS) for line in lines),
+    parse_line=parse_broker_line
+), before='tsv')
+
+
+def register_text_format(text_format, before=None):
+    """注册自定义文本格式，如券商对账单的专用版式"""
+    TEXT_FORMATS.register(text_format, before=before)
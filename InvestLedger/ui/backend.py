@@ -9,12 +9,21 @@ import json
 from pathlib import Path
 import os
 
-from analyzer import DataAnalyzer
+from analyzer import DataAnalyzer, chart_points_for_width
+from consolidated import ConsolidatedAnalyzer
+from currency import CurrencyManager
 from importer import DataImporter
+from decoding import file_fingerprint
+from import_jobs import ImportJobManager
+from text_formats import TEXT_FORMATS
+from folder_watcher import FolderWatcher, DEFAULT_POLL_INTERVAL
 from exporter import DataExporter, ExportFormat, ExportResult
-from storage import Transaction
+from storage import Transaction, DatabaseManager
 from tags import TagManager
 
+# 返回给QML的错误行内容的最大长度
+MAX_ERROR_DATA_LENGTH = 500
+
 class UIBackend(QObject):
     """UI后端桥接类，连接QML前端与Python后端"""
     
@@ -30,6 +39,9 @@ class UIBackend(QObject):
     messageReceived = Signal(str)  # 显示消息
     importPreviewReady = Signal(str)  # 导入预览数据JSON字符串
     dashboardUpdateNeeded = Signal()  # 通知仪表盘需要更新
+    importJobProgress = Signal(str, int, int)  # 导入任务进度(任务ID, 成功数, 错误数)
+    importJobFinished = Signal(str, str)  # 导入任务结束(任务ID, 任务状态JSON字符串)
+    folderFileImported = Signal(str)  # 监视文件夹中的文件处理结束(台账记录JSON字符串)
     
     def __init__(self, main_app):
         super().__init__()
@@ -42,6 +54,12 @@ class UIBackend(QObject):
         self.data_importer = None
         self.tag_manager = None
         self.data_exporter = None
+        self.currency_manager = None
+        self.import_job_manager = None
+        self.folder_watcher = None
+        
+        # 导入任务在工作线程中结束，信号排队到主线程后再刷新界面
+        self.importJobFinished.connect(self._on_import_job_finished)
     
     # 用户管理相关方法
     
@@ -85,10 +103,25 @@ class UIBackend(QObject):
                 self.errorOccurred.emit(f"数据库连接测试失败: {e}")
                 # 不要在这里返回False，我们仍然需要初始化其他组件
             
+            # 初始化货币管理器（汇总统计按基准货币换算）
+            if not self.currency_manager:
+                self.currency_manager = CurrencyManager()
+            
             # 初始化数据分析和导入器
-            self.data_analyzer = DataAnalyzer(self.db_manager)
+            self.data_analyzer = DataAnalyzer(self.db_manager, self.currency_manager)
             self.data_importer = DataImporter(self.db_manager)
             
+            # 初始化后台导入任务管理器，工作线程使用独立的数据库连接
+            # 上一个用户的任务取消后在后台结束，不阻塞界面
+            if self.import_job_manager:
+                self.import_job_manager.shutdown(wait=False)
+            self.import_job_manager = ImportJobManager(lambda: DatabaseManager(username))
+            
+            # 切换用户时停止上一个用户的文件夹监视
+            if self.folder_watcher:
+                self.folder_watcher.stop()
+                self.folder_watcher = None
+            
             # 初始化标签管理器
             if self.db_manager:
                 self.tag_manager = TagManager(self.db_manager.db_path)
@@ -226,6 +259,8 @@ class UIBackend(QObject):
         success = self.db_manager.delete_transaction(transaction_id)
         if success:
             self.transactionsChanged.emit()
+            # 检查预算告警
+            self._check_budget_alerts()
         
         return success
     
@@ -253,6 +288,8 @@ class UIBackend(QObject):
         success = self.db_manager.update_transaction(transaction)
         if success:
             self.transactionsChanged.emit()
+            # 检查预算告警
+            self._check_budget_alerts()
         
         return success
     
@@ -360,8 +397,8 @@ class UIBackend(QObject):
         if not self.data_analyzer:
             return
         
-        # 获取预算告警
-        alerts = self.data_analyzer.check_budget_alerts()
+        # 只有预算新越过告警阈值时才提醒
+        alerts = self.data_analyzer.get_new_budget_alerts()
         if alerts:
             # 更新UI中的告警信息
             QGuiApplication.instance().findChild(QObject, "mainWindow").setProperty("budgetAlerts", alerts)
@@ -532,6 +569,68 @@ class UIBackend(QObject):
     
     # 数据导入相关方法
     
+    def _build_import_response(self, result):
+        """把导入结果转换为返回给QML的字典
+        
+        只返回内存中保留的部分错误明细和按类型的汇总，
+        完整明细通过getImportErrors按import_id分页读取。
+        """
+        result.flush_errors()
+        response = {
+            "success": result.parsed_count > 0,
+            "import_id": result.id,
+            "error_count": result.error_count,
+            "skipped_count": result.skipped_count,
+            "skipped_reasons": result.skipped_reasons,
+            "error_summary": result.get_error_summary(),
+            "errors_truncated": result.errors_truncated,
+            "errors": self._format_import_errors(result.error_data)
+        }
+        if response["success"]:
+            response["success_count"] = result.saved_count
+        else:
+            response["message"] = "没有成功导入的数据"
+        return response
+    
+    def _format_import_errors(self, errors):
+        """把错误明细转换为返回给QML的列表，原始行内容截断显示"""
+        return [
+            {
+                "row": error["row_index"],
+                "data": str(error["row_data"])[:MAX_ERROR_DATA_LENGTH],
+                "message": error["error_message"]
+            }
+            for error in errors
+        ]
+    
+    @Slot(str, int, int, result='QVariantMap')
+    def getImportErrors(self, import_id, offset, limit):
+        """分页获取某次导入的完整错误明细
+        
+        Args:
+            import_id: 导入结果中的import_id
+            offset: 起始序号
+            limit: 每页条数
+            
+        Returns:
+            dict: {"total": 错误总数, "errors": 当前页的错误}
+        """
+        if not self.data_importer:
+            self.errorOccurred.emit("未选择用户")
+            return {"total": 0, "errors": []}
+        page = self.data_importer.read_import_errors(import_id, max(0, offset), limit if limit > 0 else 100)
+        return {"total": page["total"], "errors": self._format_import_errors(page["errors"])}
+    
+    @Slot(result='QVariantList')
+    def getTextFormats(self):
+        """获取已注册的文本导入格式"""
+        return [{"name": f.name, "description": f.description} for f in TEXT_FORMATS.formats]
+    
+    @Slot(result='QVariantList')
+    def getTextFormatStats(self):
+        """获取各文本格式的解析计数和耗时"""
+        return TEXT_FORMATS.get_stats()
+    
     @Slot(str, str, str, result='QVariantList')
     def importCSVData(self, file_content, delimiter, mapping_json):
         """导入CSV数据"""
@@ -547,40 +646,13 @@ class UIBackend(QObject):
         
         # 保存到数据库
         if len(result.parsed_data) > 0:
-            saved_count = self.data_importer.save_imported_data(result)
+            self.data_importer.save_imported_data(result)
             # 通知UI更新
             self.transactionsChanged.emit()
-            
-            # 返回结果
-            return {
-                "success": True,
-                "success_count": saved_count,
-                "error_count": len(result.error_data),
-                "skipped_count": len(result.skipped_data),
-                "errors": [
-                    {
-                        "row": error["row_index"],
-                        "data": str(error["row_data"]),
-                        "message": error["error_message"]
-                    }
-                    for error in result.error_data
-                ]
-            }
-        else:
-            return {
-                "success": False,
-                "message": "没有成功导入的数据",
-                "error_count": len(result.error_data),
-                "skipped_count": len(result.skipped_data),
-                "errors": [
-                    {
-                        "row": error["row_index"],
-                        "data": str(error["row_data"]),
-                        "message": error["error_message"]
-                    }
-                    for error in result.error_data
-                ]
-            }
+            # 检查预算告警
+            self._check_budget_alerts()
+        
+        return self._build_import_response(result)
     
     @Slot(str, result='QVariantMap')
     def importClipboardText(self, text):
@@ -594,40 +666,13 @@ class UIBackend(QObject):
         
         # 保存到数据库
         if len(result.parsed_data) > 0:
-            saved_count = self.data_importer.save_imported_data(result)
+            self.data_importer.save_imported_data(result)
             # 通知UI更新
             self.transactionsChanged.emit()
-            
-            # 返回结果
-            return {
-                "success": True,
-                "success_count": saved_count,
-                "error_count": len(result.error_data),
-                "skipped_count": len(result.skipped_data),
-                "errors": [
-                    {
-                        "row": error["row_index"],
-                        "data": str(error["row_data"]),
-                        "message": error["error_message"]
-                    }
-                    for error in result.error_data
-                ]
-            }
-        else:
-            return {
-                "success": False,
-                "message": "没有成功导入的数据",
-                "error_count": len(result.error_data),
-                "skipped_count": len(result.skipped_data),
-                "errors": [
-                    {
-                        "row": error["row_index"],
-                        "data": str(error["row_data"]),
-                        "message": error["error_message"]
-                    }
-                    for error in result.error_data
-                ]
-            }
+            # 检查预算告警
+            self._check_budget_alerts()
+        
+        return self._build_import_response(result)
     
     @Slot(str, int, str, result='QVariantMap')
     def importFromFile(self, file_url, header_row, file_type):
@@ -649,49 +694,21 @@ class UIBackend(QObject):
             # 转换文件URL为本地路径
             file_path = QUrl(file_url).toLocalFile()
             
-            # 根据文件类型选择导入方法
-            result = self.data_importer.import_file(
+            # 流式解析（大文件多进程解析）并分批写入数据库，每批写入后报告进度
+            result = self.data_importer.import_file_parallel(
                 file_path=file_path, 
                 file_type=file_type,
-                header_row=header_row
+                header_row=header_row,
+                progress_callback=self.importProgressChanged.emit
             )
             
-            # 保存到数据库
-            if len(result.parsed_data) > 0:
-                saved_count = self.data_importer.save_imported_data(result)
+            if result.saved_count > 0:
                 # 通知UI更新
                 self.transactionsChanged.emit()
-                
-                # 返回结果
-                return {
-                    "success": True,
-                    "success_count": saved_count,
-                    "error_count": len(result.error_data),
-                    "skipped_count": len(result.skipped_data),
-                    "errors": [
-                        {
-                            "row": error["row_index"],
-                            "data": str(error["row_data"]),
-                            "message": error["error_message"]
-                        }
-                        for error in result.error_data
-                    ]
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": "没有成功导入的数据",
-                    "error_count": len(result.error_data),
-                    "skipped_count": len(result.skipped_data),
-                    "errors": [
-                        {
-                            "row": error["row_index"],
-                            "data": str(error["row_data"]),
-                            "message": error["error_message"]
-                        }
-                        for error in result.error_data
-                    ]
-                }
+                # 检查预算告警
+                self._check_budget_alerts()
+            
+            return self._build_import_response(result)
         except Exception as e:
             self.errorOccurred.emit(f"导入文件失败: {str(e)}")
             return {
@@ -699,6 +716,324 @@ class UIBackend(QObject):
                 "message": f"导入文件失败: {str(e)}"
             }
     
+    def _on_import_job_progress(self, job_id, saved_count, error_count):
+        """导入任务进度回调（工作线程中调用）"""
+        self.importJobProgress.emit(job_id, saved_count, error_count)
+        self.importProgressChanged.emit(saved_count, error_count)
+    
+    def _on_import_job_done(self, job):
+        """导入任务结束回调（工作线程中调用）"""
+        self.importJobFinished.emit(job.id, json.dumps(self._build_job_status(job), ensure_ascii=False))
+    
+    def _build_job_status(self, job):
+        """把导入任务状态转换为返回给QML的字典"""
+        status = job.to_dict()
+        if job.result:
+            response = self._build_import_response(job.result)
+            for key in ("errors", "error_summary", "errors_truncated"):
+                status[key] = response[key]
+        return status
+    
+    @Slot(str, str)
+    def _on_import_job_finished(self, job_id, status_json):
+        """导入任务结束后在主线程刷新数据"""
+        status = json.loads(status_json)
+        if status.get("success_count", 0) > 0 or status.get("rolled_back_count", 0) > 0:
+            # 工作线程的写入不经过主连接，需要重建预算缓存
+            if self.data_analyzer:
+                self.data_analyzer.invalidate_budget_state()
+            self.transactionsChanged.emit()
+            self._check_budget_alerts()
+    
+    @Slot(str, int, str, bool, result=str)
+    def startImportFromFile(self, file_url, header_row, file_type, keep_partial):
+        """在后台开始从文件导入数据
+        
+        Args:
+            file_url: 文件URL
+            header_row: 表头行索引
+            file_type: 文件类型(csv, tsv, excel, txt)
+            keep_partial: 取消时是否保留已提交的部分
+            
+        Returns:
+            str: 任务ID，失败时为空字符串
+        """
+        if not self.import_job_manager:
+            self.errorOccurred.emit("未选择用户")
+            return ""
+        
+        file_path = QUrl(file_url).toLocalFile()
+        return self.import_job_manager.submit_file(
+            file_path,
+            file_type=file_type or None,
+            header_row=header_row,
+            keep_partial=keep_partial,
+            on_progress=self._on_import_job_progress,
+            on_finished=self._on_import_job_done
+        )
+    
+    @Slot(str, int, str, result=str)
+    def resumeImportFromFile(self, file_url, header_row, file_type):
+        """在后台从导入断点继续导入文件
+        
+        断点之前的部分不再读取和查重；没有未完成的断点时从头导入。
+        
+        Args:
+            file_url: 文件URL
+            header_row: 表头行索引
+            file_type: 文件类型(csv, tsv, txt)
+            
+        Returns:
+            str: 任务ID，失败时为空字符串
+        """
+        if not self.import_job_manager:
+            self.errorOccurred.emit("未选择用户")
+            return ""
+        
+        file_path = QUrl(file_url).toLocalFile()
+        return self.import_job_manager.submit_file(
+            file_path,
+            file_type=file_type or None,
+            header_row=header_row,
+            keep_partial=True,
+            on_progress=self._on_import_job_progress,
+            on_finished=self._on_import_job_done,
+            resume=True
+        )
+    
+    @Slot(str, result='QVariantMap')
+    def getImportCheckpoint(self, file_url):
+        """获取文件的导入断点，用于提示是否继续上次中断的导入
+        
+        Returns:
+            dict: 断点信息，resumable表示是否存在未完成的断点
+        """
+        if not self.db_manager:
+            self.errorOccurred.emit("未选择用户")
+            return {}
+        
+        try:
+            checkpoint = self.db_manager.get_import_checkpoint(file_fingerprint(QUrl(file_url).toLocalFile()))
+        except OSError as e:
+            self.errorOccurred.emit(f"读取文件失败: {str(e)}")
+            return {}
+        if not checkpoint:
+            return {'resumable': False}
+        
+        return {
+            'resumable': checkpoint['status'] == 'running',
+            'status': checkpoint['status'],
+            'row_index': checkpoint['row_index'],
+            'byte_offset': checkpoint['byte_offset'],
+            'saved_count': checkpoint['saved_count'],
+            'skipped_count': checkpoint['skipped_count'],
+            'error_count': checkpoint['error_count'],
+            'updated_at': checkpoint['updated_at']
+        }
+    
+    @Slot('QVariantList', bool, bool, result=str)
+    def startBatchImport(self, file_urls, all_sheets, keep_partial):
+        """在后台批量导入多个文件
+        
+        各文件（Excel可包含全部工作表）并行解析，按顺序写入并共用查重，
+        任务状态的sources中包含各文件和工作表的统计。
+        
+        Args:
+            file_urls: 文件URL列表
+            all_sheets: Excel文件是否导入全部工作表
+            keep_partial: 取消时是否保留已提交的部分
+            
+        Returns:
+            str: 任务ID，失败时为空字符串
+        """
+        if not self.import_job_manager:
+            self.errorOccurred.emit("未选择用户")
+            return ""
+        
+        file_paths = [QUrl(url).toLocalFile() or url for url in file_urls]
+        if not file_paths:
+            return ""
+        return self.import_job_manager.submit_batch(
+            file_paths,
+            all_sheets=all_sheets,
+            keep_partial=keep_partial,
+            on_progress=self._on_import_job_progress,
+            on_finished=self._on_import_job_done
+        )
+    
+    @Slot(str, int, str, result=str)
+    def startStagedImportFromFile(self, file_url, header_row, file_type):
+        """在后台经暂存表从文件导入数据
+        
+        校验、类型转换和查重在数据库中批量完成，全部记录在一个事务中写入，
+        取消时不会写入任何记录。
+        
+        Args:
+            file_url: 文件URL
+            header_row: 表头行索引
+            file_type: 文件类型(csv, tsv, excel)
+            
+        Returns:
+            str: 任务ID，失败时为空字符串
+        """
+        if not self.import_job_manager:
+            self.errorOccurred.emit("未选择用户")
+            return ""
+        
+        file_path = QUrl(file_url).toLocalFile()
+        return self.import_job_manager.submit_file(
+            file_path,
+            file_type=file_type or None,
+            header_row=header_row,
+            keep_partial=False,
+            on_progress=self._on_import_job_progress,
+            on_finished=self._on_import_job_done,
+            staged=True
+        )
+    
+    @Slot(str, result=str)
+    def startDatabaseImport(self, file_url):
+        """在后台合并另一个账本数据库（其他用户的data.db或备份文件）
+        
+        源数据库只读打开，查重、标签合并和写入在一个事务中完成。
+        
+        Args:
+            file_url: 源数据库文件URL
+            
+        Returns:
+            str: 任务ID，失败时为空字符串
+        """
+        if not self.import_job_manager:
+            self.errorOccurred.emit("未选择用户")
+            return ""
+        
+        return self.import_job_manager.submit_database(
+            QUrl(file_url).toLocalFile(),
+            on_progress=self._on_import_job_progress,
+            on_finished=self._on_import_job_done
+        )
+    
+    @Slot(str, int, bool, result=str)
+    def startImportFromText(self, text_content, format_type_index, keep_partial):
+        """在后台开始从文本导入数据
+        
+        Args:
+            text_content: 文本内容
+            format_type_index: 格式类型索引(0=自动识别, 1=CSV/TSV, 2=自定义格式)
+            keep_partial: 取消时是否保留已提交的部分
+            
+        Returns:
+            str: 任务ID，失败时为空字符串
+        """
+        if not self.import_job_manager:
+            self.errorOccurred.emit("未选择用户")
+            return ""
+        
+        format_type = "auto"
+        if format_type_index == 1:
+            format_type = "tsv" if '\t' in text_content else "csv"
+        elif format_type_index == 2:
+            format_type = "custom"
+        
+        return self.import_job_manager.submit_text(
+            text_content,
+            format_type=format_type,
+            keep_partial=keep_partial,
+            on_progress=self._on_import_job_progress,
+            on_finished=self._on_import_job_done
+        )
+    
+    @Slot()
+    def cancelImport(self):
+        """取消所有正在进行的导入任务"""
+        if self.import_job_manager:
+            self.import_job_manager.cancel_all()
+    
+    @Slot(str, result=bool)
+    def cancelImportJob(self, job_id):
+        """取消指定的导入任务，当前批次提交后生效"""
+        if not self.import_job_manager:
+            return False
+        return self.import_job_manager.cancel(job_id)
+    
+    @Slot(str, result='QVariantMap')
+    def getImportJobStatus(self, job_id):
+        """获取导入任务的状态和统计"""
+        job = self.import_job_manager.get_job(job_id) if self.import_job_manager else None
+        if not job:
+            return {"job_id": job_id, "status": "unknown"}
+        return self._build_job_status(job)
+    
+    @Slot(str, str, float, result=bool)
+    def startFolderWatch(self, folder_url, default_template, poll_seconds):
+        """开始监视文件夹，自动导入新增或变化的文件
+        
+        Args:
+            folder_url: 文件夹URL
+            default_template: 没有模板匹配文件名时使用的模板，空字符串表示默认字段映射
+            poll_seconds: 轮询间隔（秒），0表示默认值
+            
+        Returns:
+            bool: 是否成功开始监视
+        """
+        if not self.current_user:
+            self.errorOccurred.emit("未选择用户")
+            return False
+        
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+        
+        username = self.current_user
+        self.folder_watcher = FolderWatcher(
+            QUrl(folder_url).toLocalFile() or folder_url,
+            lambda: DatabaseManager(username),
+            poll_interval=poll_seconds or DEFAULT_POLL_INTERVAL,
+            default_template=default_template,
+            on_file_finished=lambda record: self.folderFileImported.emit(json.dumps(record, ensure_ascii=False)),
+            on_progress=self._on_import_job_progress,
+            on_job_finished=self._on_import_job_done
+        )
+        if not self.folder_watcher.start():
+            self.folder_watcher = None
+            self.errorOccurred.emit("无法监视该文件夹")
+            return False
+        return True
+    
+    @Slot()
+    def stopFolderWatch(self):
+        """停止监视文件夹"""
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+    
+    @Slot(result='QVariantMap')
+    def getFolderWatchStatus(self):
+        """获取文件夹监视状态"""
+        if not self.folder_watcher:
+            return {"running": False}
+        return self.folder_watcher.get_status()
+    
+    @Slot(int, result='QVariantList')
+    def getIngestedFiles(self, limit):
+        """获取自动导入台账中最近处理的文件"""
+        if not self.db_manager:
+            self.errorOccurred.emit("未选择用户")
+            return []
+        return self.db_manager.get_ingested_files(limit if limit > 0 else 100)
+    
+    @Slot(str, result='QVariantList')
+    def getExcelSheets(self, file_url):
+        """获取Excel文件的工作表名称列表，不加载工作表内容"""
+        if not self.data_importer:
+            self.errorOccurred.emit("未选择用户")
+            return []
+        
+        try:
+            return self.data_importer.list_excel_sheets(QUrl(file_url).toLocalFile())
+        except Exception as e:
+            self.errorOccurred.emit(f"读取工作表列表失败: {str(e)}")
+            return []
+    
     @Slot(str, str, str, int, result=str)
     def generateFilePreview(self, file_url, file_type, delimiter=',', lines=10):
         """生成文件预览
@@ -777,40 +1112,13 @@ class UIBackend(QObject):
             
             # 保存到数据库
             if len(result.parsed_data) > 0:
-                saved_count = self.data_importer.save_imported_data(result)
+                self.data_importer.save_imported_data(result)
                 # 通知UI更新
                 self.transactionsChanged.emit()
-                
-                # 返回结果
-                return {
-                    "success": True,
-                    "success_count": saved_count,
-                    "error_count": len(result.error_data),
-                    "skipped_count": len(result.skipped_data),
-                    "errors": [
-                        {
-                            "row": error["row_index"],
-                            "data": str(error["row_data"]),
-                            "message": error["error_message"]
-                        }
-                        for error in result.error_data
-                    ]
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": "没有成功导入的数据",
-                    "error_count": len(result.error_data),
-                    "skipped_count": len(result.skipped_data),
-                    "errors": [
-                        {
-                            "row": error["row_index"],
-                            "data": str(error["row_data"]),
-                            "message": error["error_message"]
-                        }
-                        for error in result.error_data
-                    ]
-                }
+                # 检查预算告警
+                self._check_budget_alerts()
+            
+            return self._build_import_response(result)
         except Exception as e:
             self.errorOccurred.emit(f"导入文本失败: {str(e)}")
             return {
@@ -840,6 +1148,20 @@ class UIBackend(QObject):
         distribution = self.data_analyzer.get_asset_type_distribution(start_date, end_date)
         return distribution
     
+    @Slot(str, int, str, str, result='QVariantList')
+    def getProfitLossDistribution(self, group_by, bins, start_date, end_date):
+        """获取盈亏分布（直方图与分位数），group_by可为asset_type、project或tag"""
+        if not self.data_analyzer:
+            self.errorOccurred.emit("未选择用户")
+            return []
+        
+        return self.data_analyzer.get_profit_loss_distribution(
+            group_by or "asset_type",
+            bins if bins > 0 else 10,
+            start_date or None,
+            end_date or None
+        )
+    
     @Slot(int, int, result='QVariantMap')
     def getMonthlyGoalComparison(self, year, month):
         """获取月度目标比较"""
@@ -880,6 +1202,57 @@ class UIBackend(QObject):
         monthly_data = self.data_analyzer.get_monthly_profit_loss_last_year()
         return monthly_data
     
+    @Slot(str, int, result='QVariantList')
+    def getProfitLossTrend(self, period, count):
+        """获取补全空档的盈亏趋势序列，恰好返回count个周期"""
+        if not self.data_analyzer:
+            self.errorOccurred.emit("未选择用户")
+            return []
+        
+        return self.data_analyzer.get_profit_loss_trend(period, count)
+    
+    @Slot(str, str, int, bool, result='QVariantMap')
+    def getDailyProfitLossSeries(self, start_date, end_date, pixel_width, preserve_extremes):
+        """获取按图表宽度降采样后的每日累计盈亏序列"""
+        if not self.data_analyzer:
+            self.errorOccurred.emit("未选择用户")
+            return {'dates': [], 'values': [], 'total_points': 0}
+        
+        max_points = chart_points_for_width(pixel_width) if pixel_width > 0 else None
+        return self.data_analyzer.get_daily_profit_loss_series(
+            start_date or None,
+            end_date or None,
+            max_points=max_points,
+            preserve_extremes=preserve_extremes
+        )
+    
+    @Slot(str, str, str, result='QVariantMap')
+    def getConsolidatedReport(self, period, start_date, end_date):
+        """获取所有用户账本的合并报表（按周期汇总、资产分布和盈亏项目排行）"""
+        if not self.currency_manager:
+            self.currency_manager = CurrencyManager()
+        
+        try:
+            analyzer = ConsolidatedAnalyzer(self.main_app.user_manager, self.currency_manager)
+            return analyzer.get_consolidated_report(period, start_date or None, end_date or None)
+        except Exception as e:
+            print(f"获取合并报表失败: {e}")
+            self.errorOccurred.emit(f"获取合并报表失败: {str(e)}")
+            return {}
+    
+    @Slot(str, str, result='QVariantMap')
+    def getDailyHeatmap(self, start_date, end_date):
+        """获取日历热力图数据（每年一条稠密的每日盈亏序列）"""
+        if not self.data_analyzer:
+            self.errorOccurred.emit("未选择用户")
+            return {'years': [], 'min': 0, 'max': 0}
+        
+        try:
+            return self.data_analyzer.get_daily_heatmap(start_date or None, end_date or None)
+        except ValueError as e:
+            self.errorOccurred.emit(f"日期格式错误: {e}")
+            return {'years': [], 'min': 0, 'max': 0}
+    
     # 预算目标相关方法
     
     @Slot(int, int, float, result=bool)
@@ -890,6 +1263,8 @@ class UIBackend(QObject):
             return False
         
         success = self.db_manager.set_budget_goal(year, month, goal_amount)
+        if success and self.data_analyzer:
+            self.data_analyzer.invalidate_budget_state()
         return success
     
     @Slot(int, float, result=bool)
@@ -900,6 +1275,8 @@ class UIBackend(QObject):
             return False
         
         success = self.db_manager.set_yearly_budget_goal(year, goal_amount)
+        if success and self.data_analyzer:
+            self.data_analyzer.invalidate_budget_state()
         return success
     
     @Slot(int, int, result=float)
@@ -1235,7 +1612,7 @@ class UIBackend(QObject):
         导出交易数据
         
         Parameters:
-        - format_name: 导出格式名称 ("csv", "excel", "pdf")
+        - format_name: 导出格式名称 ("csv", "excel", "pdf", "jsonl", "parquet")
         - file_path: 导出文件路径
         - start_date: 开始日期过滤
         - end_date: 结束日期过滤
@@ -1264,6 +1641,10 @@ class UIBackend(QObject):
             export_format = ExportFormat.EXCEL
         elif format_name.lower() == "pdf":
             export_format = ExportFormat.PDF
+        elif format_name.lower() == "jsonl":
+            export_format = ExportFormat.JSONL
+        elif format_name.lower() == "parquet":
+            export_format = ExportFormat.PARQUET
         else:
             self.errorOccurred.emit(f"不支持的导出格式: {format_name}")
             return {"success": False, "message": f"不支持的导出格式: {format_name}", "file_path": ""}
@@ -1290,14 +1671,16 @@ class UIBackend(QObject):
         获取导出功能支持情况
         
         Returns:
-        - 支持的导出格式 {csv: true, excel: true|false, pdf: true|false}
+        - 支持的导出格式 {csv: true, excel: true|false, pdf: true|false, jsonl: true, parquet: true|false}
         """
-        from exporter import has_excel, has_pdf
+        from exporter import has_excel, has_pdf, has_parquet
         
         return {
             "csv": True,
             "excel": has_excel,
-            "pdf": has_pdf
+            "pdf": has_pdf,
+            "jsonl": True,
+            "parquet": has_parquet
         }
     
     # 添加支持名称和盈亏状态筛选的方法
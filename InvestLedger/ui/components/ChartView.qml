@@ -156,6 +156,8 @@ Item {
             // 获取数据 - 从后端获取实际数据
             var chartData = {
                 profitLoss: loadProfitLossData(),
+                dailyTrend: loadDailyTrendData(),
+                heatmap: loadHeatmapData(),
                 stockRanking: loadStockRankingData(),
                 monthlyVolume: loadMonthlyVolumeData(),
                 winLossRatio: loadWinLossRatioData()
@@ -234,6 +236,37 @@ Item {
         }
     }
     
+    // 加载每日累计盈亏数据 - 后端按图表像素宽度降采样，数据量不随历史长度增长
+    function loadDailyTrendData() {
+        console.log("加载每日累计盈亏数据")
+        
+        try {
+            var pixelWidth = Math.round(chartsColumn.width)
+            var series = backend.getDailyProfitLossSeries("", "", pixelWidth, false)
+            console.log("每日累计盈亏: 原始点数", series.total_points, "降采样后", series.dates.length)
+            
+            return {
+                dates: series.dates,
+                values: series.values
+            }
+        } catch (e) {
+            console.error("加载每日累计盈亏数据出错:", e)
+            return { dates: [], values: [] }
+        }
+    }
+    
+    // 加载日历热力图数据 - 每年一条从起始日开始的每日盈亏数组
+    function loadHeatmapData() {
+        console.log("加载日历热力图数据")
+        
+        try {
+            return backend.getDailyHeatmap("", "")
+        } catch (e) {
+            console.error("加载日历热力图数据出错:", e)
+            return { years: [], min: 0, max: 0 }
+        }
+    }
+    
     // 加载个股盈亏排名数据
     function loadStockRankingData() {
         console.log("加载个股盈亏排名数据")
@@ -31,6 +31,9 @@ Item {
     // 当前选中的导入/导出标签
     property int currentTabIndex: 2 // 0: 导入, 1: 导出, 2: 手动录入 (默认显示手动录入)
     
+    // 正在进行的后台导入任务ID
+    property string importJobId: ""
+    
     // 提供文件导入功能，包括选择文件、选择分隔符等
     function importFromFile() {
         fileDialog.open();
@@ -51,6 +54,56 @@ Item {
         manualEntryDialog.open();
     }
     
+    // 跟踪后台导入任务，进度和结果由importJobProgress/importJobFinished信号更新
+    function trackImportJob(jobId) {
+        if (!jobId) {
+            errorDialog.showError("无法开始导入任务");
+            return;
+        }
+        importJobId = jobId;
+        importJobDialog.savedCount = 0;
+        importJobDialog.errorCount = 0;
+        importJobDialog.cancelling = false;
+        importJobDialog.open();
+    }
+    
+    // 显示导入任务的结果
+    function showImportJobResult(status) {
+        if (status.status === "failed") {
+            errorDialog.showError("导入失败: " + (status.error || "未知错误"));
+            return;
+        }
+        if (status.parsed_count > 0 || status.status === "cancelled") {
+            importSuccessDialog.successCount = status.success_count;
+            importSuccessDialog.errorCount = status.error_count;
+            importSuccessDialog.skippedCount = status.skipped_count;
+            importSuccessDialog.errorDetails = status.errors || [];
+            importSuccessDialog.open();
+        } else {
+            errorDialog.showError("没有成功导入的数据，请检查文件或文本格式。");
+        }
+    }
+    
+    // 监听后台导入任务
+    Connections {
+        target: backend
+        function onImportJobProgress(jobId, savedCount, errorCount) {
+            if (jobId !== importJobId) {
+                return;
+            }
+            importJobDialog.savedCount = savedCount;
+            importJobDialog.errorCount = errorCount;
+        }
+        function onImportJobFinished(jobId, statusJson) {
+            if (jobId !== importJobId) {
+                return;
+            }
+            importJobId = "";
+            importJobDialog.close();
+            showImportJobResult(JSON.parse(statusJson));
+        }
+    }
+    
     // 自定义按钮组件
     component CustomButton: Rectangle {
         id: customBtn
@@ -992,24 +1045,16 @@ Item {
                     text: "导入"
                     highlighted: true
                     onClicked: {
-                        // 执行实际导入
-                        var success = backend.importFromFile(
+                        // 在后台执行导入，取消时保留已提交的部分
+                        var jobId = backend.startImportFromFile(
                             fileImportDialog.filePath, 
                             fileImportDialog.headerRow,
-                            fileImportDialog.fileType // 传递文件类型给后端
+                            fileImportDialog.fileType, // 传递文件类型给后端
+                            true
                         );
                         
                         fileImportDialog.close();
-                        
-                        if (success && success.success) {
-                            importSuccessDialog.successCount = success.success_count;
-                            importSuccessDialog.errorCount = success.error_count;
-                            importSuccessDialog.skippedCount = success.skipped_count;
-                            importSuccessDialog.errorDetails = success.errors || [];
-                            importSuccessDialog.open();
-                        } else {
-                            errorDialog.showError(success.message || "导入失败，请检查文件格式。");
-                        }
+                        trackImportJob(jobId);
                     }
                 }
             }
@@ -1211,23 +1256,15 @@ Item {
                                 return;
                             }
                             
-                            // 执行文本导入
-                            var success = backend.importFromText(
+                            // 在后台执行文本导入，取消时保留已提交的部分
+                            var jobId = backend.startImportFromText(
                                 pasteTextArea.text,
-                                formatText.formatIndex
+                                formatText.formatIndex,
+                                true
                             );
                             
                             pasteImportDialog.close();
-                            
-                            if (success && success.success) {
-                                importSuccessDialog.successCount = success.success_count;
-                                importSuccessDialog.errorCount = success.error_count;
-                                importSuccessDialog.skippedCount = success.skipped_count;
-                                importSuccessDialog.errorDetails = success.errors || [];
-                                importSuccessDialog.open();
-                            } else {
-                                errorDialog.showError(success.message || "导入失败，请检查文本格式。");
-                            }
+                            trackImportJob(jobId);
                         }
                     }
                     
@@ -1285,6 +1322,49 @@ Item {
         }
     }
     
+    // 导入进度对话框，导入在后台进行，界面保持响应
+    Dialog {
+        id: importJobDialog
+        title: "正在导入"
+        modal: true
+        width: 400
+        anchors.centerIn: parent
+        closePolicy: Popup.NoAutoClose
+        standardButtons: Dialog.Cancel
+        
+        property int savedCount: 0
+        property int errorCount: 0
+        property bool cancelling: false
+        
+        // 取消在当前批次提交后生效，对话框在任务结束时关闭
+        onRejected: {
+            if (importJobId) {
+                cancelling = true;
+                backend.cancelImportJob(importJobId);
+                open();
+            }
+        }
+        
+        contentItem: ColumnLayout {
+            spacing: 10
+            
+            ProgressBar {
+                Layout.fillWidth: true
+                indeterminate: true
+            }
+            
+            Text {
+                text: (importJobDialog.cancelling ? "正在取消，" : "") +
+                      "已导入: " + importJobDialog.savedCount + " 条记录" +
+                      (importJobDialog.errorCount > 0 ? "，失败: " + importJobDialog.errorCount + " 条记录" : "")
+                color: theme ? theme.textColor : "black"
+                font.pixelSize: 14
+                wrapMode: Text.WordWrap
+                Layout.fillWidth: true
+            }
+        }
+    }
+    
     // 导入成功对话框
     Dialog {
         id: importSuccessDialog
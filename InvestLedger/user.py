@@ -93,6 +93,10 @@ class UserManager:
         # 保存用户列表
         return self._save_users(self.users)
         
+    def get_user_db_path(self, username):
+        """获取用户数据库文件路径"""
+        return os.path.join(self.app_data_dir, username, 'data.db')
+    
     def user_exists(self, username):
         """检查用户是否存在"""
         return username in self.users.get("users", []) 
\ No newline at end of file